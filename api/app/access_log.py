@@ -0,0 +1,226 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from celery.signals import worker_process_shutdown
+from flask import g, request
+
+from app.query_stats import query_stats
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as a single JSON object, including its `fields` extra."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Puts records on a bounded queue without ever blocking the caller, a listener
+    thread hands them to `handlers`. When the queue is full the record is dropped
+    and counted, once there is room again a warning with the number of dropped
+    records is queued.
+
+    The listener is started by the first record of every process, as a forked
+    process, like a Celery prefork child, does not inherit the listener thread.
+    """
+
+    def __init__(self, maxsize: int, handlers: list[logging.Handler]):
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.listener: QueueListener | None = None
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start_listener()
+        super().emit(record)
+
+    def stop(self):
+        """Writes the records that are still queued and stops the listener."""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+        self.listener = None
+        self._pid = None
+
+    def _start_listener(self):
+        # After a fork the queue may hold records of the parent, or a lock that was
+        # held by its listener, so the process starts with a fresh queue.
+        if self._pid is not None:
+            self.queue = queue.Queue(self.queue.maxsize)
+            self._lock = threading.Lock()
+            self._unreported = 0
+
+        self._pid = os.getpid()
+        self.listener = QueueListener(
+            self.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def prepare(self, record):
+        # Formatting is left to the listener, only the traceback has to be rendered
+        # here as it refers to frames that are gone by the time the record is handled.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self._unreported:
+                self._report_dropped(record.name)
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported += 1
+
+    def _report_dropped(self, name: str):
+        with self._lock:
+            unreported, self._unreported = self._unreported, 0
+
+        self.queue.put_nowait(
+            logging.makeLogRecord(
+                {
+                    "name": name,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": "Dropped %d log records because the log queue was full",
+                    "args": (unreported,),
+                    "fields": {"dropped": unreported},
+                }
+            )
+        )
+
+
+class AccessLogger:
+    """
+    Writes the log records of the app from a background thread, such that a slow
+    disk or pipe never adds to the latency of a request. Records are put on a
+    bounded queue of `LOG_QUEUE_SIZE` and dropped when it is full, a size of 0
+    writes them synchronously instead.
+
+    Every request is logged, except that only a fraction `ACCESS_LOG_SAMPLE_RATE`
+    of the successful (2xx) requests is. With `LOG_FORMAT` 'json' every record is
+    written as a JSON object, including the fields of the request.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.sample_rate = 1.0
+        self.handler: DroppingQueueHandler | None = None
+        self.sampled_out = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.sample_rate = app.config["ACCESS_LOG_SAMPLE_RATE"]
+        self.sampled_out = 0
+        self.stop()
+
+        level = logging.DEBUG if app.config["DEBUG"] else logging.INFO
+        handlers = list(logging.getLogger("gunicorn.error").handlers)
+        if app.config["FILE_LOGGING"]:
+            file_handler = RotatingFileHandler("api.log")
+            file_handler.setLevel(level)
+            file_handler.setFormatter(
+                logging.Formatter(
+                    "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
+                )
+            )
+            handlers.append(file_handler)
+
+        if app.config["LOG_FORMAT"] == "json":
+            # Gunicorn's handlers are shared with its own logs, so the records of the
+            # app get a separate stream handler.
+            handlers = [
+                handler
+                for handler in handlers
+                if isinstance(handler, RotatingFileHandler)
+            ] + [logging.StreamHandler()]
+            for handler in handlers:
+                handler.setFormatter(JSONFormatter())
+
+        app.logger.setLevel(level)
+        if app.config["LOG_QUEUE_SIZE"] > 0:
+            self.handler = DroppingQueueHandler(app.config["LOG_QUEUE_SIZE"], handlers)
+            app.logger.handlers = [self.handler]
+        else:
+            app.logger.handlers = handlers
+
+        app.before_request(self.start_timer)
+        app.after_request(self.log_request)
+
+    def stop(self, **kwargs):
+        """Writes the records that are still queued and stops the listener."""
+        if self.handler is not None:
+            self.handler.stop()
+            self.handler = None
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped if self.handler is not None else 0
+
+    def start_timer(self):
+        g.request_started_at = time.perf_counter()
+
+    def log_request(self, response):
+        if 200 <= response.status_code < 300 and random.random() >= self.sample_rate:
+            self.sampled_out += 1
+            return response
+
+        query_count, query_time = query_stats.current()
+        started_at = g.get("request_started_at")
+        duration = time.perf_counter() - started_at if started_at else 0.0
+        self.app.logger.info(
+            "%s %s [%s] %s %s %s [%d queries, %.1f ms]",
+            request.method,
+            request.path,
+            response.status,
+            request.referrer,
+            request.remote_addr,
+            request.user_agent,
+            query_count,
+            query_time * 1000,
+            extra={
+                "fields": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "referrer": request.referrer,
+                    "remote_addr": request.remote_addr,
+                    "user_agent": request.user_agent.string,
+                    "queries": query_count,
+                    "db_ms": round(query_time * 1000, 2),
+                    "duration_ms": round(duration * 1000, 2),
+                }
+            },
+        )
+        return response
+
+
+access_logger = AccessLogger()
+atexit.register(access_logger.stop)
+# Prefork children exit without running atexit handlers
+worker_process_shutdown.connect(access_logger.stop, weak=False)
@@ -1,24 +1,57 @@
-import logging
-from logging.handlers import RotatingFileHandler
-
 from celery import Celery, Task
 from flask import Flask, request
+from werkzeug.middleware.proxy_fix import ProxyFix
 
+from app.access_log import access_logger
+from app.cache import user_cache
 from app.commands import register_commands
 from app.config import DevConfig, ProdConfig, TestConfig
+from app.db_pool import pool_monitor
 from app.errors import APIError, APIErrorEnum
-from app.extensions import api, db, login_manager, mail, migrate
+from app.extensions import api, db, login_manager, mail, migrate, replica_router
+from app.metrics import metrics
+from app.passwords import password_hasher
+from app.qr_codes import qr_code_service
+from app.query_stats import query_stats
+from app.rate_limit import rate_limiter
+from app.sessions import session_store
+from app.tasks.async_mail import async_mail_transport
+from app.tasks.mail_batching import mail_batcher
+from app.tasks.mail_templates import mail_templates
+from app.tasks.smtp_pool import smtp_pool
+from app.tasks.task_metrics import task_metrics
+from app.tasks.worker_context import worker_app_context
+from app.totp import totp_verifier
 
 
 def create_app(config_object: DevConfig | ProdConfig | TestConfig = ProdConfig()):
     app = Flask(__name__)
     app.config.from_object(config_object)
+    if app.config["PROXY_COUNT"]:
+        # The client address is taken from the X-Forwarded-For set by nginx
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_COUNT"])
 
     db.init_app(app)
+    replica_router.init_app(app)
+    pool_monitor.init_app(app)
+    query_stats.init_app(app)
+    access_logger.init_app(app)
+    metrics.init_app(app)
     login_manager.init_app(app)
     api.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
+    mail_templates.init_app(app)
+    smtp_pool.init_app(app)
+    mail_batcher.init_app(app)
+    async_mail_transport.init_app(app)
+    user_cache.init_app(app)
+    rate_limiter.init_app(app)
+    session_store.init_app(app)
+    totp_verifier.init_app(app)
+    qr_code_service.init_app(app)
+    password_hasher.init_app(app)
+    task_metrics.init_app(app)
     init_celery_app(app)
 
     register_commands(app)
@@ -33,6 +66,7 @@ def create_app(config_object: DevConfig | ProdConfig | TestConfig = ProdConfig()
             error.code.value,
             error.code.name,
         )
+        metrics.count_api_error(error.code)
         return error.to_response()
 
     @app.errorhandler(Exception)
@@ -45,49 +79,32 @@ def create_app(config_object: DevConfig | ProdConfig | TestConfig = ProdConfig()
             str(error),
             repr(error),
         )
+        metrics.count_api_error(APIErrorEnum.unknown_error)
         return {
             "error": APIErrorEnum.unknown_error.value,
             "message": "An unknown error occurred",
         }, 500
 
-    @app.after_request
-    def logging_after_request(response):
-        app.logger.info(
-            "%s %s [%s] %s %s %s",
-            request.method,
-            request.path,
-            response.status,
-            request.referrer,
-            request.remote_addr,
-            request.user_agent,
-        )
-        return response
-
-    gunicorn_logger = logging.getLogger("gunicorn.error")
-    app.logger.handlers = gunicorn_logger.handlers
-    app.logger.setLevel(logging.DEBUG if app.config["DEBUG"] else logging.INFO)
-
-    if app.config["FILE_LOGGING"]:
-        file_handler = RotatingFileHandler("api.log")
-        file_handler.setLevel(logging.DEBUG if app.config["DEBUG"] else logging.INFO)
-        file_handler.setFormatter(
-            logging.Formatter(
-                "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
-            )
-        )
-        app.logger.addHandler(file_handler)
-
     return app
 
 
 def init_celery_app(app) -> Celery:
+    worker_app_context.init_app(app)
+
     class FlaskTask(Task):
         def __call__(self, *args: object, **kwargs: object) -> object:
+            if worker_app_context.available():
+                with worker_app_context.task_scope():
+                    return self.run(*args, **kwargs)
+
             with app.app_context():
                 return self.run(*args, **kwargs)
 
     celery_app = Celery(app.name, task_cls=FlaskTask)
     celery_app.config_from_object(app.config["CELERY"])
+    celery_app.conf.update(
+        app.config["CELERY_WORKER_PRESETS"][app.config["CELERY_WORKER_PRESET"]]
+    )
     celery_app.set_default()
     app.extensions["celery"] = celery_app
     return celery_app
@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from app.db.user import User
+from app.extensions import db, read_from_primary, redis_client
+
+# Credentials are never cached, they are loaded from the database when accessed.
+UNCACHED_COLUMNS = {
+    "hashed_password",
+    "password_reset_token",
+    "email_verification_token",
+    "encrypted_totp_secret",
+}
+
+
+class LRUCache:
+    """Thread safe in-process LRU cache where every entry expires after `ttl`."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class UserCache:
+    """
+    Cache for the column values of `User` rows, used by the Flask-Login user loader.
+
+    Lookups go through an in-process LRU first and an optional Redis tier second,
+    before falling back to the database. Entries are invalidated whenever a `User`
+    row is updated or deleted through the ORM, e.g. when its role or password
+    changes. Because the in-process tier of other
+    workers can not be invalidated, its TTL should be kept short.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.local = LRUCache()
+        self.redis: redis.Redis | None = None
+        self.redis_ttl = 300
+        self.hits = {"local": 0, "redis": 0}
+        self.misses = 0
+
+    def init_app(self, app):
+        self.enabled = app.config["USER_CACHE_ENABLED"]
+        self.local = LRUCache(
+            max_size=app.config["USER_CACHE_MAX_SIZE"],
+            ttl=app.config["USER_CACHE_TTL_SECONDS"],
+        )
+        self.redis = (
+            redis_client(app, app.config["USER_CACHE_REDIS_TIMEOUT_SECONDS"])
+            if app.config["USER_CACHE_REDIS_ENABLED"]
+            else None
+        )
+        self.redis_ttl = app.config["USER_CACHE_REDIS_TTL_SECONDS"]
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = {"local": 0, "redis": 0}
+        self.misses = 0
+
+    def stats(self) -> dict:
+        total = sum(self.hits.values()) + self.misses
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_ratio": (sum(self.hits.values()) / total) if total else 0.0,
+            "local_size": len(self.local),
+        }
+
+    def load_user(self, user_id) -> User | None:
+        user_id = int(user_id)
+
+        # The user may already be present in the current session, in which case
+        # SQLAlchemy would not have to hit the database either.
+        user = db.session.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            return user
+
+        if not self.enabled:
+            with read_from_primary():
+                return db.session.get(User, user_id)
+
+        values = self.local.get(user_id)
+        if values is not None:
+            self.hits["local"] += 1
+            return self._attach(values)
+
+        values = self._redis_get(user_id)
+        if values is not None:
+            self.hits["redis"] += 1
+            self.local.set(user_id, values)
+            return self._attach(values)
+
+        self.misses += 1
+        # A lagging replica could miss a new user, or put an outdated one in the cache
+        with read_from_primary():
+            user = db.session.get(User, user_id)
+        if user is not None:
+            self.set(user)
+
+        return user
+
+    def set(self, user: User):
+        values = {attr.key: getattr(user, attr.key) for attr in _column_attrs()}
+        self.local.set(user.id, values)
+        self._redis_set(user.id, values)
+
+    def invalidate(self, user_id: int):
+        self.local.delete(user_id)
+        if self.redis is None:
+            return
+
+        try:
+            self.redis.delete(_redis_key(user_id))
+        except redis.RedisError:
+            current_app.logger.warning("Could not invalidate user %d in redis", user_id)
+
+    def invalidate_many(self, user_ids: list[int]):
+        for user_id in user_ids:
+            self.local.delete(user_id)
+        if self.redis is None or not user_ids:
+            return
+
+        try:
+            self.redis.delete(*[_redis_key(user_id) for user_id in user_ids])
+        except redis.RedisError:
+            current_app.logger.warning("Could not invalidate users in redis")
+
+    def _attach(self, values: dict) -> User:
+        user = User(**values)
+        make_transient_to_detached(user)
+        db.session.add(user)
+        return user
+
+    def _redis_get(self, user_id: int) -> dict | None:
+        if self.redis is None:
+            return None
+
+        try:
+            raw = self.redis.get(_redis_key(user_id))
+        except redis.RedisError:
+            current_app.logger.warning("Could not read user %d from redis", user_id)
+            return None
+
+        return json.loads(raw) if raw is not None else None
+
+    def _redis_set(self, user_id: int, values: dict):
+        if self.redis is None:
+            return
+
+        try:
+            self.redis.set(_redis_key(user_id), json.dumps(values), ex=self.redis_ttl)
+        except redis.RedisError:
+            current_app.logger.warning("Could not write user %d to redis", user_id)
+
+
+def _redis_key(user_id: int) -> str:
+    return f"user_cache:{user_id}"
+
+
+def _column_attrs():
+    return [
+        attr for attr in inspect(User).column_attrs if attr.key not in UNCACHED_COLUMNS
+    ]
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User):
+    user_cache.invalidate(target.id)
+    Session.object_session(target).info.setdefault("changed_user_ids", set()).add(
+        target.id
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session):
+    # Invalidate again once the change is visible to other transactions, such that a
+    # concurrent request can not have cached the old row between flush and commit.
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session: Session):
+    session.info.pop("changed_user_ids", None)
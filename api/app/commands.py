@@ -1,8 +1,12 @@
 import click
+from flask import current_app
 from flask.cli import with_appcontext
 
 from app.db.user import User
 from app.extensions import db
+from app.key_rotation import rotate_totp_secrets
+from app.tasks.outbox_tasks import relay_outbox
+from app.tasks.task_metrics import task_summary
 
 
 @click.command("create-admin")
@@ -27,6 +31,60 @@ def create_admin(email, password):
     click.echo(f"Admin user {email} created/updated successfully.")
 
 
+@click.command("relay-outbox")
+@click.option("--batch-size", type=int, default=None, help="Messages per batch")
+@with_appcontext
+def relay_outbox_command(batch_size):
+    """Publish all pending outbox messages to the Celery broker."""
+    published = relay_outbox(batch_size or current_app.config["OUTBOX_RELAY_BATCH_SIZE"])
+    click.echo(f"Published {published} outbox messages.")
+
+
+@click.command("rotate-fernet-keys")
+@click.option("--batch-size", type=int, default=None, help="Rows per batch")
+@with_appcontext
+def rotate_fernet_keys_command(batch_size):
+    """Re-encrypt all TOTP secrets with the primary Fernet key."""
+
+    def report(stats):
+        click.echo(
+            f"Scanned {stats.scanned} rows, rotated {stats.rotated} "
+            f"({stats.rows_per_second:.0f} rows/s)"
+        )
+
+    stats = rotate_totp_secrets(
+        batch_size or current_app.config["KEY_ROTATION_BATCH_SIZE"], on_batch=report
+    )
+    click.echo(
+        f"Rotated {stats.rotated} of {stats.scanned} TOTP secrets in "
+        f"{stats.elapsed:.1f}s, {stats.conflicts} changed concurrently, "
+        f"{stats.failed} could not be decrypted."
+    )
+
+
+@click.command("task-stats")
+@click.option(
+    "--url", "urls", multiple=True, help="Metrics endpoint of a worker, repeatable"
+)
+@with_appcontext
+def task_stats_command(urls):
+    """Summarize the task metrics of the Celery workers."""
+    summary = task_summary(list(urls) or current_app.config["CELERY_METRICS_URLS"])
+    click.echo(
+        f"{'task':<50} {'runs':>8} {'queued (s)':>11} {'runtime (s)':>12} "
+        f"{'retries':>8} {'failures':>9}"
+    )
+    for stats in summary:
+        click.echo(
+            f"{stats['task']:<50} {stats['runs']:>8} "
+            f"{stats['mean_queue_latency']:>11.3f} {stats['mean_runtime']:>12.3f} "
+            f"{stats['retries']:>8} {stats['failures']:>9}"
+        )
+
+
 def register_commands(app):
     """Register Flask CLI commands."""
     app.cli.add_command(create_admin)
+    app.cli.add_command(relay_outbox_command)
+    app.cli.add_command(rotate_fernet_keys_command)
+    app.cli.add_command(task_stats_command)
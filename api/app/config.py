@@ -1,5 +1,7 @@
 import os
 
+from kombu import Queue
+
 MY_SOLID_APP_DB_NAME = os.environ.get("MY_SOLID_APP_DB_NAME", "my_solid_app_db")
 MY_SOLID_APP_DB_USER = os.environ.get("MY_SOLID_APP_DB_USER", "my_solid_app_user")
 MY_SOLID_APP_DB_PASSWORD = os.environ.get(
@@ -7,6 +9,12 @@ MY_SOLID_APP_DB_PASSWORD = os.environ.get(
 )
 MY_SOLID_APP_DB_HOST = os.environ.get("MY_SOLID_APP_DB_HOST", "127.0.0.1")
 MY_SOLID_APP_DB_PORT = os.environ.get("MY_SOLID_APP_DB_PORT", "3306")
+MY_SOLID_APP_DB_REPLICA_HOSTS = [
+    host.strip()
+    for host in os.environ.get("MY_SOLID_APP_DB_REPLICA_HOSTS", "").split(",")
+    if host.strip()
+]
+""" Comma separated host:port of read replicas, empty to read from the primary. """
 
 MY_SOLID_APP_PASSWORD_RESET_TOKEN_EXPIRE_HOURS = int(
     os.environ.get("MY_SOLID_APP_PASSWORD_RESET_TOKEN_EXPIRE_HOURS", "1")
@@ -21,16 +29,82 @@ MY_SOLID_APP_FERNET_SECRET_KEY = os.environ.get(
 )
 """ Key used for encrypting. The default key is used for development purposes only. """
 
+MY_SOLID_APP_FERNET_SECRET_KEYS = [
+    key.strip()
+    for key in (
+        os.environ.get("MY_SOLID_APP_FERNET_SECRET_KEYS")
+        or MY_SOLID_APP_FERNET_SECRET_KEY
+    ).split(",")
+    if key.strip()
+]
+"""
+Comma separated key ring, new values are encrypted with the first key and values
+encrypted with any of the keys can be decrypted. To rotate, put the new key in front,
+run `flask rotate-fernet-keys` and remove the old key afterwards. When empty, only
+`MY_SOLID_APP_FERNET_SECRET_KEY` is used.
+"""
+
+MY_SOLID_APP_TOKEN_HMAC_KEY = os.environ.get(
+    "MY_SOLID_APP_TOKEN_HMAC_KEY", "development_token_hmac_key"
+)
+""" Key for the HMAC digests of one-time tokens. The default is for development only. """
+
 MY_SOLID_APP_REDIS_HOST = os.environ.get("MY_SOLID_APP_REDIS_HOST", "localhost")
 
 
 class BaseConfig:
     SECRET_KEY = os.environ.get("MY_SOLID_APP_SECRET_KEY", "secret_oohhhhhh")
+    REDIS_URL = f"redis://{MY_SOLID_APP_REDIS_HOST}"
+    """ Redis of the sessions, rate limits, caches and other shared state. """
     SQLALCHEMY_DATABASE_URI = (
         f"mysql://{MY_SOLID_APP_DB_USER}:{MY_SOLID_APP_DB_PASSWORD}@"
         f"{MY_SOLID_APP_DB_HOST}:{MY_SOLID_APP_DB_PORT}/"
         f"{MY_SOLID_APP_DB_NAME}"
     )
+    DB_REPLICA_URIS = {
+        f"replica_{i}": (
+            f"mysql://{MY_SOLID_APP_DB_USER}:{MY_SOLID_APP_DB_PASSWORD}@"
+            f"{host}/{MY_SOLID_APP_DB_NAME}"
+        )
+        for i, host in enumerate(MY_SOLID_APP_DB_REPLICA_HOSTS)
+    }
+    """ Replicas use the same SQLALCHEMY_ENGINE_OPTIONS as the primary. """
+    DB_REPLICA_POLICY = os.environ.get("MY_SOLID_APP_DB_REPLICA_POLICY", "round_robin")
+    """ Either 'round_robin', 'random' or 'least_lag'. """
+    DB_REPLICA_MAX_LAG_SECONDS = float(
+        os.environ.get("MY_SOLID_APP_DB_REPLICA_MAX_LAG_SECONDS", 5)
+    )
+    DB_REPLICA_CHECK_INTERVAL_SECONDS = 5.0
+    DB_REPLICA_LAG_QUERY = "SHOW REPLICA STATUS"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": int(os.environ.get("MY_SOLID_APP_DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("MY_SOLID_APP_DB_MAX_OVERFLOW", 5)),
+        "pool_timeout": float(os.environ.get("MY_SOLID_APP_DB_POOL_TIMEOUT", 10)),
+        # Below MySQL's wait_timeout, such that the server never closes idle
+        # connections before the pool does.
+        "pool_recycle": int(os.environ.get("MY_SOLID_APP_DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": (
+            os.environ.get("MY_SOLID_APP_DB_POOL_PRE_PING", "True") == "True"
+        ),
+        "isolation_level": os.environ.get(
+            "MY_SOLID_APP_DB_ISOLATION_LEVEL", "REPEATABLE READ"
+        ),
+        "connect_args": {
+            "connect_timeout": int(os.environ.get("MY_SOLID_APP_DB_CONNECT_TIMEOUT", 5)),
+            "read_timeout": int(os.environ.get("MY_SOLID_APP_DB_READ_TIMEOUT", 30)),
+            "write_timeout": int(os.environ.get("MY_SOLID_APP_DB_WRITE_TIMEOUT", 30)),
+        },
+    }
+
+    SLOW_QUERY_THRESHOLD_MS = float(
+        os.environ.get("MY_SOLID_APP_SLOW_QUERY_THRESHOLD_MS", 200)
+    )
+    QUERY_BUDGET_MODE = os.environ.get("MY_SOLID_APP_QUERY_BUDGET_MODE", "warn")
+    """ What to do when a request exceeds its query budget: 'off', 'warn' or 'raise'. """
+
+    SESSION_STORAGE = os.environ.get("MY_SOLID_APP_SESSION_STORAGE", "redis")
+    """ Either 'redis' for server-side sessions or 'cookie' for Flask's default. """
+    SESSION_REDIS_TIMEOUT_SECONDS = 0.5
 
     MAIL_SERVER = os.environ.get("MY_SOLID_APP_MAIL_SERVER", "localhost")
     MAIL_PORT = int(os.environ.get("MY_SOLID_APP_MAIL_PORT", 1025))
@@ -41,12 +115,208 @@ class BaseConfig:
     MAIL_DEFAULT_SENDER = os.environ.get(
         "MY_SOLID_APP_MAIL_DEFAULT_SENDER", "mysolidapp@mail.com"
     )
+    SMTP_POOL_MAX_SIZE = int(os.environ.get("MY_SOLID_APP_SMTP_POOL_MAX_SIZE", 2))
+    SMTP_POOL_MAX_IDLE_SECONDS = float(
+        os.environ.get("MY_SOLID_APP_SMTP_POOL_MAX_IDLE_SECONDS", 60)
+    )
+    SMTP_POOL_PING_AFTER_SECONDS = 5.0
+    SMTP_POOL_MAX_RETRIES = 3
+    SMTP_POOL_BACKOFF_SECONDS = 0.5
+    MAIL_TRANSPORT = os.environ.get("MY_SOLID_APP_MAIL_TRANSPORT", "sync")
+    """ Either 'sync' or 'async', the latter delivers batches concurrently. """
+    MAIL_ASYNC_MAX_IN_FLIGHT = int(
+        os.environ.get("MY_SOLID_APP_MAIL_ASYNC_MAX_IN_FLIGHT", 20)
+    )
+    MAIL_ASYNC_DOMAIN_RATE = float(
+        os.environ.get("MY_SOLID_APP_MAIL_ASYNC_DOMAIN_RATE", 0)
+    )
+    """ Maximum messages per second per recipient domain, 0 means unlimited. """
+    MAIL_ASYNC_TIMEOUT_SECONDS = 30.0
+    MAIL_BATCHING_ENABLED = (
+        os.environ.get("MY_SOLID_APP_MAIL_BATCHING_ENABLED", "False") == "True"
+    )
+    MAIL_BATCH_SIZE = int(os.environ.get("MY_SOLID_APP_MAIL_BATCH_SIZE", 100))
+    MAIL_BATCH_FLUSH_AFTER_MS = int(
+        os.environ.get("MY_SOLID_APP_MAIL_BATCH_FLUSH_AFTER_MS", 500)
+    )
+    MAIL_BATCH_FLUSH_INTERVAL_SECONDS = float(
+        os.environ.get("MY_SOLID_APP_MAIL_BATCH_FLUSH_INTERVAL_SECONDS", 60)
+    )
+    """ Interval of the periodic flush that picks up jobs a failed flush left. """
+    MAIL_BATCH_MAX_RETRIES = 3
+    MAIL_BATCH_RETRY_BACKOFF_SECONDS = 30
+    MAIL_TEMPLATE_DIR = os.environ.get(
+        "MY_SOLID_APP_MAIL_TEMPLATE_DIR",
+        os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            "email_templates",
+        ),
+    )
+    MAIL_TEMPLATE_AUTO_RELOAD = False
+    MAIL_TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get(
+        "MY_SOLID_APP_MAIL_TEMPLATE_BYTECODE_CACHE_DIR"
+    )
     FILE_LOGGING = os.environ.get("MY_SOLID_APP_FILE_LOGGING", "False") == "True"
+    LOG_FORMAT = os.environ.get("MY_SOLID_APP_LOG_FORMAT", "text")
+    """ Either 'text' or 'json'. """
+    LOG_QUEUE_SIZE = int(os.environ.get("MY_SOLID_APP_LOG_QUEUE_SIZE", 10000))
+    """ Records are written by a background thread, 0 writes them synchronously. """
+    METRICS_ENABLED = os.environ.get("MY_SOLID_APP_METRICS_ENABLED", "True") == "True"
+    """ Records Prometheus metrics, served by gunicorn.conf.py, see `app.metrics`. """
+    ACCESS_LOG_SAMPLE_RATE = float(
+        os.environ.get("MY_SOLID_APP_ACCESS_LOG_SAMPLE_RATE", 1.0)
+    )
+    """ Fraction of the successful (2xx) requests that is logged. """
+
+    PAGINATION_MAX_PAGE_SIZE = int(
+        os.environ.get("MY_SOLID_APP_PAGINATION_MAX_PAGE_SIZE", 100)
+    )
+
+    USER_EXPORT_BATCH_SIZE = int(
+        os.environ.get("MY_SOLID_APP_USER_EXPORT_BATCH_SIZE", 1000)
+    )
+
+    KEY_ROTATION_BATCH_SIZE = int(
+        os.environ.get("MY_SOLID_APP_KEY_ROTATION_BATCH_SIZE", 1000)
+    )
+
+    USER_BATCH_MAX_SIZE = int(os.environ.get("MY_SOLID_APP_USER_BATCH_MAX_SIZE", 100))
+
+    PROXY_COUNT = int(os.environ.get("MY_SOLID_APP_PROXY_COUNT", 1))
+    """ Number of reverse proxies in front of the app that set X-Forwarded-For. """
+
+    RATE_LIMIT_ENABLED = (
+        os.environ.get("MY_SOLID_APP_RATE_LIMIT_ENABLED", "True") == "True"
+    )
+    RATE_LIMIT_STORAGE = os.environ.get("MY_SOLID_APP_RATE_LIMIT_STORAGE", "redis")
+    """ Either 'redis' or 'memory', the latter is not shared between workers. """
+    RATE_LIMIT_REDIS_TIMEOUT_SECONDS = 0.1
+    RATE_LIMITS = {
+        "login": {"ip": "30/minute", "email": "10/minute"},
+        "login_2fa": {"ip": "30/minute", "email": "10/minute"},
+        "forgot_password": {"ip": "10/minute", "email": "5/hour"},
+        "reset_password": {"ip": "10/minute", "email": "10/hour"},
+        "verify_email": {"ip": "10/minute", "email": "10/hour"},
+    }
+
+    TOTP_VALID_WINDOW = int(os.environ.get("MY_SOLID_APP_TOTP_VALID_WINDOW", 0))
+    """ Number of time steps before and after the current one that are accepted. """
+    TOTP_SECRET_CACHE_MAX_SIZE = 4096
+    TOTP_SECRET_CACHE_TTL_SECONDS = 60
+    TOTP_REPLAY_STORAGE = os.environ.get("MY_SOLID_APP_TOTP_REPLAY_STORAGE", "redis")
+    """ Either 'redis' or 'memory', the latter is not shared between workers. """
+    TOTP_REPLAY_REDIS_TIMEOUT_SECONDS = 0.1
+
+    TOTP_PROVISIONING_TTL_SECONDS = 600
+    TOTP_PROVISIONING_STORAGE = os.environ.get(
+        "MY_SOLID_APP_TOTP_PROVISIONING_STORAGE", "redis"
+    )
+    """ Either 'redis' or 'memory', the latter is not shared between workers. """
+    TOTP_PROVISIONING_REDIS_TIMEOUT_SECONDS = 0.5
+    QR_CODE_MASK_PATTERN = None
+    """ None picks the most readable of all 8 masks, a fixed one encodes ~5x faster. """
+    QR_CODE_PNG_BOX_SIZE = 10
+    QR_CODE_CACHE_MAX_SIZE = 256
+
+    USER_CACHE_ENABLED = (
+        os.environ.get("MY_SOLID_APP_USER_CACHE_ENABLED", "True") == "True"
+    )
+    USER_CACHE_MAX_SIZE = int(os.environ.get("MY_SOLID_APP_USER_CACHE_MAX_SIZE", 4096))
+    USER_CACHE_TTL_SECONDS = float(
+        os.environ.get("MY_SOLID_APP_USER_CACHE_TTL_SECONDS", 5)
+    )
+    USER_CACHE_REDIS_ENABLED = (
+        os.environ.get("MY_SOLID_APP_USER_CACHE_REDIS_ENABLED", "False") == "True"
+    )
+    USER_CACHE_REDIS_TTL_SECONDS = int(
+        os.environ.get("MY_SOLID_APP_USER_CACHE_REDIS_TTL_SECONDS", 300)
+    )
+    USER_CACHE_REDIS_TIMEOUT_SECONDS = 0.05
+
+    PASSWORD_HASH_METHOD = os.environ.get(
+        "MY_SOLID_APP_PASSWORD_HASH_METHOD", "scrypt:32768:8:1"
+    )
+    """ Werkzeug hash method including its cost parameters, about 0.1s per hash. """
+    PASSWORD_HASH_POOL_SIZE = int(
+        os.environ.get("MY_SOLID_APP_PASSWORD_HASH_POOL_SIZE", 4)
+    )
+    """ Processes per worker that hash a batch of passwords, 0 hashes them in turn. """
+    PASSWORD_HASH_MAX_CONCURRENCY = int(
+        os.environ.get("MY_SOLID_APP_PASSWORD_HASH_MAX_CONCURRENCY", 3)
+    )
+    """ Requests of all workers that may hash at the same time, 0 disables the limit. """
+    PASSWORD_HASH_ACQUIRE_TIMEOUT_SECONDS = 1.0
+    """ How long a request waits for a hashing slot before it fails with a 503. """
+    PASSWORD_HASH_LIMIT_STORAGE = os.environ.get(
+        "MY_SOLID_APP_PASSWORD_HASH_LIMIT_STORAGE", "redis"
+    )
+    """ Either 'redis' or 'memory', the latter is not shared between workers. """
+    PASSWORD_HASH_REDIS_TIMEOUT_SECONDS = 0.1
+
+    OUTBOX_RELAY_BATCH_SIZE = int(
+        os.environ.get("MY_SOLID_APP_OUTBOX_RELAY_BATCH_SIZE", 500)
+    )
+    OUTBOX_RELAY_INTERVAL_SECONDS = float(
+        os.environ.get("MY_SOLID_APP_OUTBOX_RELAY_INTERVAL_SECONDS", 1)
+    )
 
+    CELERY_PERSISTENT_APP_CONTEXT = (
+        os.environ.get("MY_SOLID_APP_CELERY_PERSISTENT_APP_CONTEXT", "True") == "True"
+    )
+    """ Pushes one app context per worker process instead of one per task. """
+    CELERY_METRICS_PORT = int(os.environ.get("MY_SOLID_APP_CELERY_METRICS_PORT", 9540))
+    """ Port on which a worker serves its task metrics, 0 disables it. """
+    CELERY_METRICS_URLS = os.environ.get(
+        "MY_SOLID_APP_CELERY_METRICS_URLS", "http://localhost:9540/metrics"
+    ).split(",")
+    """ Metrics endpoints of all worker pools, which `flask task-stats` sums up. """
+    CELERY_WORKER_PRESET = os.environ.get("MY_SOLID_APP_CELERY_WORKER_PRESET", "all")
+    """ Selects the queues a worker consumes, and its prefetch and ack settings. """
+    CELERY_WORKER_PRESETS = {
+        "all": {},
+        # Short tasks that users wait for, every message is only acknowledged after
+        # it ran and a worker never holds messages another worker could run.
+        "transactional": {
+            "task_queues": (Queue("transactional"), Queue("default")),
+            "worker_prefetch_multiplier": 1,
+            "task_acks_late": True,
+        },
+        "bulk": {
+            "task_queues": (Queue("bulk"),),
+            "worker_prefetch_multiplier": 4,
+        },
+    }
     CELERY = {
         "broker_url": f"redis://{MY_SOLID_APP_REDIS_HOST}",
         "result_backend": f"redis://{MY_SOLID_APP_REDIS_HOST}",
         "task_ignore_result": True,
+        "task_default_queue": "default",
+        "task_queues": (Queue("transactional"), Queue("bulk"), Queue("default")),
+        "task_routes": {
+            "app.tasks.mail_tasks.send_forgot_password_email": {
+                "queue": "transactional",
+                "priority": 0,
+            },
+            "app.tasks.mail_tasks.send_email_verification_email": {"queue": "bulk"},
+            "app.tasks.mail_tasks.send_mail_batch": {"queue": "bulk"},
+        },
+        # Redis emulates priorities with a list per priority step, 0 is the highest.
+        "task_default_priority": 5,
+        "broker_transport_options": {
+            "priority_steps": list(range(10)),
+            "sep": ":",
+            "queue_order_strategy": "priority",
+        },
+        "beat_schedule": {
+            "relay-outbox": {
+                "task": "app.tasks.outbox_tasks.relay_outbox_task",
+                "schedule": OUTBOX_RELAY_INTERVAL_SECONDS,
+            },
+            "flush-mail-batches": {
+                "task": "app.tasks.mail_batching.flush_mail_batches",
+                "schedule": MAIL_BATCH_FLUSH_INTERVAL_SECONDS,
+            },
+        },
     }
 
 
@@ -58,9 +328,22 @@ class ProdConfig(BaseConfig):
 class DevConfig(BaseConfig):
     ENV = "dev"
     DEBUG = True
+    MAIL_TEMPLATE_AUTO_RELOAD = True
 
 
 class TestConfig(BaseConfig):
     TESTING = True
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_ENGINE_OPTIONS = {"pool_pre_ping": True}
+    DB_REPLICA_URIS = {}
+    QUERY_BUDGET_MODE = "raise"
+    CELERY_METRICS_PORT = 0
+    USER_CACHE_REDIS_ENABLED = False
+    RATE_LIMIT_STORAGE = "memory"
+    SESSION_STORAGE = "cookie"
+    TOTP_REPLAY_STORAGE = "memory"
+    TOTP_PROVISIONING_STORAGE = "memory"
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:1000"
+    PASSWORD_HASH_LIMIT_STORAGE = "memory"
+    PASSWORD_HASH_POOL_SIZE = 0
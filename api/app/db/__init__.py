@@ -1 +1,2 @@
+from app.db.outbox import OutboxMessage
 from app.db.user import User
@@ -0,0 +1,21 @@
+import time
+
+from sqlalchemy import JSON, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.extensions import db
+
+
+class OutboxMessage(db.Model):
+    """
+    A Celery task that still has to be published. Messages are written in the same
+    transaction as the change that caused them and are published by the outbox
+    relay, so request handlers never wait on the broker.
+    """
+
+    __tablename__ = "outbox_message"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    task_name: Mapped[str] = mapped_column(String(255))
+    kwargs: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[int] = mapped_column(default=lambda: int(time.time()))
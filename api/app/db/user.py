@@ -1,14 +1,19 @@
-import secrets
 import time
 
 from flask_login import UserMixin
 from marshmallow import Schema, fields, validate
 from sqlalchemy import String
 from sqlalchemy.orm import Mapped, mapped_column
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from app.extensions import db
 from app.fernet import decrypt, encrypt
+from app.passwords import password_hasher
+from app.tokens import (
+    TOKEN_DIGEST_PREFIX,
+    check_token,
+    generate_token,
+    token_digest,
+)
 
 
 class User(db.Model, UserMixin):
@@ -32,37 +37,50 @@ class User(db.Model, UserMixin):
     encrypted_totp_secret: Mapped[str | None] = mapped_column(String(256), nullable=True)
 
     def set_password(self, password: str):
-        self.hashed_password = generate_password_hash(password)
+        self.hashed_password = password_hasher.hash(password)
 
     def is_correct_password(self, password: str) -> bool:
-        return check_password_hash(self.hashed_password, password)
+        return password_hasher.verify(self.hashed_password, password)
+
+    def rehash_password_if_needed(self, password: str) -> bool:
+        """
+        Rehashes the (already verified) password when it was hashed with different
+        parameters than the currently configured ones. Returns whether it did so.
+        """
+        if not password_hasher.needs_rehash(self.hashed_password):
+            return False
+
+        self.set_password(password)
+        return True
+
+    @classmethod
+    def find_by_password_reset_token(cls, email: str, reset_token: str):
+        return _find_by_token(cls.password_reset_token, email, reset_token)
+
+    @classmethod
+    def find_by_email_verification_token(cls, email: str, verification_token: str):
+        return _find_by_token(cls.email_verification_token, email, verification_token)
 
     def set_password_reset_token(self):
-        token = secrets.token_urlsafe(32)
-        self.password_reset_token = generate_password_hash(token)
+        token = generate_token()
+        self.password_reset_token = token_digest(token)
         self.password_reset_time = int(time.time())
         return token
 
     def check_password_reset_token(self, reset_token: str) -> bool:
-        if self.password_reset_token is None:
-            return False
-
-        return check_password_hash(self.password_reset_token, reset_token)
+        return check_token(self.password_reset_token, reset_token)
 
     def clear_password_reset_token(self):
         self.password_reset_token = None
         self.password_reset_time = None
 
     def set_email_verification_token(self):
-        token = secrets.token_urlsafe(32)
-        self.email_verification_token = generate_password_hash(token)
+        token = generate_token()
+        self.email_verification_token = token_digest(token)
         return token
 
     def check_email_verification_token(self, verification_token: str):
-        if self.email_verification_token is None:
-            return False
-
-        return check_password_hash(self.email_verification_token, verification_token)
+        return check_token(self.email_verification_token, verification_token)
 
     def clear_email_verification_token(self):
         self.email_verification_token = None
@@ -83,6 +101,25 @@ class User(db.Model, UserMixin):
         self.encrypted_totp_secret = encrypt(totp_secret)
 
 
+def _find_by_token(column, email: str, token: str) -> User | None:
+    """
+    Looks up the user with the given email and token, through the email index. Only
+    when that fails, a token issued under the old KDF scheme is verified, which
+    never happens for users that have a token under the current scheme.
+    """
+    user = User.query.filter(User.email == email, column == token_digest(token)).first()
+    if user is not None:
+        return user
+
+    user = User.query.filter(
+        User.email == email, column.not_like(f"{TOKEN_DIGEST_PREFIX}%")
+    ).first()
+    if user is not None and check_token(getattr(user, column.key), token):
+        return user
+
+    return None
+
+
 class UserSchema(Schema):
     id = fields.Integer()
     email = fields.String(validate=validate.Length(max=100))
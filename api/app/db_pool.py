@@ -0,0 +1,68 @@
+import os
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from app.extensions import db, replica_router
+
+
+class PoolMonitor:
+    """
+    Keeps statistics of the connection pools of this worker process, such as the
+    number of new connections and the number of connections that were invalidated
+    because they turned out to be dropped by the database server.
+    """
+
+    def __init__(self):
+        self.events: dict[str | None, Counter] = {}
+
+    def init_app(self, app):
+        self.events = {}
+        with app.app_context():
+            for bind, engine in _engines().items():
+                self._listen(bind, engine)
+
+    def stats(self) -> dict:
+        binds = {}
+        for bind, engine in _engines().items():
+            pool = engine.pool
+            stats = {"pool": type(pool).__name__, **self.events.get(bind, Counter())}
+            if isinstance(pool, QueuePool):
+                stats.update(
+                    size=pool.size(),
+                    checked_in=pool.checkedin(),
+                    checked_out=pool.checkedout(),
+                    overflow=pool.overflow(),
+                )
+            binds[bind or "default"] = stats
+
+        return {"pid": os.getpid(), "binds": binds}
+
+    def _listen(self, bind, engine):
+        events = self.events[bind] = Counter(
+            connects=0, checkouts=0, invalidations=0, soft_invalidations=0
+        )
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            events["connects"] += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            events["checkouts"] += 1
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            events["invalidations"] += 1
+
+        @event.listens_for(engine, "soft_invalidate")
+        def on_soft_invalidate(dbapi_connection, connection_record, exception):
+            events["soft_invalidations"] += 1
+
+
+def _engines() -> dict:
+    return {**db.engines, **replica_router.engines}
+
+
+pool_monitor = PoolMonitor()
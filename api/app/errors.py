@@ -16,13 +16,30 @@ class APIErrorEnum(IntEnum):
     already_2fa_disabled = 11
     user_not_found = 12
     unknown_error = 13
+    server_busy = 14
+    invalid_pagination_cursor = 15
+    invalid_export_format = 16
+    invalid_request_data = 17
+    too_many_requests = 18
+    provisioning_not_found = 19
 
 
 class APIError(Exception):
-    def __init__(self, code: APIErrorEnum, message: str, status: int = 400):
+    def __init__(
+        self,
+        code: APIErrorEnum,
+        message: str,
+        status: int = 400,
+        headers: dict | None = None,
+    ):
         self.code = code
         self.message = message
         self.status = status
+        self.headers = headers or {}
 
     def to_response(self):
-        return {"error": self.code.value, "message": self.message}, self.status
+        return (
+            {"error": self.code.value, "message": self.message},
+            self.status,
+            self.headers,
+        )
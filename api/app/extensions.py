@@ -1,16 +1,162 @@
+import itertools
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+import redis
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_migrate import Migrate
 from flask_restx import Api
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Engine, Select, create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import DeclarativeBase
 
+logger = logging.getLogger(__name__)
+
 
 class ModelBase(DeclarativeBase):
     pass
 
 
-db = SQLAlchemy(model_class=ModelBase)
+# Columns of `SHOW REPLICA STATUS` in MySQL 8.0.22 and later, and before that
+LAG_COLUMNS = {"Seconds_Behind_Source", "Seconds_Behind_Master"}
+
+
+class ReplicaRouter:
+    """
+    Picks the read replica for read-only requests according to a policy, being
+    'round_robin', 'random' or 'least_lag'. The replication lag of every replica is
+    measured at most once per `check_interval` per worker, replicas lagging more
+    than `max_lag` or failing the check are skipped until the next check. When no
+    replica is healthy, reads fall back to the primary.
+    """
+
+    def __init__(self):
+        self.engines: dict[str, Engine] = {}
+        self.policy = "round_robin"
+        self.max_lag = 5.0
+        self.check_interval = 5.0
+        self.lag_query: str | None = None
+        self._lags: dict[str, tuple[float, float | None]] = {}
+        self._counter = itertools.count()
+
+    def init_app(self, app):
+        # Replicas are not binds of Flask-SQLAlchemy, as those would be part of
+        # `create_all` and `drop_all`.
+        self.engines = {
+            name: create_engine(uri, **app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+            for name, uri in app.config["DB_REPLICA_URIS"].items()
+        }
+        self.policy = app.config["DB_REPLICA_POLICY"]
+        self.max_lag = app.config["DB_REPLICA_MAX_LAG_SECONDS"]
+        self.check_interval = app.config["DB_REPLICA_CHECK_INTERVAL_SECONDS"]
+        self.lag_query = app.config["DB_REPLICA_LAG_QUERY"]
+        self._lags = {}
+        self._counter = itertools.count()
+
+    def choose(self) -> str | None:
+        lags = {name: self.lag(name) for name in self.engines}
+        healthy = [name for name, lag in lags.items() if lag is not None]
+        if not healthy:
+            return None
+
+        if self.policy == "random":
+            return random.choice(healthy)
+        if self.policy == "least_lag":
+            return min(healthy, key=lags.__getitem__)
+
+        return healthy[next(self._counter) % len(healthy)]
+
+    def lag(self, name: str) -> float | None:
+        """Returns the last measured lag of the replica, None when it is unhealthy."""
+        checked_at, lag = self._lags.get(name, (float("-inf"), None))
+        if time.monotonic() - checked_at >= self.check_interval:
+            lag = self._measure_lag(name)
+            if lag is not None and lag > self.max_lag:
+                logger.warning("Replica %s lags %.1fs behind, skipping it", name, lag)
+                lag = None
+            self._lags[name] = (time.monotonic(), lag)
+
+        return lag
+
+    def _measure_lag(self, name: str) -> float | None:
+        if self.lag_query is None:
+            return 0.0
+
+        try:
+            with self.engines[name].connect() as connection:
+                row = connection.execute(text(self.lag_query)).mappings().first()
+        except SQLAlchemyError:
+            logger.warning("Could not determine the lag of replica %s", name)
+            return None
+
+        if row is None or not LAG_COLUMNS & row.keys():
+            logger.warning(
+                "Replica %s did not report its lag, check that it replicates and "
+                "that the user has the REPLICATION CLIENT privilege",
+                name,
+            )
+            return None
+
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return float(lag) if lag is not None else None
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to a replica when the request opted in with `use_read_replica`,
+    all reads of the request go to the same replica. Writes, locking reads, and
+    every read after the first write of the session go to the primary, such that a
+    request always reads its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if not _is_plain_read(clause):
+                self.info["wrote"] = True
+            elif self.info.get("use_read_replica") and not self.info.get("wrote"):
+                replica = self.info.get("read_replica") or replica_router.choose()
+                if replica is not None:
+                    self.info["read_replica"] = replica
+                    return replica_router.engines[replica]
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _mark_written(session, flush_context, instances):
+    # Flushes get their bind per mapper, without a clause to tell they write.
+    session.info["wrote"] = True
+
+
+def _is_plain_read(clause) -> bool:
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+
+replica_router = ReplicaRouter()
+db = SQLAlchemy(model_class=ModelBase, session_options={"class_": RoutingSession})
+
+
+@contextmanager
+def read_from_primary():
+    """Sends the reads in the block to the primary, also in a replica request."""
+    use_read_replica = db.session.info.pop("use_read_replica", None)
+    try:
+        yield
+    finally:
+        if use_read_replica is not None:
+            db.session.info["use_read_replica"] = use_read_replica
+
+
+def redis_client(app, timeout: float | None = None) -> redis.Redis:
+    """Returns a client of the Redis at `REDIS_URL`, which all services share."""
+    return redis.Redis.from_url(app.config["REDIS_URL"], socket_timeout=timeout)
+
+
 api = Api()
 login_manager = LoginManager()
 migrate = Migrate()
@@ -1,13 +1,27 @@
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
 
-from app.config import MY_SOLID_APP_FERNET_SECRET_KEY
+from app.config import MY_SOLID_APP_FERNET_SECRET_KEYS
 
-fernet = Fernet(MY_SOLID_APP_FERNET_SECRET_KEY)
+primary = Fernet(MY_SOLID_APP_FERNET_SECRET_KEYS[0])
+fernet = MultiFernet([Fernet(key) for key in MY_SOLID_APP_FERNET_SECRET_KEYS])
 
 
-def encrypt(value: str):
-    return fernet.encrypt(value.encode()).decode()
+def encrypt(value: str) -> str:
+    return fernet.encrypt(value.encode()).decode("ascii")
 
 
-def decrypt(value: str):
-    return fernet.decrypt(value.encode()).decode()
+def decrypt(value: str) -> str:
+    return fernet.decrypt(value.encode("ascii")).decode()
+
+
+def rotate(value: str) -> str | None:
+    """
+    Re-encrypts the value with the primary key, or returns None when it already is
+    encrypted with the primary key.
+    """
+    token = value.encode("ascii")
+    try:
+        primary.decrypt(token)
+        return None
+    except InvalidToken:
+        return fernet.rotate(token).decode("ascii")
@@ -0,0 +1,88 @@
+import time
+from dataclasses import dataclass, field
+
+from cryptography.fernet import InvalidToken
+from flask import current_app
+from sqlalchemy import bindparam, select, update
+
+from app.cache import user_cache
+from app.db.user import User
+from app.extensions import db
+from app.fernet import rotate
+
+
+@dataclass
+class RotationStats:
+    scanned: int = 0
+    rotated: int = 0
+    conflicts: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed else 0.0
+
+
+def rotate_totp_secrets(batch_size: int, on_batch=None) -> RotationStats:
+    """
+    Re-encrypts every `encrypted_totp_secret` that is not encrypted with the primary
+    key yet. Rows are streamed from a server-side cursor on a separate connection,
+    while every batch is updated with a single executemany in its own short
+    transaction, so the `user` table is never locked as a whole.
+
+    An update only applies when the ciphertext did not change since it was read,
+    such that a secret changed by the user in the meantime is never overwritten.
+    """
+    table = User.__table__
+    statement = (
+        update(table)
+        .where(
+            table.c.id == bindparam("b_id"),
+            table.c.encrypted_totp_secret == bindparam("b_old"),
+        )
+        .values(encrypted_totp_secret=bindparam("b_new"))
+    )
+
+    stats = RotationStats()
+    with db.engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(
+            select(table.c.id, table.c.encrypted_totp_secret)
+            .where(table.c.encrypted_totp_secret.is_not(None))
+            .order_by(table.c.id)
+        )
+
+        for rows in result.partitions():
+            params = []
+            for user_id, encrypted in rows:
+                try:
+                    rotated = rotate(encrypted)
+                except InvalidToken:
+                    current_app.logger.error(
+                        "Could not decrypt the TOTP secret of user %d", user_id
+                    )
+                    stats.failed += 1
+                    continue
+
+                if rotated is not None:
+                    params.append(
+                        {"b_id": user_id, "b_old": encrypted, "b_new": rotated}
+                    )
+
+            stats.scanned += len(rows)
+            if params:
+                updated = db.session.execute(statement, params).rowcount
+                db.session.commit()
+                user_cache.invalidate_many([p["b_id"] for p in params])
+
+                stats.rotated += updated
+                stats.conflicts += len(params) - updated
+
+            if on_batch is not None:
+                on_batch(stats)
+
+    return stats
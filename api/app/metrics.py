@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+from celery.signals import after_task_publish, before_task_publish
+from flask import g, request
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.query_stats import query_stats
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.25,
+    0.5,
+    0.75,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Duration of HTTP requests.",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "http_requests", "HTTP responses by status.", ["method", "endpoint", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled.",
+    multiprocess_mode="livesum",
+)
+API_ERRORS = Counter("api_errors", "API errors by error code.", ["code", "name"])
+DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent on SQL queries per HTTP request.",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+CELERY_PUBLISH_TIME = Histogram(
+    "celery_publish_duration_seconds",
+    "Time spent publishing a task to the broker.",
+    ["task"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+MAX_PENDING_PUBLISHES = 1000
+
+
+class Metrics:
+    """
+    Records Prometheus metrics of the requests handled by this app. When
+    `PROMETHEUS_MULTIPROC_DIR` is set, which has to happen before the app is
+    imported, every gunicorn worker writes its metrics to files in that directory
+    and the gunicorn master serves those of all workers on an internal port, see
+    gunicorn.conf.py. They are not served by the app, such that they can not be
+    reached from outside.
+
+    Requests are labelled with their URL rule rather than their path, such that the
+    number of series does not grow with the ids in the URLs.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._publish_started: OrderedDict[str, float] = OrderedDict()
+        self._publish_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config["METRICS_ENABLED"]
+        if not self.enabled:
+            return
+
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        app.teardown_request(self.teardown_request)
+
+    def start_request(self):
+        g.metrics_started_at = time.perf_counter()
+        REQUESTS_IN_PROGRESS.inc()
+
+    def end_request(self, response):
+        started_at = g.get("metrics_started_at")
+        if started_at is None:
+            return response
+
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.labels(request.method, endpoint).observe(
+            time.perf_counter() - started_at
+        )
+        REQUESTS.labels(request.method, endpoint, response.status_code).inc()
+        DB_TIME.labels(endpoint).observe(query_stats.current()[1])
+        return response
+
+    def teardown_request(self, exception):
+        if g.pop("metrics_started_at", None) is not None:
+            REQUESTS_IN_PROGRESS.dec()
+
+    def count_api_error(self, code):
+        if self.enabled:
+            API_ERRORS.labels(code.value, code.name).inc()
+
+    def before_publish(self, headers=None, **kwargs):
+        if self.enabled and headers and "id" in headers:
+            with self._publish_lock:
+                self._publish_started[headers["id"]] = time.perf_counter()
+                # No `after_task_publish` is sent for a publish that failed
+                if len(self._publish_started) > MAX_PENDING_PUBLISHES:
+                    self._publish_started.popitem(last=False)
+
+    def after_publish(self, sender=None, headers=None, **kwargs):
+        if not (self.enabled and headers and "id" in headers):
+            return
+
+        with self._publish_lock:
+            started_at = self._publish_started.pop(headers["id"], None)
+        if started_at is not None:
+            CELERY_PUBLISH_TIME.labels(sender).observe(time.perf_counter() - started_at)
+
+
+metrics = Metrics()
+before_task_publish.connect(metrics.before_publish, weak=False)
+after_task_publish.connect(metrics.after_publish, weak=False)
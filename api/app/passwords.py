@@ -0,0 +1,199 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+
+import redis
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.errors import APIError, APIErrorEnum
+from app.extensions import redis_client
+
+# Takes a slot when fewer than ARGV[1] are taken. The key expires after ARGV[2]
+# seconds without new hashes, such that slots of a killed worker are not lost.
+ACQUIRE_SCRIPT = """
+local taken = redis.call("INCR", KEYS[1])
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+if taken > tonumber(ARGV[1]) then
+    redis.call("DECR", KEYS[1])
+    return 0
+end
+return 1
+"""
+
+RELEASE_SCRIPT = """
+if tonumber(redis.call("GET", KEYS[1]) or 0) > 0 then
+    redis.call("DECR", KEYS[1])
+end
+"""
+
+SLOTS_KEY = "password_hash:slots"
+SLOTS_TTL_SECONDS = 60
+
+
+class MemorySlots:
+    """In-process hashing slots, only meant for tests and single process setups."""
+
+    def __init__(self):
+        self._taken = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, limit: int) -> bool:
+        with self._lock:
+            if self._taken >= limit:
+                return False
+
+            self._taken += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._taken = max(self._taken - 1, 0)
+
+
+class RedisSlots:
+    """Hashing slots shared by all workers, counted in a single Redis key."""
+
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self, limit: int) -> bool:
+        return bool(self._acquire(keys=[SLOTS_KEY], args=[limit, SLOTS_TTL_SECONDS]))
+
+    def release(self):
+        self._release(keys=[SLOTS_KEY])
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with werkzeug, using `PASSWORD_HASH_METHOD`
+    including its cost parameters. Hashes of an older method are upgraded on login,
+    see `needs_rehash`.
+
+    Hashing is CPU bound and takes the whole sync worker, so at most
+    `PASSWORD_HASH_MAX_CONCURRENCY` requests of all workers hash at the same time.
+    A request that gets no slot within the acquire timeout fails with a 503, such
+    that a burst of logins can not occupy every worker. When Redis can not be
+    reached, hashing is not limited.
+
+    `hash_many` hashes a batch in a pool of `PASSWORD_HASH_POOL_SIZE` processes per
+    worker, which is started on the first batch. The batch takes a single slot.
+    """
+
+    def __init__(self):
+        self.method = "scrypt:32768:8:1"
+        self.method_prefix: str | None = None
+        self.max_concurrency = 0
+        self.acquire_timeout = 1.0
+        self.pool_size = 0
+        self.slots: MemorySlots | RedisSlots = MemorySlots()
+        self._executor: ProcessPoolExecutor | None = None
+        self._executor_pid: int | None = None
+
+    def init_app(self, app):
+        self.method = app.config["PASSWORD_HASH_METHOD"]
+        self.method_prefix = None
+        self.max_concurrency = app.config["PASSWORD_HASH_MAX_CONCURRENCY"]
+        self.acquire_timeout = app.config["PASSWORD_HASH_ACQUIRE_TIMEOUT_SECONDS"]
+        self.pool_size = app.config["PASSWORD_HASH_POOL_SIZE"]
+        self.shutdown()
+        self.slots = (
+            RedisSlots(
+                redis_client(app, app.config["PASSWORD_HASH_REDIS_TIMEOUT_SECONDS"])
+            )
+            if app.config["PASSWORD_HASH_LIMIT_STORAGE"] == "redis"
+            else MemorySlots()
+        )
+
+    def hash(self, password: str) -> str:
+        with self._slot():
+            return generate_password_hash(password, self.method)
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        with self._slot():
+            if self.pool_size <= 0 or len(passwords) < 2:
+                return [generate_password_hash(p, self.method) for p in passwords]
+
+            return list(
+                self._get_executor().map(
+                    generate_password_hash, passwords, repeat(self.method)
+                )
+            )
+
+    def verify(self, hashed_password: str, password: str) -> bool:
+        with self._slot():
+            return check_password_hash(hashed_password, password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        if self.method_prefix is None:
+            self.method_prefix = _method_prefix(self.method)
+
+        return hashed_password.split("$", 1)[0] != self.method_prefix
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        self._executor = None
+        self._executor_pid = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Gunicorn forks its workers after the app is created, so every worker
+        # lazily starts its own pool instead of inheriting a broken one. The
+        # hashing processes come from a forkserver, as forking a worker that
+        # runs threads may deadlock the child.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            self._executor_pid = os.getpid()
+
+        return self._executor
+
+    @contextmanager
+    def _slot(self):
+        if not self.max_concurrency:
+            yield
+            return
+
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            try:
+                acquired = self.slots.acquire(self.max_concurrency)
+            except redis.RedisError:
+                current_app.logger.warning("Could not limit password hashing in redis")
+                yield
+                return
+
+            if acquired:
+                break
+            if time.monotonic() >= deadline:
+                raise APIError(
+                    APIErrorEnum.server_busy,
+                    "The server is too busy to handle this request, try again later",
+                    503,
+                )
+            time.sleep(0.01)
+
+        try:
+            yield
+        finally:
+            try:
+                self.slots.release()
+            except redis.RedisError:
+                current_app.logger.warning("Could not release password hash slot")
+
+
+def _method_prefix(method: str) -> str:
+    """Returns the fully expanded method werkzeug stores in front of the salt."""
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,181 @@
+import io
+import json
+import secrets
+
+import qrcode
+import redis
+from cryptography.fernet import InvalidToken
+from flask import current_app
+from PIL import Image
+
+from app.cache import LRUCache
+from app.extensions import redis_client
+from app.fernet import encrypt, fernet
+
+QR_CODE_MIMETYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+def qr_code_matrix(data: str, mask_pattern: int | None = None) -> list[list[bool]]:
+    """
+    Encodes the data into a QR code, including a quiet zone of 4 modules. Passing
+    a fixed mask pattern skips scoring all 8 masks, which is most of the work.
+    """
+    qr = qrcode.QRCode(border=4, mask_pattern=mask_pattern)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_svg(matrix: list[list[bool]]) -> bytes:
+    """Renders the matrix as one SVG path with a rectangle per run of dark modules."""
+    size = len(matrix)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+
+            start = x
+            while x < size and row[x]:
+                x += 1
+            runs.append(f"M{start} {y}h{x - start}v1h{start - x}z")
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges"><path fill="#fff" d="M0 0h{size}v{size}H0z"/>'
+        f'<path d="{"".join(runs)}"/></svg>'
+    ).encode()
+
+
+def render_png(matrix: list[list[bool]], box_size: int = 10) -> bytes:
+    """Renders the matrix as a 1-bit PNG, scaling up one pixel per module."""
+    size = len(matrix)
+    image = Image.new("1", (size, size))
+    image.putdata([0 if dark else 1 for row in matrix for dark in row])
+    image = image.resize((size * box_size, size * box_size), Image.Resampling.NEAREST)
+
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+class MemoryProvisioningStorage:
+    """In-process storage of provisioning URIs, only meant for tests."""
+
+    def __init__(self, ttl: int):
+        self._entries = LRUCache(max_size=1024, ttl=ttl)
+
+    def set(self, key: str, value: dict):
+        self._entries.set(key, value)
+
+    def get(self, key: str) -> dict | None:
+        return self._entries.get(key)
+
+
+class RedisProvisioningStorage:
+    def __init__(self, client: redis.Redis, ttl: int):
+        self.redis = client
+        self.ttl = ttl
+
+    def set(self, key: str, value: dict):
+        self.redis.set(key, json.dumps(value), ex=self.ttl)
+
+    def get(self, key: str) -> dict | None:
+        raw = self.redis.get(key)
+        return json.loads(raw) if raw is not None else None
+
+
+class QRCodeService:
+    """
+    Serves the QR codes for setting up 2FA from their own endpoint, instead of
+    rendering a PNG inside the JSON response that creates the secret.
+
+    The provisioning URI is stored under a short-lived random id, every id is only
+    rendered once per format and worker, after which it is served from an LRU. When
+    the URI can not be stored, the id is the encrypted URI itself instead.
+    """
+
+    def __init__(self):
+        self.ttl = 600
+        self.mask_pattern: int | None = None
+        self.png_box_size = 10
+        self.rendered = LRUCache()
+        self.storage: MemoryProvisioningStorage | RedisProvisioningStorage = (
+            MemoryProvisioningStorage(self.ttl)
+        )
+
+    def init_app(self, app):
+        self.ttl = app.config["TOTP_PROVISIONING_TTL_SECONDS"]
+        self.mask_pattern = app.config["QR_CODE_MASK_PATTERN"]
+        self.png_box_size = app.config["QR_CODE_PNG_BOX_SIZE"]
+        self.rendered = LRUCache(
+            max_size=app.config["QR_CODE_CACHE_MAX_SIZE"], ttl=self.ttl
+        )
+        self.storage = (
+            RedisProvisioningStorage(
+                redis_client(app, app.config["TOTP_PROVISIONING_REDIS_TIMEOUT_SECONDS"]),
+                self.ttl,
+            )
+            if app.config["TOTP_PROVISIONING_STORAGE"] == "redis"
+            else MemoryProvisioningStorage(self.ttl)
+        )
+
+    def create_provisioning(self, user_id: int, uri: str) -> str:
+        provisioning = {"user_id": user_id, "uri": uri}
+        provisioning_id = secrets.token_urlsafe(16)
+        try:
+            self.storage.set(_provisioning_key(provisioning_id), provisioning)
+        except redis.RedisError:
+            current_app.logger.warning("Could not store provisioning in redis")
+            return encrypt(json.dumps(provisioning))
+
+        return provisioning_id
+
+    def render(
+        self, provisioning_id: str, user_id: int, image_format: str
+    ) -> bytes | None:
+        """
+        Returns the QR code of the provisioning id in the given format, or None when
+        the id does not exist (anymore) or belongs to a different user.
+        """
+        key = (provisioning_id, user_id, image_format)
+        image = self.rendered.get(key)
+        if image is not None:
+            return image
+
+        provisioning = self._get_provisioning(provisioning_id)
+        if provisioning is None or provisioning["user_id"] != user_id:
+            return None
+
+        matrix = qr_code_matrix(provisioning["uri"], self.mask_pattern)
+        if image_format == "svg":
+            image = render_svg(matrix)
+        else:
+            image = render_png(matrix, self.png_box_size)
+
+        self.rendered.set(key, image)
+        return image
+
+    def _get_provisioning(self, provisioning_id: str) -> dict | None:
+        try:
+            provisioning = self.storage.get(_provisioning_key(provisioning_id))
+        except redis.RedisError:
+            current_app.logger.warning("Could not read provisioning from redis")
+            provisioning = None
+
+        if provisioning is not None:
+            return provisioning
+
+        try:
+            return json.loads(fernet.decrypt(provisioning_id.encode(), ttl=self.ttl))
+        except (InvalidToken, UnicodeEncodeError):
+            return None
+
+
+def _provisioning_key(provisioning_id: str) -> str:
+    return f"totp_provisioning:{provisioning_id}"
+
+
+qr_code_service = QRCodeService()
@@ -0,0 +1,95 @@
+import time
+
+from flask import g, has_app_context, has_request_context, request
+from sqlalchemy import Engine, event
+
+
+class QueryBudgetExceededError(Exception):
+    pass
+
+
+class QueryStats:
+    """
+    Counts the SQL queries and the time spent on them per request, for every
+    engine. The totals are added to the access log line and a `Server-Timing`
+    header, and statements slower than `SLOW_QUERY_THRESHOLD_MS` are logged with
+    the endpoint that issued them.
+
+    Endpoints can declare a query budget with `query_budget`, exceeding it is
+    logged, or raises `QueryBudgetExceededError` when `QUERY_BUDGET_MODE` is 'raise'.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.slow_query_threshold = 0.2
+        self.budget_mode = "warn"
+
+    def init_app(self, app):
+        self.app = app
+        self.slow_query_threshold = app.config["SLOW_QUERY_THRESHOLD_MS"] / 1000
+        self.budget_mode = app.config["QUERY_BUDGET_MODE"]
+
+        app.before_request(self.reset)
+        app.after_request(self.after_request)
+
+    def reset(self):
+        g.query_count = 0
+        g.query_time = 0.0
+        g.pop("query_budget", None)
+
+    def current(self) -> tuple[int, float]:
+        """Returns the number of queries and their duration in seconds so far."""
+        return g.get("query_count", 0), g.get("query_time", 0.0)
+
+    def after_request(self, response):
+        count, duration = self.current()
+        response.headers.add(
+            "Server-Timing", f'db;dur={duration * 1000:.1f};desc="{count} queries"'
+        )
+
+        budget = g.get("query_budget")
+        if budget is not None and count > budget:
+            message = (
+                f"{request.method} {request.path} issued {count} queries, "
+                f"exceeding its budget of {budget}"
+            )
+            if self.budget_mode == "raise":
+                raise QueryBudgetExceededError(message)
+            if self.budget_mode == "warn":
+                self.app.logger.warning(message)
+
+        return response
+
+    def record(self, statement: str, duration: float):
+        if has_app_context():
+            g.query_count = g.get("query_count", 0) + 1
+            g.query_time = g.get("query_time", 0.0) + duration
+
+        if self.app is not None and duration >= self.slow_query_threshold:
+            self.app.logger.warning(
+                "Slow query (%.1f ms) in %s: %s",
+                duration * 1000,
+                request.endpoint if has_request_context() else "-",
+                statement[:1000],
+            )
+
+
+query_stats = QueryStats()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started_at = conn.info["query_start_time"].pop()
+    query_stats.record(statement, time.perf_counter() - started_at)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_query_timer(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
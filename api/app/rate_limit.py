@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+from typing import NamedTuple
+
+import redis
+from flask import current_app
+
+from app.extensions import redis_client
+
+# Generic cell rate algorithm: every hit moves the theoretical arrival time (TAT) of
+# the key forward by `period / limit`, a hit is rejected when that would move it
+# more than `period` into the future. Only the TAT has to be stored per key.
+GCRA_SCRIPT = """
+local now = redis.call("TIME")
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local emission_interval = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call("GET", KEYS[1]) or now)
+tat = math.max(tat, now)
+
+local new_tat = tat + emission_interval
+local allow_at = new_tat - period
+if allow_at > now then
+    return allow_at - now
+end
+
+redis.call("SET", KEYS[1], new_tat, "PX", new_tat - now)
+return 0
+"""
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Limit(NamedTuple):
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, value: str) -> "Limit":
+        """Parses limits like '5/minute'."""
+        limit, period = value.split("/")
+        return cls(int(limit), PERIODS[period.strip()])
+
+
+class MemoryStorage:
+    """In-process GCRA storage, only meant for tests and single process setups."""
+
+    def __init__(self):
+        self._tats: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: Limit) -> float:
+        emission_interval = limit.period / limit.limit
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tats.get(key, now), now)
+            # Relative to now, as `now + period - period` may not equal `now`
+            retry_after = (tat - now) + emission_interval - limit.period
+            if retry_after > 0:
+                return retry_after
+
+            self._tats[key] = tat + emission_interval
+            return 0.0
+
+
+class RedisStorage:
+    """GCRA storage shared by all workers, every hit is a single atomic script call."""
+
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+        self._script = client.register_script(GCRA_SCRIPT)
+
+    def hit(self, key: str, limit: Limit) -> float:
+        emission_interval = math.ceil(limit.period * 1000 / limit.limit)
+        retry_after_ms = self._script(
+            keys=[key], args=[emission_interval, int(limit.period * 1000)]
+        )
+        return retry_after_ms / 1000
+
+
+class RateLimiter:
+    """
+    Throttles requests per endpoint, keyed by client IP and by the email address
+    in the request body, such that neither a single client nor a distributed run
+    against a single account can exhaust the workers.
+
+    Limits are configured per endpoint in `RATE_LIMITS`. When Redis can not be
+    reached requests are let through, as locking out every user would be worse.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.limits: dict[str, dict[str, Limit]] = {}
+        self.storage: MemoryStorage | RedisStorage = MemoryStorage()
+
+    def init_app(self, app):
+        self.enabled = app.config["RATE_LIMIT_ENABLED"]
+        self.limits = {
+            endpoint: {kind: Limit.parse(value) for kind, value in limits.items()}
+            for endpoint, limits in app.config["RATE_LIMITS"].items()
+        }
+        self.storage = (
+            RedisStorage(
+                redis_client(app, app.config["RATE_LIMIT_REDIS_TIMEOUT_SECONDS"])
+            )
+            if app.config["RATE_LIMIT_STORAGE"] == "redis"
+            else MemoryStorage()
+        )
+
+    def hit(self, endpoint: str, identities: dict[str, str | None]) -> float:
+        """
+        Registers a hit on the endpoint for every identity, e.g. `{"ip": ...}`, and
+        returns the number of seconds until the request would be allowed, being 0
+        when it is allowed right now.
+        """
+        if not self.enabled:
+            return 0.0
+
+        retry_after = 0.0
+        for kind, limit in self.limits.get(endpoint, {}).items():
+            identity = identities.get(kind)
+            if not identity:
+                continue
+
+            try:
+                wait = self.storage.hit(_key(endpoint, kind, identity), limit)
+            except redis.RedisError:
+                current_app.logger.warning("Could not rate limit %s in redis", endpoint)
+                return 0.0
+
+            retry_after = max(retry_after, wait)
+
+        return retry_after
+
+
+def _key(endpoint: str, kind: str, identity: str) -> str:
+    return f"rate_limit:{endpoint}:{kind}:{identity}"
+
+
+rate_limiter = RateLimiter()
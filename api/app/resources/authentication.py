@@ -1,25 +1,30 @@
 import re
 import time
 
-import pyotp
 from flask import current_app, request, session
 from flask_login import current_user, login_required, login_user, logout_user
 from flask_restx import Resource
 from marshmallow import Schema, fields
 
+from app.cache import user_cache
 from app.config import MY_SOLID_APP_PASSWORD_RESET_TOKEN_EXPIRE_HOURS
 from app.db.user import User, UserSchema
 from app.errors import APIError, APIErrorEnum
-from app.extensions import api, db, login_manager
+from app.extensions import api, login_manager
+from app.fernet import encrypt
+from app.resources.decorators import query_budget, rate_limit, use_read_replica
+from app.sessions import session_store
 from app.tasks.mail_tasks import (
     send_email_verification_email,
     send_forgot_password_email,
 )
+from app.totp import totp_verifier
+from app.unit_of_work import unit_of_work
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(user_id)
+    return user_cache.load_user(user_id)
 
 
 class RegisterSchema(Schema):
@@ -29,6 +34,7 @@ class RegisterSchema(Schema):
 
 @api.route("/register")
 class Register(Resource):
+    @query_budget(6)
     def post(self):
         data: dict = RegisterSchema().load(request.get_json())
 
@@ -39,25 +45,27 @@ class Register(Resource):
                 409,
             )
 
-        new_user = User(email=data.get("email"))
-        new_user.set_password(data.get("password"))
+        with unit_of_work() as uow:
+            new_user = User(email=data.get("email"))
+            new_user.set_password(data.get("password"))
+            verification_token = new_user.set_email_verification_token()
 
-        db.session.add(new_user)
-        db.session.commit()
+            uow.add(new_user)
+            uow.flush()
 
-        login_user(new_user)
+            user_data = UserSchema().dump(new_user)
 
-        verification_token = new_user.set_email_verification_token()
-        send_email_verification_email.delay(
-            receiver=new_user.email, verification_token=verification_token
-        )
+            uow.enqueue(
+                send_email_verification_email,
+                receiver=new_user.email,
+                encrypted_verification_token=encrypt(verification_token),
+            )
 
-        db.session.add(new_user)
-        db.session.commit()
+        login_user(new_user)
 
-        current_app.logger.info("New user registered with id %d", new_user.id)
+        current_app.logger.info("New user registered with id %d", user_data["id"])
 
-        return UserSchema().dump(new_user)
+        return user_data
 
 
 class LoginSchema(Schema):
@@ -67,6 +75,8 @@ class LoginSchema(Schema):
 
 @api.route("/login")
 class Login(Resource):
+    @query_budget(4)
+    @rate_limit("login")
     def post(self):
         data: dict = LoginSchema().load(request.get_json())
 
@@ -78,6 +88,12 @@ class Login(Resource):
                 401,
             )
 
+        # Most logins change nothing, so only a rehashed password is committed.
+        if user.rehash_password_if_needed(data.get("password")):
+            with unit_of_work() as uow:
+                uow.add(user)
+            current_app.logger.info("Rehashed password of user with id %d", user.id)
+
         if user.two_factor_enabled:
             session.pop("partially_authenticated_user", None)
             session["partially_authenticated_user"] = user.id
@@ -98,6 +114,7 @@ class Login2FASchema(Schema):
 
 @api.route("/login_2fa")
 class Login2FA(Resource):
+    @rate_limit("login_2fa")
     def post(self):
         data: dict = Login2FASchema().load(request.get_json())
         totp_code: str = data.get("totp_code")
@@ -116,8 +133,7 @@ class Login2FA(Resource):
                 401,
             )
 
-        totp = pyotp.TOTP(user.totp_secret)
-        if not totp.verify(totp_code):
+        if not totp_verifier.verify(user, totp_code):
             raise APIError(
                 APIErrorEnum.wrong_email_totp_code,
                 "Could not login with the given email and code",
@@ -169,10 +185,12 @@ class ChangePassword(Resource):
                 409,
             )
 
-        current_user.set_password(new_password)
-
-        db.session.add(current_user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            current_user.set_password(new_password)
+            uow.add(current_user)
+            uow.after_commit(
+                session_store.revoke_user_sessions, current_user.id, keep_current=True
+            )
 
         return UserSchema().dump(current_user)
 
@@ -183,6 +201,7 @@ class ForgotPasswordSchema(Schema):
 
 @api.route("/forgot_password")
 class ForgotPassword(Resource):
+    @rate_limit("forgot_password")
     def post(self):
         data: dict = ForgotPasswordSchema().load(request.get_json())
 
@@ -190,11 +209,14 @@ class ForgotPassword(Resource):
         if user is None:
             return {}, 200
 
-        reset_token = user.set_password_reset_token()
-        db.session.add(user)
-        db.session.commit()
-
-        send_forgot_password_email.delay(receiver=user.email, reset_token=reset_token)
+        with unit_of_work() as uow:
+            reset_token = user.set_password_reset_token()
+            uow.add(user)
+            uow.enqueue(
+                send_forgot_password_email,
+                receiver=user.email,
+                encrypted_reset_token=encrypt(reset_token),
+            )
 
         return {}, 200
 
@@ -207,12 +229,14 @@ class ResetPasswordSchema(Schema):
 
 @api.route("/reset_password")
 class ResetPassword(Resource):
+    @rate_limit("reset_password")
     def post(self):
         data: dict = ResetPasswordSchema().load(request.get_json())
 
-        reset_token = data.get("reset_token")
-        user = User.query.filter_by(email=data.get("email")).first()
-        if user is None or not user.check_password_reset_token(reset_token):
+        user = User.find_by_password_reset_token(
+            data.get("email"), data.get("reset_token")
+        )
+        if user is None:
             raise APIError(
                 APIErrorEnum.could_not_reset_password_with_token,
                 "Could not reset password with the given token",
@@ -236,11 +260,11 @@ class ResetPassword(Resource):
                 409,
             )
 
-        user.set_password(new_password)
-        user.clear_password_reset_token()
-
-        db.session.add(user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            user.set_password(new_password)
+            user.clear_password_reset_token()
+            uow.add(user)
+            uow.after_commit(session_store.revoke_user_sessions, user.id)
 
         return {}, 200
 
@@ -252,23 +276,24 @@ class EmailVerificationSchema(Schema):
 
 @api.route("/verify_email")
 class EmailVerification(Resource):
+    @rate_limit("verify_email")
     def post(self):
         data: dict = EmailVerificationSchema().load(request.get_json())
 
-        verification_token = data.get("verification_token")
-        user = User.query.filter_by(email=data.get("email")).first()
-        if user is None or not user.check_email_verification_token(verification_token):
+        user = User.find_by_email_verification_token(
+            data.get("email"), data.get("verification_token")
+        )
+        if user is None:
             raise APIError(
                 APIErrorEnum.could_not_verify_email_with_token,
                 "Could not verify email with the given token",
                 400,
             )
 
-        user.is_verified = True
-        user.clear_email_verification_token()
-
-        db.session.add(user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            user.is_verified = True
+            user.clear_email_verification_token()
+            uow.add(user)
 
         return {}, 200
 
@@ -277,13 +302,14 @@ class EmailVerification(Resource):
 class ResendEmailVerification(Resource):
     @login_required
     def post(self):
-        verification_token = current_user.set_email_verification_token()
-        send_email_verification_email.delay(
-            receiver=current_user.email, verification_token=verification_token
-        )
-
-        db.session.add(current_user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            verification_token = current_user.set_email_verification_token()
+            uow.add(current_user)
+            uow.enqueue(
+                send_email_verification_email,
+                receiver=current_user.email,
+                encrypted_verification_token=encrypt(verification_token),
+            )
 
         return {}, 200
 
@@ -299,6 +325,8 @@ def password_matches_conditions(password: str) -> bool:
 
 @api.route("/whoami")
 class WhoAmI(Resource):
+    @query_budget(2)
     @login_required
+    @use_read_replica
     def get(self):
         return UserSchema().dump(current_user)
@@ -1,25 +1,125 @@
+import math
 from functools import wraps
 
-from flask import request
+from flask import current_app, g, request
 from flask_login import current_user
 
 from app.errors import APIError, APIErrorEnum
+from app.extensions import db
+from app.rate_limit import rate_limiter
+from app.resources.utils import decode_cursor
 
 
 def insert_pagination_parameters(func):
+    """
+    Inserts either page based (`?page=&per_page=`) or cursor based
+    (`?after=&limit=`) pagination parameters. When neither is given, the first page
+    in cursor mode is requested. The page size is always capped at
+    `PAGINATION_MAX_PAGE_SIZE`, so a request can never load a whole table.
+    """
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        page = request.args.get("page")
-        per_page = request.args.get("per_page")
+        max_page_size = current_app.config["PAGINATION_MAX_PAGE_SIZE"]
+        page = request.args.get("page", type=int)
+        per_page = request.args.get("per_page", type=int)
+        include_total = request.args.get("include_total", "true").lower() != "false"
 
         if page is not None and per_page is not None:
-            return func(*args, page=int(page), per_page=int(per_page))
-        else:
-            return func(*args, **kwargs, page=None, per_page=None)
+            return func(
+                *args,
+                **kwargs,
+                page=max(page, 1),
+                per_page=min(max(per_page, 1), max_page_size),
+                after=None,
+                include_total=include_total,
+            )
+
+        after = request.args.get("after")
+        limit = request.args.get("limit", max_page_size, type=int)
+        return func(
+            *args,
+            **kwargs,
+            page=None,
+            per_page=min(max(limit, 1), max_page_size),
+            after=decode_cursor(after) if after else None,
+            include_total=include_total,
+        )
 
     return wrapper
 
 
+def rate_limit(endpoint: str):
+    """
+    Throttles the endpoint per client IP and per email address in the JSON body,
+    with the limits configured in `RATE_LIMITS[endpoint]`. Runs before the handler
+    does any database lookup or password hashing, so rejected requests are cheap.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            data = request.get_json(silent=True)
+            email = data.get("email") if isinstance(data, dict) else None
+
+            retry_after = rate_limiter.hit(
+                endpoint,
+                {
+                    "ip": request.remote_addr,
+                    "email": email.strip().lower() if isinstance(email, str) else None,
+                },
+            )
+            if retry_after > 0:
+                raise APIError(
+                    APIErrorEnum.too_many_requests,
+                    "Too many attempts, try again later",
+                    429,
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def use_read_replica(func):
+    """
+    Lets the reads of the handler go to a read replica. Reads after the first write
+    of the request still go to the primary, so only use it for handlers that can
+    live with data that is a few seconds old.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        db.session.info["use_read_replica"] = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for key in ("use_read_replica", "read_replica", "wrote"):
+                db.session.info.pop(key, None)
+
+    return wrapper
+
+
+def query_budget(max_queries: int):
+    """
+    Declares the maximum number of SQL queries a request to the handler may issue,
+    see `QueryStats` for what happens when it is exceeded.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            g.query_budget = max_queries
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 def admin_required(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
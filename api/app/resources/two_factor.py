@@ -1,15 +1,14 @@
-import base64
-from io import BytesIO
-
 import pyotp
-import qrcode
-from flask import request
+from flask import Response, request
 from flask_login import current_user, login_required
 from flask_restx import Resource
 from marshmallow import Schema, fields
 
 from app.errors import APIError, APIErrorEnum
-from app.extensions import api, db
+from app.extensions import api
+from app.qr_codes import QR_CODE_MIMETYPES, qr_code_service
+from app.totp import totp_verifier
+from app.unit_of_work import unit_of_work
 
 
 @api.route("/generate_2fa_secret")
@@ -26,17 +25,40 @@ class Generate2FASecret(Resource):
         totp = pyotp.TOTP(pyotp.random_base32())
 
         uri = totp.provisioning_uri(name=current_user.email, issuer_name="MySolidApp")
-        qr = qrcode.make(uri)
-
-        buffered = BytesIO()
-        qr.save(buffered, format="PNG")
+        provisioning_id = qr_code_service.create_provisioning(current_user.id, uri)
 
         return {
-            "qr_code": base64.b64encode(buffered.getvalue()).decode(),
+            "provisioning_id": provisioning_id,
             "totp_secret": totp.secret,
         }, 200
 
 
+@api.route("/2fa_qr_code/<string:provisioning_id>")
+class TwoFactorQRCode(Resource):
+    @login_required
+    def get(self, provisioning_id):
+        image_format = request.args.get("format", "svg")
+        if image_format not in QR_CODE_MIMETYPES:
+            raise APIError(
+                APIErrorEnum.invalid_request_data,
+                f"Unsupported QR code format '{image_format}'",
+                400,
+            )
+
+        image = qr_code_service.render(provisioning_id, current_user.id, image_format)
+        if image is None:
+            raise APIError(
+                APIErrorEnum.provisioning_not_found,
+                "This QR code does not exist or has expired",
+                404,
+            )
+
+        response = Response(image, mimetype=QR_CODE_MIMETYPES[image_format])
+        response.cache_control.private = True
+        response.cache_control.max_age = qr_code_service.ttl
+        return response
+
+
 class Enable2FASchema(Schema):
     totp_code = fields.String(required=True)
     totp_secret = fields.String(required=True)
@@ -57,18 +79,20 @@ class Enable2FA(Resource):
         totp_secret: str = data.get("totp_secret")
         totp_code: str = data.get("totp_code")
 
-        totp = pyotp.TOTP(totp_secret)
-        if not totp.verify(totp_code):
+        if not totp_verifier.verify_secret(
+            current_user.id, pyotp.TOTP(totp_secret), totp_code
+        ):
             raise APIError(
                 APIErrorEnum.incorrect_totp_code,
                 "Incorrect 2FA code",
                 401,
             )
 
-        current_user.totp_secret = totp_secret
-        current_user.two_factor_enabled = True
-        db.session.add(current_user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            current_user.totp_secret = totp_secret
+            current_user.two_factor_enabled = True
+            uow.add(current_user)
+            uow.after_commit(totp_verifier.invalidate, current_user.id)
 
         return {}, 200
 
@@ -91,17 +115,17 @@ class Disable2FA(Resource):
         data: dict = Disable2FASchema().load(request.get_json())
         totp_code: str = data.get("totp_code")
 
-        totp = pyotp.TOTP(current_user.totp_secret)
-        if not totp.verify(totp_code):
+        if not totp_verifier.verify(current_user, totp_code):
             raise APIError(
                 APIErrorEnum.incorrect_totp_code,
                 "Incorrect 2FA code",
                 401,
             )
 
-        current_user.totp_secret = None
-        current_user.two_factor_enabled = False
-        db.session.add(current_user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            current_user.totp_secret = None
+            current_user.two_factor_enabled = False
+            uow.add(current_user)
+            uow.after_commit(totp_verifier.invalidate, current_user.id)
 
         return {}, 200
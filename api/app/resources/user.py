@@ -1,14 +1,32 @@
-from flask import request
+import csv
+import io
+import json
+
+from flask import Response, current_app, request, stream_with_context
 from flask_login import current_user, login_required, logout_user
 from flask_restx import Resource
 from marshmallow import Schema, fields
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 
+from app.cache import user_cache
 from app.db.user import User, UserSchema
+from app.db_pool import pool_monitor
 from app.errors import APIError, APIErrorEnum
 from app.extensions import api, db
-from app.resources.decorators import admin_required, insert_pagination_parameters
-from app.resources.utils import pagination_query
+from app.fernet import encrypt
+from app.passwords import password_hasher
+from app.resources.decorators import (
+    admin_required,
+    insert_pagination_parameters,
+    query_budget,
+    use_read_replica,
+)
+from app.resources.utils import keyset_pagination_query, pagination_query
+from app.sessions import session_store
 from app.tasks.mail_tasks import send_email_verification_email
+from app.tokens import generate_token, token_digest
+from app.unit_of_work import unit_of_work
 
 
 class CreateUserSchema(Schema):
@@ -19,14 +37,21 @@ class CreateUserSchema(Schema):
 
 @api.route("/users")
 class UsersAPI(Resource):
+    @query_budget(3)
     @login_required
+    @use_read_replica
     @insert_pagination_parameters
-    def get(self, page: int | None = None, per_page: int | None = None):
-        if page and per_page:
-            users, meta = pagination_query(User, int(page), int(per_page))
+    def get(
+        self,
+        page: int | None,
+        per_page: int,
+        after: int | None,
+        include_total: bool,
+    ):
+        if page is not None:
+            users, meta = pagination_query(User, page, per_page, include_total)
         else:
-            users = User.query.all()
-            meta = {}
+            users, meta = keyset_pagination_query(User, after, per_page, include_total)
 
         return {"items": UserSchema(many=True).dump(users), "meta": meta}
 
@@ -40,22 +65,199 @@ class UsersAPI(Resource):
                 409,
             )
 
-        new_user = User(email=user_data.get("email"), is_admin=user_data.get("is_admin"))
-        new_user.set_password(user_data.get("password"))
+        with unit_of_work() as uow:
+            new_user = User(
+                email=user_data.get("email"), is_admin=user_data.get("is_admin")
+            )
+            new_user.set_password(user_data.get("password"))
+            verification_token = new_user.set_email_verification_token()
+
+            uow.add(new_user)
+            uow.flush()
+
+            new_user_data = UserSchema().dump(new_user)
+
+            uow.enqueue(
+                send_email_verification_email,
+                receiver=new_user.email,
+                encrypted_verification_token=encrypt(verification_token),
+            )
+
+        return new_user_data
+
+
+@api.route("/users/batch")
+class UsersBatchAPI(Resource):
+    @login_required
+    @admin_required
+    def post(self):
+        """
+        Creates many users at once. Every item in the request gets an entry in the
+        response report, at the same index, telling whether it was created.
+        """
+        items = request.get_json()
+        if not isinstance(items, list) or not (
+            0 < len(items) <= current_app.config["USER_BATCH_MAX_SIZE"]
+        ):
+            raise APIError(
+                APIErrorEnum.invalid_request_data,
+                "Expected a list of at most "
+                f"{current_app.config['USER_BATCH_MAX_SIZE']} users",
+                400,
+            )
 
-        db.session.add(new_user)
-        db.session.commit()
+        schema = CreateUserSchema(many=True)
+        errors = schema.validate(items)
+        report: list[dict | None] = [None] * len(items)
+        for index, messages in errors.items():
+            item = items[index]
+            report[index] = {
+                "email": item.get("email") if isinstance(item, dict) else None,
+                "status": "invalid",
+                "error": APIErrorEnum.invalid_request_data.value,
+                "messages": messages,
+            }
 
-        verification_token = new_user.set_email_verification_token()
+        valid_indices = [index for index, item in enumerate(report) if item is None]
+        valid_users = schema.load([items[index] for index in valid_indices])
 
-        send_email_verification_email.delay(
-            receiver=new_user.email, verification_token=verification_token
+        existing_emails = set(
+            db.session.scalars(
+                select(User.email).where(
+                    User.email.in_({user["email"] for user in valid_users})
+                )
+            )
         )
 
-        db.session.add(new_user)
-        db.session.commit()
+        new_users: dict[str, tuple[int, dict]] = {}
+        for index, user in zip(valid_indices, valid_users):
+            if user["email"] in existing_emails or user["email"] in new_users:
+                report[index] = {
+                    "email": user["email"],
+                    "status": "duplicate",
+                    "error": APIErrorEnum.email_already_exists.value,
+                }
+            else:
+                new_users[user["email"]] = (index, user)
+
+        if new_users:
+            hashed_passwords = password_hasher.hash_many(
+                [user["password"] for _, user in new_users.values()]
+            )
+            verification_tokens = [generate_token() for _ in new_users]
+
+            try:
+                with unit_of_work() as uow:
+                    uow.session.execute(
+                        insert(User),
+                        [
+                            {
+                                "email": email,
+                                "is_admin": user["is_admin"],
+                                "hashed_password": hashed_password,
+                                "email_verification_token": token_digest(token),
+                            }
+                            for (email, (_, user)), hashed_password, token in zip(
+                                new_users.items(), hashed_passwords, verification_tokens
+                            )
+                        ],
+                    )
+                    ids = dict(
+                        uow.session.execute(
+                            select(User.email, User.id).where(User.email.in_(new_users))
+                        ).all()
+                    )
+
+                    for email, token in zip(new_users, verification_tokens):
+                        uow.enqueue(
+                            send_email_verification_email,
+                            receiver=email,
+                            encrypted_verification_token=encrypt(token),
+                        )
+            except IntegrityError:
+                # Another request created some of the users since they were looked up
+                conflicting = db.session.scalars(
+                    select(User.email).where(User.email.in_(new_users))
+                ).all()
+                raise APIError(
+                    APIErrorEnum.email_already_exists,
+                    "Accounts with these emails already exist: "
+                    + ", ".join(sorted(conflicting)),
+                    409,
+                )
+
+            for email, (index, _) in new_users.items():
+                report[index] = {"email": email, "status": "created", "id": ids[email]}
 
-        return UserSchema().dump(new_user)
+        current_app.logger.info("Created %d users in batch", len(new_users))
+
+        return {"items": report, "created": len(new_users)}
+
+
+EXPORT_FIELDS = list(UserSchema().fields)
+
+
+@api.route("/users/export")
+class UsersExportAPI(Resource):
+    @login_required
+    @admin_required
+    def get(self):
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in ("ndjson", "csv"):
+            raise APIError(
+                APIErrorEnum.invalid_export_format,
+                f"Unknown export format '{export_format}', use 'ndjson' or 'csv'",
+                400,
+            )
+
+        rows = stream_user_rows(current_app.config["USER_EXPORT_BATCH_SIZE"])
+        if export_format == "csv":
+            chunks, mimetype = csv_chunks(rows), "text/csv"
+        else:
+            chunks, mimetype = ndjson_chunks(rows), "application/x-ndjson"
+
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={
+                "Content-Disposition": f"attachment; filename=users.{export_format}"
+            },
+        )
+
+
+def stream_user_rows(batch_size: int):
+    """
+    Yields batches of exported user rows. Only the exported columns are selected and
+    rows are fetched through a server side cursor, so no ORM objects are built and
+    memory use does not depend on the number of users.
+    """
+    result = db.session.execute(
+        select(*[getattr(User, field) for field in EXPORT_FIELDS])
+        .order_by(User.id)
+        .execution_options(yield_per=batch_size)
+    )
+    yield from result.partitions()
+
+
+def ndjson_chunks(rows):
+    for batch in rows:
+        yield "".join(json.dumps(dict(zip(EXPORT_FIELDS, row))) + "\n" for row in batch)
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(EXPORT_FIELDS)
+    for batch in rows:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # Also send the header when there are no users at all.
+    if buffer.tell():
+        yield buffer.getvalue()
 
 
 @api.route("/user/<int:id>")
@@ -68,21 +270,39 @@ class UserAPI(Resource):
                 APIErrorEnum.user_not_found, f"User with id {id} not found", 404
             )
 
-        db.session.delete(user)
-        db.session.commit()
+        with unit_of_work() as uow:
+            uow.after_commit(session_store.revoke_user_sessions, user.id)
+            uow.delete(user)
 
         return {}, 200
 
 
+@api.route("/user_cache_stats")
+class UserCacheStatsAPI(Resource):
+    @login_required
+    @admin_required
+    def get(self):
+        return user_cache.stats()
+
+
+@api.route("/db_pool_stats")
+class DBPoolStatsAPI(Resource):
+    @login_required
+    @admin_required
+    def get(self):
+        return pool_monitor.stats()
+
+
 @api.route("/delete_account")
 class DeleteAccount(Resource):
     @login_required
     def delete(self):
         user = db.session.get(User, current_user.id)
 
-        logout_user()
+        with unit_of_work() as uow:
+            uow.after_commit(session_store.revoke_user_sessions, user.id)
+            uow.delete(user)
 
-        db.session.delete(user)
-        db.session.commit()
+        logout_user()
 
         return {}, 200
@@ -1,8 +1,65 @@
-def pagination_query(model, page: int, per_page: int) -> tuple[list, dict]:
-    pagination_result = model.query.paginate(page=page, per_page=per_page)
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app.errors import APIError, APIErrorEnum
+
+
+def pagination_query(
+    model, page: int, per_page: int, include_total: bool = True
+) -> tuple[list, dict]:
+    pagination_result = model.query.order_by(model.id).paginate(
+        page=page, per_page=per_page, count=include_total
+    )
     return pagination_result.items, {
         "page": pagination_result.page,
         "per_page": pagination_result.per_page,
-        "total_pages": pagination_result.pages,
+        "total_pages": pagination_result.pages if include_total else None,
         "total_items": pagination_result.total,
     }
+
+
+def keyset_pagination_query(
+    model, after: int | None, limit: int, include_total: bool = True
+) -> tuple[list, dict]:
+    """
+    Paginates by seeking on the primary key instead of using an offset, such that
+    every page is equally fast, however deep it is.
+    """
+    query = model.query.order_by(model.id)
+    if after is not None:
+        query = query.filter(model.id > after)
+
+    # Fetch a single extra row to know whether there is a next page.
+    items = query.limit(limit + 1).all()
+    has_next = len(items) > limit
+    items = items[:limit]
+
+    return items, {
+        "limit": limit,
+        "next_cursor": encode_cursor(items[-1].id) if has_next else None,
+        "total_items": model.query.count() if include_total else None,
+    }
+
+
+def encode_cursor(last_id: int) -> str:
+    return _cursor_serializer().dumps(last_id)
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        last_id = _cursor_serializer().loads(cursor)
+    except BadSignature:
+        last_id = None
+
+    if not isinstance(last_id, int):
+        raise APIError(
+            APIErrorEnum.invalid_pagination_cursor,
+            "The given pagination cursor is invalid",
+            400,
+        )
+
+    return last_id
+
+
+def _cursor_serializer() -> URLSafeSerializer:
+    return URLSafeSerializer(current_app.config["SECRET_KEY"], salt="pagination-cursor")
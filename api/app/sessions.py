@@ -0,0 +1,190 @@
+import secrets
+
+import msgpack
+import redis
+from flask import current_app, session
+from flask.sessions import SessionInterface, SessionMixin
+
+from app.extensions import redis_client
+
+
+class RedisSession(SessionMixin):
+    """
+    Session of which only the id is stored in the cookie. The data itself is only
+    read from Redis when the session is accessed for the first time.
+    """
+
+    def __init__(self, sid: str | None, load):
+        self.sid = sid
+        self.modified = False
+        self.accessed = False
+        self.user_id = None
+        self._load = load
+        self._data: dict | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = self._load(self.sid) if self.sid is not None else {}
+            self.user_id = self._data.get("_user_id")
+
+        self.accessed = True
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+
+class RedisSessionInterface(SessionInterface):
+    """
+    Stores sessions in Redis, serialised with msgpack, instead of in a signed cookie.
+
+    Every session of a logged in user is also added to a per-user index, such that
+    all sessions of a user can be revoked at once, e.g. after a password change.
+    Requests without a session cookie never touch Redis.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.redis: redis.Redis | None = None
+
+    def init_app(self, app):
+        self.enabled = app.config["SESSION_STORAGE"] == "redis"
+        if not self.enabled:
+            return
+
+        self.redis = redis_client(app, app.config["SESSION_REDIS_TIMEOUT_SECONDS"])
+        app.session_interface = self
+
+    def open_session(self, app, request) -> RedisSession:
+        return RedisSession(request.cookies.get(self.get_cookie_name(app)), self._load)
+
+    def save_session(self, app, session: RedisSession, response):
+        if not session.loaded:
+            return
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        cookie_name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and session.sid is not None:
+                try:
+                    self._delete(session.sid, session.user_id)
+                except redis.RedisError:
+                    current_app.logger.warning("Could not delete session from redis")
+                response.delete_cookie(cookie_name, domain=domain, path=path)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        user_id = session.get("_user_id")
+        sid = session.sid
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        try:
+            if sid is None or user_id != session.user_id:
+                # Issue a new id whenever the user changes, to prevent session fixation.
+                if sid is not None:
+                    self._delete(sid, session.user_id)
+                sid = secrets.token_urlsafe(32)
+
+            with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(_session_key(sid), msgpack.packb(dict(session)), ex=ttl)
+                if user_id is not None:
+                    pipe.sadd(_user_sessions_key(user_id), sid)
+                    pipe.expire(_user_sessions_key(user_id), ttl)
+                pipe.execute()
+        except redis.RedisError:
+            # The response is still sent, the session just does not outlive it.
+            current_app.logger.warning("Could not write session to redis")
+            return
+
+        response.set_cookie(
+            cookie_name,
+            sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            partitioned=self.get_cookie_partitioned(app),
+        )
+
+    def revoke_user_sessions(self, user_id, keep_current: bool = False):
+        """
+        Deletes all sessions of the user, optionally except for the session of the
+        current request.
+        """
+        if not self.enabled:
+            return
+
+        keep = session.sid if keep_current else None
+        index = _user_sessions_key(str(user_id))
+        try:
+            sids = [sid.decode() for sid in self.redis.smembers(index)]
+            revoked = [sid for sid in sids if sid != keep]
+
+            with self.redis.pipeline(transaction=False) as pipe:
+                if revoked:
+                    pipe.delete(*[_session_key(sid) for sid in revoked])
+                    pipe.srem(index, *revoked)
+                if keep is None:
+                    pipe.delete(index)
+                pipe.execute()
+        except redis.RedisError:
+            # This runs after the commit, so the request still succeeds. The other
+            # sessions then only end when they expire.
+            current_app.logger.warning("Could not revoke sessions in redis")
+
+    def _load(self, sid: str) -> dict:
+        try:
+            raw = self.redis.get(_session_key(sid))
+        except redis.RedisError:
+            current_app.logger.warning("Could not read session from redis")
+            return {}
+
+        return msgpack.unpackb(raw) if raw is not None else {}
+
+    def _delete(self, sid: str, user_id):
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.delete(_session_key(sid))
+            if user_id is not None:
+                pipe.srem(_user_sessions_key(user_id), sid)
+            pipe.execute()
+
+
+def _session_key(sid: str) -> str:
+    return f"session:{sid}"
+
+
+def _user_sessions_key(user_id) -> str:
+    return f"user_sessions:{user_id}"
+
+
+session_store = RedisSessionInterface()
@@ -0,0 +1,162 @@
+import asyncio
+import os
+import time
+from collections import defaultdict
+
+import aiosmtplib
+from celery.utils.log import get_task_logger
+from flask import current_app
+from flask_mail import Message, email_dispatched, sanitize_address, sanitize_addresses
+
+logger = get_task_logger(__name__)
+
+
+class DomainRateLimiter:
+    """Spaces out deliveries to the same recipient domain to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next_allowed: dict[str, float] = defaultdict(float)
+
+    async def wait(self, domain: str):
+        if not self.interval:
+            return
+
+        now = time.monotonic()
+        allowed_at = max(now, self._next_allowed[domain])
+        self._next_allowed[domain] = allowed_at + self.interval
+        await asyncio.sleep(allowed_at - now)
+
+
+class AsyncMailTransport:
+    """
+    Delivers many messages concurrently from a single worker process with aiosmtplib.
+
+    Every worker process runs its own event loop. A batch is delivered by at most
+    `max_in_flight` coroutines at once, each of which keeps its own SMTP connection
+    open for the messages it sends. Deliveries to the same recipient domain are
+    rate limited across the batches of a worker process, to stay below the limits
+    of large mail providers.
+    """
+
+    def __init__(self):
+        self.max_in_flight = 20
+        self.domain_rate = 0.0
+        self.timeout = 30.0
+        self.limiter = DomainRateLimiter(self.domain_rate)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_pid: int | None = None
+
+    def init_app(self, app):
+        self.max_in_flight = app.config["MAIL_ASYNC_MAX_IN_FLIGHT"]
+        self.domain_rate = app.config["MAIL_ASYNC_DOMAIN_RATE"]
+        self.timeout = app.config["MAIL_ASYNC_TIMEOUT_SECONDS"]
+        self.limiter = DomainRateLimiter(self.domain_rate)
+
+    def deliver(self, jobs: list[tuple[dict, Message]]) -> list[dict]:
+        """
+        Delivers all (job, message) pairs and returns the jobs worth retrying, being
+        the ones that failed on a connection error or a temporary (4xx) SMTP reply.
+        """
+        return self._get_loop().run_until_complete(self._deliver(jobs))
+
+    async def _deliver(self, jobs: list[tuple[dict, Message]]) -> list[dict]:
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        failed: list[dict] = []
+        workers = min(self.max_in_flight, len(jobs))
+        await asyncio.gather(*[self._worker(queue, failed) for _ in range(workers)])
+        return failed
+
+    async def _worker(self, queue: asyncio.Queue, failed: list[dict]):
+        mail_state = current_app.extensions["mail"]
+        smtp: aiosmtplib.SMTP | None = None
+        try:
+            while not queue.empty():
+                job, message = queue.get_nowait()
+                await self.limiter.wait(_domain(message))
+
+                if smtp is None and not mail_state.suppress:
+                    try:
+                        smtp = await self._connect(mail_state)
+                    except (
+                        ConnectionError,
+                        TimeoutError,
+                        aiosmtplib.SMTPException,
+                    ) as error:
+                        # Whether the server is unreachable or rejects the login, the
+                        # rest of the batch would fail alike, so all of it is retried.
+                        logger.warning("Could not connect to the SMTP server: %s", error)
+                        failed.append(job)
+                        while not queue.empty():
+                            failed.append(queue.get_nowait()[0])
+                        break
+
+                try:
+                    if not mail_state.suppress:
+                        await smtp.sendmail(
+                            sanitize_address(message.sender),
+                            list(sanitize_addresses(message.send_to)),
+                            message.as_bytes(),
+                        )
+                except (ConnectionError, TimeoutError):
+                    failed.append(job)
+                    if smtp is not None:
+                        smtp.close()
+                    smtp = None
+                except aiosmtplib.SMTPException as error:
+                    if _is_temporary(error):
+                        failed.append(job)
+                    else:
+                        logger.error("Dropping mail to %s: %s", message.send_to, error)
+                else:
+                    email_dispatched.send(
+                        current_app._get_current_object(), message=message
+                    )
+        finally:
+            if smtp is not None and smtp.is_connected:
+                try:
+                    await smtp.quit()
+                except aiosmtplib.SMTPException:
+                    smtp.close()
+
+    async def _connect(self, mail_state) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=mail_state.server,
+            port=mail_state.port,
+            username=mail_state.username,
+            password=mail_state.password,
+            use_tls=mail_state.use_ssl,
+            start_tls=mail_state.use_tls,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        return smtp
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # Event loops can not be shared with forked worker processes.
+        if self._loop is None or self._loop_pid != os.getpid():
+            self._loop = asyncio.new_event_loop()
+            self._loop_pid = os.getpid()
+
+        return self._loop
+
+
+def _domain(message: Message) -> str:
+    recipient = next(iter(message.send_to), "")
+    return recipient.rpartition("@")[2].lower()
+
+
+def _is_temporary(error: aiosmtplib.SMTPException) -> bool:
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return any(recipient.code < 500 for recipient in error.recipients)
+
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return error.code < 500
+
+    return False
+
+
+async_mail_transport = AsyncMailTransport()
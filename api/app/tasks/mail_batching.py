@@ -0,0 +1,106 @@
+import json
+
+import redis
+from celery import shared_task
+from celery.utils.log import get_task_logger
+
+from app.extensions import redis_client
+from app.tasks.mail_tasks import send_mail_batch
+
+logger = get_task_logger(__name__)
+
+PENDING_KEY = "mail_batch:pending"
+PROCESSING_KEY = "mail_batch:processing"
+FLUSH_LOCK_KEY = "mail_batch:flush_lock"
+FLUSH_LOCK_TIMEOUT_SECONDS = 60
+
+
+class MailBatcher:
+    """
+    Accumulates mail jobs in a Redis list and hands them to `send_mail_batch` in
+    chunks, such that many mails are sent by a single task over a single SMTP session.
+
+    A flush is triggered as soon as `batch_size` jobs are pending, and otherwise
+    `flush_after_ms` after the first job was added to an empty list. A batch is
+    moved to a processing list while it is handed over, such that it is put back
+    when that fails, and beat flushes periodically to pick up any jobs left behind.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.batch_size = 100
+        self.flush_after_ms = 500
+        self.redis: redis.Redis | None = None
+
+    def init_app(self, app):
+        self.enabled = app.config["MAIL_BATCHING_ENABLED"]
+        self.batch_size = app.config["MAIL_BATCH_SIZE"]
+        self.flush_after_ms = app.config["MAIL_BATCH_FLUSH_AFTER_MS"]
+        self.redis = redis_client(app) if self.enabled else None
+
+    def add_many(self, jobs: list[dict]):
+        if not jobs:
+            return
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for job in jobs:
+            pipeline.rpush(PENDING_KEY, json.dumps(job))
+        pending = pipeline.execute()[-1]
+
+        if pending >= self.batch_size:
+            flush_mail_batches.delay()
+        elif pending == len(jobs):
+            # The list was empty, so no flush has been scheduled for these jobs yet.
+            flush_mail_batches.apply_async(countdown=self.flush_after_ms / 1000)
+
+    def pop_batch(self) -> list[dict]:
+        """Moves the next batch to the processing list, until `ack` or `requeue`."""
+        pipeline = self.redis.pipeline(transaction=True)
+        for _ in range(self.batch_size):
+            pipeline.lmove(PENDING_KEY, PROCESSING_KEY, "LEFT", "RIGHT")
+        return [json.loads(job) for job in pipeline.execute() if job is not None]
+
+    def ack(self):
+        """Removes the batch that has been handed over from the processing list."""
+        self.redis.delete(PROCESSING_KEY)
+
+    def requeue(self):
+        """Puts the jobs of the processing list back in front of the pending ones."""
+        while self.redis.lmove(PROCESSING_KEY, PENDING_KEY, "RIGHT", "LEFT"):
+            pass
+
+    def flush(self) -> int:
+        """
+        Hands all pending jobs to `send_mail_batch` and returns the number of
+        batches. Only one flush runs at a time, as they share the processing list.
+        """
+        if not self.redis.set(FLUSH_LOCK_KEY, 1, nx=True, ex=FLUSH_LOCK_TIMEOUT_SECONDS):
+            return 0
+
+        batches = 0
+        try:
+            # Jobs of a flush that did not finish, e.g. as its worker was killed
+            self.requeue()
+            while jobs := self.pop_batch():
+                try:
+                    send_mail_batch.delay(jobs=jobs)
+                except Exception:
+                    self.requeue()
+                    raise
+
+                self.ack()
+                batches += 1
+                logger.info("Flushed a batch of %d mails", len(jobs))
+        finally:
+            self.redis.delete(FLUSH_LOCK_KEY)
+
+        return batches
+
+
+mail_batcher = MailBatcher()
+
+
+@shared_task(ignore_result=True)
+def flush_mail_batches():
+    if mail_batcher.enabled:
+        mail_batcher.flush()
@@ -1,60 +1,166 @@
-from string import Template
+import smtplib
 
 from celery import shared_task
 from celery.utils.log import get_task_logger
+from flask import current_app
 from flask_mail import Message
 
 from app.config import (
     MY_SOLID_APP_FRONTEND_URL,
     MY_SOLID_APP_PASSWORD_RESET_TOKEN_EXPIRE_HOURS,
 )
-from app.extensions import mail
+from app.fernet import decrypt
+from app.tasks.async_mail import async_mail_transport
+from app.tasks.mail_templates import mail_templates
+from app.tasks.smtp_pool import CONNECTION_ERRORS, smtp_pool
 
 logger = get_task_logger(__name__)
 
 
-@shared_task(ignore_result=True)
-def send_forgot_password_email(*, receiver: str, reset_token: str):
+def forgot_password_message(*, receiver: str, encrypted_reset_token: str) -> Message:
+    reset_token = decrypt(encrypted_reset_token)
     reset_link = (
         f"{MY_SOLID_APP_FRONTEND_URL}/reset-password?"
         f"email={receiver}&reset_token={reset_token}"
     )
 
-    with open("./email_templates/forgot_password.html", "r") as file:
-        html_content = file.read()
-
-    html_content = Template(html_content).safe_substitute(
+    html_content = mail_templates.render(
+        "forgot_password",
         reset_link=reset_link,
         reset_hours=MY_SOLID_APP_PASSWORD_RESET_TOKEN_EXPIRE_HOURS,
     )
 
-    message = Message(
+    return Message(
         subject="🛁 MySolidApp - Password reset",
         recipients=[receiver],
         html=html_content,
     )
-    message.html
-    mail.send(message)
 
 
-@shared_task(ignore_result=True)
-def send_email_verification_email(*, receiver: str, verification_token: str):
+def email_verification_message(
+    *, receiver: str, encrypted_verification_token: str
+) -> Message:
+    verification_token = decrypt(encrypted_verification_token)
     verification_link = (
         f"{MY_SOLID_APP_FRONTEND_URL}/verify-email?"
         f"email={receiver}&verification_token={verification_token}"
     )
 
-    with open("./email_templates/verify_email.html", "r") as file:
-        html_content = file.read()
-
-    html_content = Template(html_content).safe_substitute(
-        verification_link=verification_link
+    html_content = mail_templates.render(
+        "verify_email", verification_link=verification_link
     )
 
-    message = Message(
+    return Message(
         subject="🛁 MySolidApp - Email verification",
         recipients=[receiver],
         html=html_content,
     )
-    message.html
-    mail.send(message)
+
+
+@shared_task(ignore_result=True)
+def send_forgot_password_email(*, receiver: str, encrypted_reset_token: str):
+    smtp_pool.send(
+        forgot_password_message(
+            receiver=receiver, encrypted_reset_token=encrypted_reset_token
+        )
+    )
+
+
+@shared_task(ignore_result=True)
+def send_email_verification_email(*, receiver: str, encrypted_verification_token: str):
+    smtp_pool.send(
+        email_verification_message(
+            receiver=receiver, encrypted_verification_token=encrypted_verification_token
+        )
+    )
+
+
+MESSAGE_BUILDERS = {
+    send_forgot_password_email.name: forgot_password_message,
+    send_email_verification_email.name: email_verification_message,
+}
+""" Builds the message of a mail task, used to send it as part of a batch. """
+
+
+@shared_task(bind=True, ignore_result=True)
+def send_mail_batch(self, *, jobs: list[dict]):
+    """
+    Sends a batch of mail jobs, each a dict with the `task` name of a mail task and
+    its `kwargs`, over a single SMTP session. Only the jobs that failed temporarily
+    are retried, as a smaller batch.
+    """
+    failed = deliver_mail_batch(jobs)
+    if not failed:
+        return
+
+    max_retries = current_app.config["MAIL_BATCH_MAX_RETRIES"]
+    if self.request.retries >= max_retries:
+        logger.error("Giving up on %d mails after %d retries", len(failed), max_retries)
+        return
+
+    logger.warning("Retrying %d of %d mails in batch", len(failed), len(jobs))
+    raise self.retry(
+        kwargs={"jobs": failed},
+        countdown=current_app.config["MAIL_BATCH_RETRY_BACKOFF_SECONDS"]
+        * 2**self.request.retries,
+        max_retries=max_retries,
+    )
+
+
+def deliver_mail_batch(jobs: list[dict]) -> list[dict]:
+    """
+    Sends all jobs and returns the jobs worth retrying. With the sync transport all
+    messages are sent one after the other over one pooled connection, with the async
+    transport they are delivered concurrently.
+    """
+    messages = []
+    for job in jobs:
+        builder = MESSAGE_BUILDERS.get(job["task"])
+        if builder is None:
+            logger.error("Dropping mail job for unknown task %s", job["task"])
+            continue
+
+        messages.append((job, builder(**job["kwargs"])))
+
+    if current_app.config["MAIL_TRANSPORT"] == "async":
+        return async_mail_transport.deliver(messages)
+
+    failed = []
+    connection = None
+    try:
+        for index, (job, message) in enumerate(messages):
+            if connection is None:
+                try:
+                    connection = smtp_pool.acquire()
+                except (*CONNECTION_ERRORS, smtplib.SMTPAuthenticationError):
+                    logger.warning("Could not connect to the SMTP server")
+                    failed.extend(job for job, _ in messages[index:])
+                    break
+
+            try:
+                connection.send(message)
+            except CONNECTION_ERRORS:
+                failed.append(job)
+                smtp_pool.discard(connection)
+                connection = None
+            except smtplib.SMTPException as error:
+                if is_temporary_smtp_error(error):
+                    failed.append(job)
+                else:
+                    logger.error("Dropping mail job for %s: %s", job["task"], error)
+    finally:
+        if connection is not None:
+            smtp_pool.release(connection)
+
+    return failed
+
+
+def is_temporary_smtp_error(error: smtplib.SMTPException) -> bool:
+    """SMTP reply codes in the 4xx range mean the message may be accepted later."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(code < 500 for code, _ in error.recipients.values())
+
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+
+    return False
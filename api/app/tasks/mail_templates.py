@@ -0,0 +1,72 @@
+from pathlib import Path
+from string import Template
+from typing import Callable, NamedTuple
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+
+class CompiledTemplate(NamedTuple):
+    render: Callable[..., str]
+    path: Path
+    mtime: float
+
+
+class MailTemplates:
+    """
+    Registry of email templates, which are all read and compiled once when the app is
+    created, such that sending a mail does no file I/O.
+
+    Templates ending in `.html` use `string.Template` placeholders (`$name`),
+    templates ending in `.jinja` are rendered with Jinja2. A template is registered
+    under its file name up to the first dot, e.g. `verify_email`. With auto reload
+    enabled, a template is recompiled when its file changed, which is meant for
+    development only.
+    """
+
+    def __init__(self):
+        self.directory: Path | None = None
+        self.auto_reload = False
+        self._jinja: Environment | None = None
+        self._templates: dict[str, CompiledTemplate] = {}
+
+    def init_app(self, app):
+        self.directory = Path(app.config["MAIL_TEMPLATE_DIR"])
+        self.auto_reload = app.config["MAIL_TEMPLATE_AUTO_RELOAD"]
+
+        bytecode_cache_dir = app.config["MAIL_TEMPLATE_BYTECODE_CACHE_DIR"]
+        self._jinja = Environment(
+            loader=FileSystemLoader(self.directory),
+            autoescape=True,
+            auto_reload=self.auto_reload,
+            bytecode_cache=(
+                FileSystemBytecodeCache(bytecode_cache_dir)
+                if bytecode_cache_dir
+                else None
+            ),
+        )
+        self.load()
+
+    def load(self):
+        self._templates = {
+            path.name.split(".")[0]: self._compile(path)
+            for path in sorted(self.directory.iterdir())
+            if path.suffix in (".html", ".jinja")
+        }
+
+    def render(self, name: str, /, **context) -> str:
+        template = self._templates[name]
+        if self.auto_reload and template.path.stat().st_mtime != template.mtime:
+            template = self._templates[name] = self._compile(template.path)
+
+        return template.render(**context)
+
+    def _compile(self, path: Path) -> CompiledTemplate:
+        if path.suffix == ".jinja":
+            render = self._jinja.get_template(path.name).render
+        else:
+            render = Template(path.read_text()).safe_substitute
+
+        return CompiledTemplate(render, path, path.stat().st_mtime)
+
+
+mail_templates = MailTemplates()
@@ -0,0 +1,74 @@
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from flask import current_app
+from sqlalchemy import delete, select
+
+from app.db.outbox import OutboxMessage
+from app.extensions import db
+from app.tasks.mail_batching import mail_batcher
+from app.tasks.mail_tasks import MESSAGE_BUILDERS
+
+logger = get_task_logger(__name__)
+
+
+def relay_outbox(batch_size: int) -> int:
+    """
+    Publishes all pending outbox messages in batches and returns how many were
+    published. Every batch is published over a single broker connection and
+    removed from the outbox in one statement. Rows are locked with SKIP LOCKED, so
+    several relays can run at the same time without publishing a message twice.
+
+    With mail batching enabled, mail tasks routed to the bulk queue are handed to
+    the mail batcher instead of being published one by one. Transactional mails are
+    always published directly, so they never wait for a batch.
+    """
+    celery_app = current_app.extensions["celery"]
+    published = 0
+
+    while True:
+        messages = db.session.scalars(
+            select(OutboxMessage)
+            .order_by(OutboxMessage.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not messages:
+            db.session.commit()
+            return published
+
+        to_publish = messages
+        if mail_batcher.enabled:
+            batched = [m for m in messages if _is_bulk_mail(celery_app, m.task_name)]
+            mail_batcher.add_many(
+                [
+                    {"task": message.task_name, "kwargs": message.kwargs}
+                    for message in batched
+                ]
+            )
+            to_publish = [m for m in messages if m not in batched]
+
+        with celery_app.producer_or_acquire() as producer:
+            for message in to_publish:
+                celery_app.send_task(
+                    message.task_name, kwargs=message.kwargs, producer=producer
+                )
+
+        db.session.execute(
+            delete(OutboxMessage).where(
+                OutboxMessage.id.in_([message.id for message in messages])
+            )
+        )
+        db.session.commit()
+        published += len(messages)
+
+
+def _is_bulk_mail(celery_app, task_name: str) -> bool:
+    route = celery_app.conf.task_routes.get(task_name, {})
+    return task_name in MESSAGE_BUILDERS and route.get("queue") == "bulk"
+
+
+@shared_task(ignore_result=True)
+def relay_outbox_task():
+    published = relay_outbox(current_app.config["OUTBOX_RELAY_BATCH_SIZE"])
+    if published:
+        logger.info("Published %d outbox messages", published)
@@ -0,0 +1,149 @@
+import os
+import smtplib
+import threading
+import time
+from collections import deque
+
+from celery.signals import worker_process_shutdown
+from celery.utils.log import get_task_logger
+from flask_mail import Connection, Message
+
+from app.extensions import mail
+
+logger = get_task_logger(__name__)
+
+# Errors after which a connection can not be used anymore, but sending the message
+# over a fresh connection might still succeed.
+CONNECTION_ERRORS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class SMTPConnectionPool:
+    """
+    Keeps authenticated Flask-Mail connections open between mail tasks, such that
+    not every message pays for a TCP and TLS handshake and SMTP authentication.
+
+    A connection that has been idle for a while is checked with a NOOP before it is
+    reused and closed when it has been idle longer than the server would keep it
+    open anyway. When connecting fails, or a connection turns out to be broken while
+    sending, the message is retried over a new connection with exponential backoff.
+    """
+
+    def __init__(self):
+        self.max_size = 2
+        self.max_idle_seconds = 60.0
+        self.ping_after_seconds = 5.0
+        self.max_retries = 3
+        self.backoff_seconds = 0.5
+        self._idle: deque[tuple[Connection, float]] = deque()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def init_app(self, app):
+        self.max_size = app.config["SMTP_POOL_MAX_SIZE"]
+        self.max_idle_seconds = app.config["SMTP_POOL_MAX_IDLE_SECONDS"]
+        self.ping_after_seconds = app.config["SMTP_POOL_PING_AFTER_SECONDS"]
+        self.max_retries = app.config["SMTP_POOL_MAX_RETRIES"]
+        self.backoff_seconds = app.config["SMTP_POOL_BACKOFF_SECONDS"]
+        self.close_all()
+
+    def send(self, message: Message):
+        for attempt in range(self.max_retries + 1):
+            connection = None
+            try:
+                connection = self.acquire()
+                connection.send(message)
+            except CONNECTION_ERRORS:
+                if connection is not None:
+                    self.discard(connection)
+                if attempt == self.max_retries:
+                    raise
+
+                logger.warning("SMTP connection lost, retrying (attempt %d)", attempt)
+                time.sleep(self.backoff_seconds * 2**attempt)
+            except BaseException:
+                if connection is not None:
+                    self.discard(connection)
+                raise
+            else:
+                self.release(connection)
+                return
+
+    def acquire(self) -> Connection:
+        self._forget_after_fork()
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+
+            idle_seconds = time.monotonic() - last_used
+            if idle_seconds > self.max_idle_seconds:
+                self.discard(connection)
+            elif idle_seconds <= self.ping_after_seconds or self._is_alive(connection):
+                return connection
+
+        return self._connect()
+
+    def release(self, connection: Connection):
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((connection, time.monotonic()))
+                return
+
+        self.discard(connection)
+
+    def close_all(self):
+        self._forget_after_fork()
+
+        with self._lock:
+            connections, self._idle = list(self._idle), deque()
+
+        for connection, _ in connections:
+            self.discard(connection)
+
+    def _connect(self) -> Connection:
+        connection = mail.connect()
+        # Opens the SMTP connection and logs in, without closing it afterwards.
+        return connection.__enter__()
+
+    def _is_alive(self, connection: Connection) -> bool:
+        if connection.host is None:
+            return True
+
+        try:
+            return connection.host.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            self.discard(connection)
+            return False
+
+    def discard(self, connection: Connection):
+        """Closes a connection instead of returning it to the pool."""
+        if connection.host is None:
+            return
+
+        try:
+            connection.host.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.host.close()
+
+    def _forget_after_fork(self):
+        # Sockets inherited from a parent process are shared with that process, so
+        # they are dropped without sending QUIT over them.
+        if self._pid != os.getpid():
+            self._idle = deque()
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+
+smtp_pool = SMTPConnectionPool()
+
+
+@worker_process_shutdown.connect
+def _close_smtp_connections(**kwargs):
+    smtp_pool.close_all()
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_init,
+    worker_process_shutdown,
+    worker_ready,
+)
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.parser import text_string_to_metric_families
+
+from multiprocess_metrics import reset_multiprocess_dir
+
+logger = logging.getLogger(__name__)
+
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+QUEUE_LATENCY = Histogram(
+    "celery_task_queue_latency_seconds",
+    "Time between publishing a task, or its ETA, and a worker starting it.",
+    ["task"],
+    buckets=TASK_BUCKETS,
+)
+RUNTIME = Histogram(
+    "celery_task_runtime_seconds",
+    "Time a worker spent running a task.",
+    ["task"],
+    buckets=TASK_BUCKETS,
+)
+OUTCOMES = Counter(
+    "celery_task_outcomes", "Finished task runs by state.", ["task", "state"]
+)
+RETRIES = Counter("celery_task_retries", "Task retries.", ["task"])
+FAILURES = Counter(
+    "celery_task_failures", "Failed task runs by exception.", ["task", "exception"]
+)
+
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+SUMMARY_SAMPLES = {
+    "celery_task_queue_latency_seconds_sum": "queue_latency_sum",
+    "celery_task_queue_latency_seconds_count": "queue_latency_count",
+    "celery_task_runtime_seconds_sum": "runtime_sum",
+    "celery_task_runtime_seconds_count": "runtime_count",
+    "celery_task_outcomes_total": "runs",
+    "celery_task_retries_total": "retries",
+    "celery_task_failures_total": "failures",
+}
+
+
+class TaskMetrics:
+    """
+    Records how long tasks wait in the queue, how long they run, and how they end,
+    using Celery signals. Publishing a task adds an `enqueued_at` header, which the
+    worker compares with the time it starts the task.
+
+    The worker serves the metrics on `CELERY_METRICS_PORT`. With prefork, every
+    child process writes its metrics to `PROMETHEUS_MULTIPROC_DIR`, which the main
+    process aggregates.
+    """
+
+    def __init__(self):
+        self.port = 0
+        self._started: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.port = app.config["CELERY_METRICS_PORT"]
+
+    def on_publish(self, headers=None, **kwargs):
+        if headers is not None:
+            headers[ENQUEUED_AT_HEADER] = time.time()
+
+    def on_prerun(self, task_id=None, task=None, **kwargs):
+        with self._lock:
+            self._started[task_id] = time.perf_counter()
+
+        enqueued_at = _enqueued_at(task.request)
+        if enqueued_at is not None:
+            QUEUE_LATENCY.labels(task.name).observe(max(time.time() - enqueued_at, 0))
+
+    def on_postrun(self, task_id=None, task=None, state=None, **kwargs):
+        with self._lock:
+            started_at = self._started.pop(task_id, None)
+
+        if started_at is not None:
+            RUNTIME.labels(task.name).observe(time.perf_counter() - started_at)
+        OUTCOMES.labels(task.name, state or "UNKNOWN").inc()
+
+    def on_retry(self, request=None, **kwargs):
+        RETRIES.labels(request.task).inc()
+
+    def on_failure(self, sender=None, exception=None, **kwargs):
+        FAILURES.labels(sender.name, type(exception).__name__).inc()
+
+    def on_worker_init(self, **kwargs):
+        reset_multiprocess_dir()
+
+    def on_worker_ready(self, **kwargs):
+        if not self.port:
+            return
+
+        registry = REGISTRY
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+
+        start_http_server(self.port, registry=registry)
+        logger.info("Serving task metrics on port %d", self.port)
+
+    def on_process_shutdown(self, **kwargs):
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            multiprocess.mark_process_dead(os.getpid())
+
+
+def _enqueued_at(request) -> float | None:
+    """
+    The time the task was published, or its ETA when that is later. In a worker the
+    custom headers are attributes of the request, when applied eagerly they are not.
+    """
+    enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        enqueued_at = (request.headers or {}).get(ENQUEUED_AT_HEADER)
+    if enqueued_at is None:
+        return None
+
+    if request.eta:
+        eta = request.eta
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        enqueued_at = max(enqueued_at, eta.timestamp())
+
+    return enqueued_at
+
+
+def task_summary(urls: list[str]) -> list[dict]:
+    """
+    Summarizes the metrics served by the workers at the given URLs, e.g. one per
+    worker pool, per task: the number of runs, the mean queue latency and runtime,
+    and the number of retries and failures.
+    """
+    totals: dict[str, dict] = defaultdict(lambda: defaultdict(float))
+    for url in urls:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode()
+
+        for family in text_string_to_metric_families(text):
+            for sample in family.samples:
+                if sample.name in SUMMARY_SAMPLES and "task" in sample.labels:
+                    task = totals[sample.labels["task"]]
+                    task[SUMMARY_SAMPLES[sample.name]] += sample.value
+
+    def mean(task, name):
+        count = task[f"{name}_count"]
+        return task[f"{name}_sum"] / count if count else 0.0
+
+    return [
+        {
+            "task": name,
+            "runs": int(task["runs"]),
+            "mean_queue_latency": mean(task, "queue_latency"),
+            "mean_runtime": mean(task, "runtime"),
+            "retries": int(task["retries"]),
+            "failures": int(task["failures"]),
+        }
+        for name, task in sorted(totals.items())
+    ]
+
+
+task_metrics = TaskMetrics()
+before_task_publish.connect(task_metrics.on_publish, weak=False)
+task_prerun.connect(task_metrics.on_prerun, weak=False)
+task_postrun.connect(task_metrics.on_postrun, weak=False)
+task_retry.connect(task_metrics.on_retry, weak=False)
+task_failure.connect(task_metrics.on_failure, weak=False)
+worker_init.connect(task_metrics.on_worker_init, weak=False)
+worker_ready.connect(task_metrics.on_worker_ready, weak=False)
+worker_process_shutdown.connect(task_metrics.on_process_shutdown, weak=False)
@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+
+from celery.signals import worker_process_init, worker_process_shutdown
+from flask import Flask
+from flask.ctx import AppContext
+from flask.globals import _cv_app
+
+from app.extensions import db
+
+
+class WorkerAppContext:
+    """
+    Pushes a single app context per worker process at `worker_process_init`, such
+    that tasks do not each push and pop their own. Every task still gets a clean
+    scope, as the DB session is removed and `g` is replaced after every task.
+
+    Tasks that are called from within another task, or from a thread other than the
+    one that pushed the context, get their own app context like before.
+    """
+
+    def __init__(self):
+        self.app: Flask | None = None
+        self.enabled = False
+        self._context: AppContext | None = None
+        self._running = False
+
+    def init_app(self, app):
+        # A context of a previous app must not be used for the tasks of this one.
+        self.pop()
+        self.app = app
+        self.enabled = app.config["CELERY_PERSISTENT_APP_CONTEXT"]
+
+    def push(self, **kwargs):
+        if self.enabled and self._context is None:
+            assert self.app is not None, "init_app has not been called"
+            self._context = self.app.app_context()
+            self._context.push()
+
+    def pop(self, **kwargs):
+        if self._context is not None:
+            db.session.remove()
+            self._context.pop()
+            self._context = None
+
+    def available(self) -> bool:
+        """Whether the current task can run in the persistent app context."""
+        return (
+            self._context is not None
+            and not self._running
+            and _cv_app.get(None) is self._context
+        )
+
+    @contextmanager
+    def task_scope(self):
+        assert self.app is not None and self._context is not None
+        self._running = True
+        try:
+            yield
+        finally:
+            self._running = False
+            db.session.remove()
+            self._context.g = self.app.app_ctx_globals_class()
+
+
+worker_app_context = WorkerAppContext()
+worker_process_init.connect(worker_app_context.push, weak=False)
+worker_process_shutdown.connect(worker_app_context.pop, weak=False)
@@ -0,0 +1,41 @@
+import hashlib
+import hmac
+import secrets
+
+from werkzeug.security import check_password_hash
+
+from app.config import MY_SOLID_APP_TOKEN_HMAC_KEY
+
+TOKEN_DIGEST_PREFIX = "hmac-sha256$"
+
+_key = MY_SOLID_APP_TOKEN_HMAC_KEY.encode()
+
+
+def generate_token() -> str:
+    return secrets.token_urlsafe(32)
+
+
+def token_digest(token: str) -> str:
+    """
+    Keyed digest of a one-time token, which is stored instead of the token itself.
+    Tokens are random 32 byte values, so a single HMAC suffices where passwords need
+    a slow key derivation function. The digest is deterministic, so it can be used
+    to look up the token through an index.
+    """
+    digest = hmac.new(_key, token.encode(), hashlib.sha256).hexdigest()
+    return f"{TOKEN_DIGEST_PREFIX}{digest}"
+
+
+def is_legacy_token_hash(stored: str | None) -> bool:
+    """Tokens issued before the HMAC digests were stored as werkzeug KDF hashes."""
+    return stored is not None and not stored.startswith(TOKEN_DIGEST_PREFIX)
+
+
+def check_token(stored: str | None, token: str) -> bool:
+    if stored is None:
+        return False
+
+    if is_legacy_token_hash(stored):
+        return check_password_hash(stored, token)
+
+    return hmac.compare_digest(stored, token_digest(token))
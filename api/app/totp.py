@@ -0,0 +1,117 @@
+import hmac
+import threading
+import time
+
+import pyotp
+import redis
+from flask import current_app
+
+from app.cache import LRUCache
+from app.extensions import redis_client
+
+
+class MemoryReplayStorage:
+    """In-process storage of used time steps, only meant for tests."""
+
+    def __init__(self):
+        # The ttl differs per call, so entries hold their own expiry and the cache
+        # only bounds the number of them.
+        self._used = LRUCache(max_size=1024, ttl=float("inf"))
+        self._lock = threading.Lock()
+
+    def mark_used(self, key: str, ttl: int) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if (self._used.get(key) or 0) > now:
+                return False
+
+            self._used.set(key, now + ttl)
+            return True
+
+
+class RedisReplayStorage:
+    """Used time steps shared by all workers, one `SET NX` per verification."""
+
+    def __init__(self, client: redis.Redis):
+        self.redis = client
+
+    def mark_used(self, key: str, ttl: int) -> bool:
+        return bool(self.redis.set(key, 1, nx=True, ex=ttl))
+
+
+class TOTPVerifier:
+    """
+    Verifies TOTP codes of users without decrypting their secret on every attempt.
+
+    Decrypted secrets are kept in a small LRU cache with a short TTL, keyed by user
+    and checked against the encrypted secret, such that a changed secret is never
+    served from the cache. Every accepted (user, time step) pair is recorded with an
+    expiry, so a code can not be replayed within its validity window.
+    """
+
+    def __init__(self):
+        self.valid_window = 0
+        self.secrets = LRUCache()
+        self.storage: MemoryReplayStorage | RedisReplayStorage = MemoryReplayStorage()
+
+    def init_app(self, app):
+        self.valid_window = app.config["TOTP_VALID_WINDOW"]
+        self.secrets = LRUCache(
+            max_size=app.config["TOTP_SECRET_CACHE_MAX_SIZE"],
+            ttl=app.config["TOTP_SECRET_CACHE_TTL_SECONDS"],
+        )
+        self.storage = (
+            RedisReplayStorage(
+                redis_client(app, app.config["TOTP_REPLAY_REDIS_TIMEOUT_SECONDS"])
+            )
+            if app.config["TOTP_REPLAY_STORAGE"] == "redis"
+            else MemoryReplayStorage()
+        )
+
+    def verify(self, user, code: str) -> bool:
+        """Verifies the code against the (encrypted) TOTP secret of the user."""
+        if user.encrypted_totp_secret is None:
+            return False
+
+        return self.verify_secret(user.id, self._get_totp(user), code)
+
+    def verify_secret(self, user_id: int, totp: pyotp.TOTP, code: str) -> bool:
+        """
+        Verifies the code against the given TOTP of the user and marks its time step
+        as used. Returns False for codes that were already used before.
+        """
+        code = code.strip()
+        # `isdigit` also accepts digits of other scripts, which `compare_digest` rejects
+        if len(code) != totp.digits or not (code.isascii() and code.isdigit()):
+            return False
+
+        counter = int(time.time() // totp.interval)
+        for step in range(counter - self.valid_window, counter + self.valid_window + 1):
+            if hmac.compare_digest(totp.generate_otp(step), code):
+                return self._mark_used(user_id, step, totp.interval)
+
+        return False
+
+    def invalidate(self, user_id: int):
+        self.secrets.delete(user_id)
+
+    def _mark_used(self, user_id: int, step: int, interval: int) -> bool:
+        # The code of a step is accepted until `valid_window` steps after it.
+        ttl = interval * (2 * self.valid_window + 1)
+        try:
+            return self.storage.mark_used(f"totp_used:{user_id}:{step}", ttl)
+        except redis.RedisError:
+            current_app.logger.warning("Could not check TOTP replay in redis")
+            return True
+
+    def _get_totp(self, user) -> pyotp.TOTP:
+        cached = self.secrets.get(user.id)
+        if cached is not None and cached[0] == user.encrypted_totp_secret:
+            return cached[1]
+
+        totp = pyotp.TOTP(user.totp_secret)
+        self.secrets.set(user.id, (user.encrypted_totp_secret, totp))
+        return totp
+
+
+totp_verifier = TOTPVerifier()
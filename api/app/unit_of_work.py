@@ -0,0 +1,56 @@
+from contextlib import contextmanager
+from functools import partial
+
+from app.db.outbox import OutboxMessage
+from app.extensions import db
+
+
+class UnitOfWork:
+    """
+    Collects all changes of a single request handler, such that they are written in
+    one transaction. Celery tasks are written to the outbox with `enqueue` as part of
+    that transaction, other side effects can be registered with `after_commit` and
+    only run once the transaction has been committed.
+
+    The commit expires all loaded attributes, so anything the response needs of the
+    written objects, like a dumped user, is best read inside the block.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self._after_commit: list = []
+
+    def add(self, instance):
+        self.session.add(instance)
+
+    def delete(self, instance):
+        self.session.delete(instance)
+
+    def flush(self):
+        """Writes pending changes without committing, e.g. to get generated ids."""
+        self.session.flush()
+
+    def enqueue(self, task, **kwargs):
+        """Publishes the task with the given keyword arguments through the outbox."""
+        self.session.add(OutboxMessage(task_name=task.name, kwargs=kwargs))
+
+    def after_commit(self, func, *args, **kwargs):
+        self._after_commit.append(partial(func, *args, **kwargs))
+
+    def run_after_commit(self):
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+
+@contextmanager
+def unit_of_work():
+    uow = UnitOfWork(db.session)
+    try:
+        yield uow
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+
+    uow.run_after_commit()
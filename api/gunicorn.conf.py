@@ -0,0 +1,26 @@
+import os
+
+from prometheus_client import CollectorRegistry, multiprocess, start_http_server
+
+from multiprocess_metrics import reset_multiprocess_dir
+
+METRICS_PORT = int(os.environ.get("MY_SOLID_APP_METRICS_PORT", 9541))
+
+
+def on_starting(server):
+    reset_multiprocess_dir()
+
+
+def when_ready(server):
+    # The metrics of all workers are served by the master, on a port that is only
+    # reachable from within the network.
+    if METRICS_PORT and os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        start_http_server(METRICS_PORT, registry=registry)
+        server.log.info("Serving metrics on port %d", METRICS_PORT)
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,32 @@
+"""Add outbox for Celery tasks
+
+Revision ID: 3b8e5d1c7a20
+Revises: d29daf4c6bc4
+Create Date: 2026-10-18 11:02:47.513930
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "3b8e5d1c7a20"
+down_revision = "d29daf4c6bc4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox_message",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("task_name", sa.String(length=255), nullable=False),
+        sa.Column("kwargs", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("outbox_message")
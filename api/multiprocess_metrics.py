@@ -0,0 +1,16 @@
+"""
+Helpers for `PROMETHEUS_MULTIPROC_DIR`, shared by gunicorn.conf.py and the Celery
+worker. This module lives outside of `app`, such that the gunicorn master does not
+import the app.
+"""
+
+import os
+import shutil
+
+
+def reset_multiprocess_dir():
+    """Empties the directory, such that metrics of a previous run are not aggregated."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
@@ -0,0 +1,80 @@
+"""
+Compares the throughput of the sync and async mail transports against a local SMTP
+server which delays every message, to mimic the latency of a real mail provider.
+
+    python -m scripts.benchmark_mail_transport --messages 200 --latency-ms 50
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.app import create_app
+from app.config import TestConfig
+from app.fernet import encrypt
+from app.tasks.mail_tasks import deliver_mail_batch, send_email_verification_email
+from app.tasks.smtp_pool import smtp_pool
+
+
+class SlowHandler:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def handle_DATA(self, server, session, envelope):  # noqa: N802
+        await asyncio.sleep(self.latency)
+        return "250 Message accepted for delivery"
+
+
+def run(transport: str, controller: Controller, args) -> float:
+    config = TestConfig()
+    config.MAIL_SERVER = controller.hostname
+    config.MAIL_PORT = controller.port
+    config.MAIL_USERNAME = None
+    config.MAIL_SUPPRESS_SEND = False
+    config.MAIL_DEBUG = False
+    config.MAIL_TRANSPORT = transport
+    config.MAIL_ASYNC_MAX_IN_FLIGHT = args.max_in_flight
+
+    encrypted_verification_token = encrypt("x")
+    jobs = [
+        {
+            "task": send_email_verification_email.name,
+            "kwargs": {
+                "receiver": f"user{i}@test.com",
+                "encrypted_verification_token": encrypted_verification_token,
+            },
+        }
+        for i in range(args.messages)
+    ]
+
+    app = create_app(config_object=config)
+    with app.app_context():
+        start = time.perf_counter()
+        failed = deliver_mail_batch(jobs)
+        elapsed = time.perf_counter() - start
+        smtp_pool.close_all()
+
+    assert not failed, f"{len(failed)} messages failed"
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--max-in-flight", type=int, default=20)
+    args = parser.parse_args()
+
+    controller = Controller(SlowHandler(args.latency_ms / 1000), hostname="127.0.0.1")
+    controller.start()
+    try:
+        for transport in ("sync", "async"):
+            elapsed = run(transport, controller, args)
+            print(
+                f"{transport:>5}: {args.messages} messages in {elapsed:.2f}s "
+                f"({args.messages / elapsed:.0f} messages/s)"
+            )
+    finally:
+        controller.stop()
@@ -0,0 +1,36 @@
+"""
+Measures the overhead the metrics add to a request, by running the hooks of the
+metrics around an empty response, in single and in multiprocess mode.
+
+    python -m scripts.benchmark_metrics --number 20000
+    PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus python -m scripts.benchmark_metrics
+"""
+
+import argparse
+import os
+import timeit
+
+from flask import Response
+
+from app.app import create_app
+from app.config import TestConfig
+from app.metrics import metrics
+
+
+def handle_request():
+    metrics.start_request()
+    metrics.end_request(Response())
+    metrics.teardown_request(None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = create_app(config_object=TestConfig())
+    with app.test_request_context("/login", method="POST"):
+        seconds = timeit.timeit(handle_request, number=args.number) / args.number
+
+    mode = "multiprocess" if "PROMETHEUS_MULTIPROC_DIR" in os.environ else "single"
+    print(f"{mode} mode: {seconds * 1e6:.1f} µs per request")
@@ -0,0 +1,45 @@
+"""
+Compares rendering a 2FA QR code the way it used to be done (`qrcode.make` to a PIL
+PNG) with the PNG and SVG paths of the QR code service.
+
+    python -m scripts.benchmark_qr_codes --number 200
+"""
+
+import argparse
+import io
+import timeit
+
+import qrcode
+
+from app.qr_codes import qr_code_matrix, render_png, render_svg
+
+URI = (
+    "otpauth://totp/MySolidApp:someone%40example.com"
+    "?secret=JBSWY3DPEHPK3PXPJBSWY3DPEHPK3PXP&issuer=MySolidApp"
+)
+
+
+def qrcode_make_png() -> bytes:
+    buffered = io.BytesIO()
+    qrcode.make(URI).save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=200)
+    parser.add_argument("--mask-pattern", type=int, default=0)
+    args = parser.parse_args()
+
+    cases = {
+        "qrcode.make png": qrcode_make_png,
+        "service png": lambda: render_png(qr_code_matrix(URI, args.mask_pattern)),
+        "service svg": lambda: render_svg(qr_code_matrix(URI, args.mask_pattern)),
+    }
+    matrix = qr_code_matrix(URI, args.mask_pattern)
+    cases["png from matrix"] = lambda: render_png(matrix)
+    cases["svg from matrix"] = lambda: render_svg(matrix)
+
+    for name, func in cases.items():
+        seconds = timeit.timeit(func, number=args.number) / args.number
+        print(f"{name:>16}: {seconds * 1000:6.2f} ms, {len(func()):6d} bytes")
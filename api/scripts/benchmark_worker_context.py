@@ -0,0 +1,47 @@
+"""
+Compares the number of tasks per second a worker process runs with an app context
+per task and with a persistent app context, for a task doing a single query.
+
+    python -m scripts.benchmark_worker_context --number 5000
+"""
+
+import argparse
+import time
+
+from sqlalchemy import text
+
+from app.app import create_app
+from app.config import TestConfig
+from app.extensions import db
+from app.tasks.worker_context import worker_app_context
+
+
+def tasks_per_second(task, number: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(number):
+        task()
+    return number / (time.perf_counter() - started_at)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=5000)
+    args = parser.parse_args()
+
+    app = create_app(config_object=TestConfig())
+
+    @app.extensions["celery"].task
+    def query_task():
+        db.session.execute(text("SELECT 1"))
+
+    for persistent in (False, True):
+        app.config["CELERY_PERSISTENT_APP_CONTEXT"] = persistent
+        worker_app_context.init_app(app)
+        worker_app_context.push()
+        try:
+            rate = tasks_per_second(query_task, args.number)
+        finally:
+            worker_app_context.pop()
+
+        mode = "persistent context" if persistent else "context per task"
+        print(f"{mode:>18}: {rate:8.0f} tasks/s")
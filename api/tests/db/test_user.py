@@ -1,6 +1,8 @@
 import pytest
+from werkzeug.security import generate_password_hash
 
 from app.db.user import User
+from app.tokens import TOKEN_DIGEST_PREFIX
 
 
 class TestUser:
@@ -82,3 +84,47 @@ class TestUser:
         user.clear_email_verification_token()
 
         assert user.email_verification_token is None
+
+    def test_tokens_stored_as_digest(self, user):
+        reset_token = user.set_password_reset_token()
+        verification_token = user.set_email_verification_token()
+
+        assert user.password_reset_token.startswith(TOKEN_DIGEST_PREFIX)
+        assert user.email_verification_token.startswith(TOKEN_DIGEST_PREFIX)
+        assert reset_token not in user.password_reset_token
+        assert verification_token not in user.email_verification_token
+
+    def test_check_legacy_tokens(self, user):
+        user.password_reset_token = generate_password_hash("legacy_reset")
+        user.email_verification_token = generate_password_hash("legacy_verify")
+
+        assert user.check_password_reset_token("legacy_reset")
+        assert not user.check_password_reset_token("random_token")
+        assert user.check_email_verification_token("legacy_verify")
+        assert not user.check_email_verification_token("random_token")
+
+    def test_find_by_password_reset_token(self, db, user):
+        token = user.set_password_reset_token()
+        db.session.commit()
+
+        assert User.find_by_password_reset_token(user.email, token) == user
+        assert User.find_by_password_reset_token(user.email, "random_token") is None
+        assert User.find_by_password_reset_token("other@test.com", token) is None
+
+    def test_find_by_email_verification_token(self, db, user):
+        token = user.set_email_verification_token()
+        db.session.commit()
+
+        assert User.find_by_email_verification_token(user.email, token) == user
+        assert User.find_by_email_verification_token(user.email, "random") is None
+        assert User.find_by_email_verification_token("other@test.com", token) is None
+
+    def test_find_by_legacy_token(self, db, user):
+        user.password_reset_token = generate_password_hash("legacy_reset")
+        user.email_verification_token = generate_password_hash("legacy_verify")
+        db.session.commit()
+
+        assert User.find_by_password_reset_token(user.email, "legacy_reset") == user
+        assert User.find_by_password_reset_token(user.email, "random") is None
+        assert User.find_by_email_verification_token(user.email, "legacy_verify") == user
+        assert User.find_by_email_verification_token(user.email, "random") is None
@@ -6,22 +6,27 @@ import pytest
 from flask import session
 from flask_login import current_user
 
+from app.db.outbox import OutboxMessage
 from app.db.user import User, UserSchema
 from app.errors import APIErrorEnum
+from app.fernet import decrypt
+from app.tasks.mail_tasks import (
+    send_email_verification_email,
+    send_forgot_password_email,
+)
 
 
 class TestRegisterAPI:
     def test_register(self, client, db, user):
         assert User.query.count() == 1
 
-        with patch(
-            "app.resources.authentication.send_email_verification_email"
-        ) as mock_email:
-            response = client.post(
-                "/register", json={"email": "new@user.com", "password": "white_wolf"}
-            )
+        response = client.post(
+            "/register", json={"email": "new@user.com", "password": "white_wolf"}
+        )
 
-            mock_email.delay.assert_called_once()
+        assert [message.task_name for message in OutboxMessage.query] == [
+            send_email_verification_email.name
+        ]
 
         assert response.status_code == 200
 
@@ -83,6 +88,27 @@ class TestLoginAPI:
             == "Could not login with the given email and password"
         )
 
+    def test_login_rate_limited(self, client, user):
+        for _ in range(10):
+            client.post(
+                "/login", json={"email": "USER@test.com", "password": "gooseberries"}
+            )
+
+        with patch("app.resources.authentication.User") as user_mock:
+            response = client.post(
+                "/login", json={"email": "user@test.com", "password": "password123"}
+            )
+
+        assert response.status_code == 429
+        assert response.json["error"] == APIErrorEnum.too_many_requests.value
+        assert int(response.headers["Retry-After"]) > 0
+        user_mock.query.filter_by.assert_not_called()
+
+        response = client.post(
+            "/login", json={"email": "other@test.com", "password": "password123"}
+        )
+        assert response.status_code == 401
+
     def test_login_with_2fa_enabled(self, db, client, user):
         user.two_factor_enabled = True
         db.session.add(user)
@@ -139,6 +165,18 @@ class TestLogin2FAAPI:
 
             assert current_user.is_authenticated
 
+    def test_login_2fa_replayed_code(self, client, user_with_2fa, totp):
+        code = totp.now()
+        for expected_status in (200, 401):
+            client.post(
+                "/login", json={"email": user_with_2fa.email, "password": "password123"}
+            )
+            response = client.post(
+                "/login_2fa", json={"email": user_with_2fa.email, "totp_code": code}
+            )
+
+            assert response.status_code == expected_status
+
     def test_login_2fa_wrong_email(self, client, user_with_2fa, totp):
         with client:
             response = client.post(
@@ -329,31 +367,32 @@ class TestForgotPasswordAPI:
         assert user.password_reset_token is None
         assert user.password_reset_time is None
 
-        with patch(
-            "app.resources.authentication.send_forgot_password_email"
-        ) as mock_email:
-            response = client.post(
-                "/forgot_password",
-                json={"email": user.email},
-            )
+        response = client.post(
+            "/forgot_password",
+            json={"email": user.email},
+        )
 
-            mock_email.delay.assert_called_once()
+        assert [message.task_name for message in OutboxMessage.query] == [
+            send_forgot_password_email.name
+        ]
 
         assert response.status_code == 200
 
         assert user.password_reset_token is not None
         assert user.password_reset_time == 12345
 
+        # Only the encrypted token is stored with the message
+        kwargs = OutboxMessage.query.one().kwargs
+        assert set(kwargs) == {"receiver", "encrypted_reset_token"}
+        assert user.check_password_reset_token(decrypt(kwargs["encrypted_reset_token"]))
+
     def test_forgot_password_user_does_not_exist(self, client, user):
-        with patch(
-            "app.resources.authentication.send_forgot_password_email"
-        ) as mock_email:
-            response = client.post(
-                "/forgot_password",
-                json={"email": "unknown@email.com"},
-            )
+        response = client.post(
+            "/forgot_password",
+            json={"email": "unknown@email.com"},
+        )
 
-            mock_email.delay.assert_not_called()
+        assert OutboxMessage.query.count() == 0
 
         assert response.status_code == 200
 
@@ -576,14 +615,13 @@ class TestResendVerifyEmailAPI:
 
         old_token = logged_in_user.email_verification_token
 
-        with patch(
-            "app.resources.authentication.send_email_verification_email"
-        ) as mock_email:
-            response = client.post(
-                "/resend_email_verification",
-            )
+        response = client.post(
+            "/resend_email_verification",
+        )
 
-            mock_email.delay.assert_called_once()
+        assert [message.task_name for message in OutboxMessage.query] == [
+            send_email_verification_email.name
+        ]
 
         assert response.status_code == 200
 
@@ -11,9 +11,36 @@ class TestGenerate2FASecretAPI:
         assert response.status_code == 200
 
         data = response.json
-        assert "qr_code" in data
+        assert "provisioning_id" in data
         assert "totp_secret" in data
 
+    def test_2fa_qr_code(self, client, logged_in_user):
+        data = client.get("/generate_2fa_secret").json
+
+        response = client.get(f"/2fa_qr_code/{data['provisioning_id']}")
+        assert response.status_code == 200
+        assert response.mimetype == "image/svg+xml"
+        assert response.data.startswith(b"<svg")
+        assert response.cache_control.private
+        assert response.cache_control.max_age == 600
+
+        response = client.get(f"/2fa_qr_code/{data['provisioning_id']}?format=png")
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert response.data.startswith(b"\x89PNG")
+
+    def test_2fa_qr_code_invalid_format(self, client, logged_in_user):
+        data = client.get("/generate_2fa_secret").json
+
+        response = client.get(f"/2fa_qr_code/{data['provisioning_id']}?format=gif")
+        assert response.status_code == 400
+        assert response.json["error"] == APIErrorEnum.invalid_request_data.value
+
+    def test_2fa_qr_code_not_found(self, client, logged_in_user):
+        response = client.get("/2fa_qr_code/unknown")
+        assert response.status_code == 404
+        assert response.json["error"] == APIErrorEnum.provisioning_not_found.value
+
     def test_generate_2fa_secret_not_logged_in(self, client, user):
         response = client.get("/generate_2fa_secret")
         assert response.status_code == 401
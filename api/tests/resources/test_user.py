@@ -1,9 +1,13 @@
-from unittest.mock import patch
+import json
 
+import pytest
 from flask_login import current_user
 
-from app.db.user import User
+from app.db.outbox import OutboxMessage
+from app.db.user import User, UserSchema
 from app.errors import APIErrorEnum
+from app.passwords import password_hasher
+from app.tasks.mail_tasks import send_email_verification_email
 
 
 class TestUsersAPI:
@@ -19,7 +23,11 @@ class TestUsersAPI:
         assert "items" in response_data
         assert len(response_data["items"]) == 2
         assert "meta" in response_data
-        assert response_data["meta"] == {}
+        assert response_data["meta"] == {
+            "limit": 100,
+            "next_cursor": None,
+            "total_items": 2,
+        }
 
         # Verify user properties
         user_emails = [user["email"] for user in response_data["items"]]
@@ -43,6 +51,59 @@ class TestUsersAPI:
         assert response_data["meta"]["per_page"] == 1
         assert response_data["meta"]["total_pages"] == 2
 
+    def test_get_users_with_pagination_without_total(
+        self, client, db, logged_in_user, admin
+    ):
+        response = client.get("/users?page=1&per_page=1&include_total=false")
+
+        assert response.status_code == 200
+        assert len(response.json["items"]) == 1
+        assert response.json["meta"]["total_items"] is None
+        assert response.json["meta"]["total_pages"] is None
+
+    def test_get_users_per_page_capped(self, app, client, db, logged_in_user, admin):
+        app.config["PAGINATION_MAX_PAGE_SIZE"] = 1
+
+        response = client.get("/users?page=1&per_page=1000")
+
+        assert response.status_code == 200
+        assert len(response.json["items"]) == 1
+        assert response.json["meta"]["per_page"] == 1
+
+    def test_get_users_with_cursor(self, client, db, logged_in_user, admin):
+        response = client.get("/users?limit=1")
+
+        assert response.status_code == 200
+        assert [item["email"] for item in response.json["items"]] == ["user@test.com"]
+        assert response.json["meta"]["limit"] == 1
+        assert response.json["meta"]["total_items"] == 2
+
+        cursor = response.json["meta"]["next_cursor"]
+        assert cursor is not None
+
+        response = client.get(f"/users?after={cursor}&limit=1&include_total=false")
+
+        assert response.status_code == 200
+        assert [item["email"] for item in response.json["items"]] == ["admin@test.com"]
+        assert response.json["meta"]["next_cursor"] is None
+        assert response.json["meta"]["total_items"] is None
+
+    def test_get_users_limit_capped(self, app, client, db, logged_in_user, admin):
+        app.config["PAGINATION_MAX_PAGE_SIZE"] = 1
+
+        response = client.get("/users?limit=1000")
+
+        assert response.status_code == 200
+        assert len(response.json["items"]) == 1
+        assert response.json["meta"]["next_cursor"] is not None
+
+    @pytest.mark.parametrize("cursor", ["1", "abc.def", "InN0cmluZyI.abcdef"])
+    def test_get_users_invalid_cursor(self, client, db, logged_in_user, cursor):
+        response = client.get(f"/users?after={cursor}")
+
+        assert response.status_code == 400
+        assert response.json["error"] == APIErrorEnum.invalid_pagination_cursor.value
+
     def test_get_users_not_logged_in(self, client, db):
         response = client.get("/users")
         assert response.status_code == 401
@@ -50,18 +111,19 @@ class TestUsersAPI:
     def test_create_user_as_admin(self, client, db, logged_in_admin):
         assert User.query.count() == 1
 
-        with patch("app.resources.user.send_email_verification_email") as mock_email:
-            # Create a new user
-            response = client.post(
-                "/users",
-                json={
-                    "email": "newuser@test.com",
-                    "password": "newpassword123",
-                    "is_admin": False,
-                },
-            )
+        # Create a new user
+        response = client.post(
+            "/users",
+            json={
+                "email": "newuser@test.com",
+                "password": "newpassword123",
+                "is_admin": False,
+            },
+        )
 
-            mock_email.delay.assert_called_once()
+        assert [message.task_name for message in OutboxMessage.query] == [
+            send_email_verification_email.name
+        ]
 
         assert response.status_code == 200
         assert User.query.count() == 2
@@ -82,18 +144,19 @@ class TestUsersAPI:
         # Login as admin
         client.post("/login", json={"email": admin.email, "password": "password321"})
 
-        with patch("app.resources.user.send_email_verification_email") as mock_email:
-            # Create the first user
-            client.post(
-                "/users",
-                json={
-                    "email": "duplicate@test.com",
-                    "password": "password123",
-                    "is_admin": False,
-                },
-            )
+        # Create the first user
+        client.post(
+            "/users",
+            json={
+                "email": "duplicate@test.com",
+                "password": "password123",
+                "is_admin": False,
+            },
+        )
 
-            mock_email.delay.assert_called_once()
+        assert [message.task_name for message in OutboxMessage.query] == [
+            send_email_verification_email.name
+        ]
 
         # Try to create a duplicate user
         response = client.post(
@@ -123,6 +186,149 @@ class TestUsersAPI:
         assert response.status_code == 403
 
 
+class TestUsersBatchAPI:
+    def test_create_users_batch(self, client, db, logged_in_admin, user):
+        response = client.post(
+            "/users/batch",
+            json=[
+                {"email": "a@test.com", "password": "Password1", "is_admin": False},
+                {
+                    "email": "user@test.com",
+                    "password": "Password1",
+                    "is_admin": False,
+                },
+                {"email": "b@test.com", "password": "Password2", "is_admin": True},
+                {"email": "a@test.com", "password": "Password3", "is_admin": False},
+                {"email": "c@test.com", "is_admin": False},
+            ],
+        )
+
+        assert sorted(message.kwargs["receiver"] for message in OutboxMessage.query) == [
+            "a@test.com",
+            "b@test.com",
+        ]
+
+        assert response.status_code == 200
+        assert response.json["created"] == 2
+
+        report = response.json["items"]
+        assert [item["status"] for item in report] == [
+            "created",
+            "duplicate",
+            "created",
+            "duplicate",
+            "invalid",
+        ]
+        assert report[1]["error"] == APIErrorEnum.email_already_exists.value
+        assert report[4]["error"] == APIErrorEnum.invalid_request_data.value
+        assert report[4]["email"] == "c@test.com"
+        assert "password" in report[4]["messages"]
+
+        new_user = db.session.get(User, report[2]["id"])
+        assert new_user.email == "b@test.com"
+        assert new_user.is_admin
+        assert new_user.is_correct_password("Password2")
+        assert new_user.email_verification_token is not None
+        assert not new_user.is_verified
+        assert User.query.count() == 4
+
+    @pytest.mark.parametrize("payload", [{}, [], "users"])
+    def test_create_users_batch_not_a_list(self, client, db, logged_in_admin, payload):
+        response = client.post("/users/batch", json=payload)
+
+        assert response.status_code == 400
+        assert response.json["error"] == APIErrorEnum.invalid_request_data.value
+
+    def test_create_users_batch_too_large(self, app, client, db, logged_in_admin):
+        app.config["USER_BATCH_MAX_SIZE"] = 1
+
+        response = client.post(
+            "/users/batch",
+            json=[
+                {"email": "a@test.com", "password": "Password1", "is_admin": False},
+                {"email": "b@test.com", "password": "Password1", "is_admin": False},
+            ],
+        )
+
+        assert response.status_code == 400
+        assert User.query.count() == 1
+
+    def test_create_users_batch_concurrently_created(
+        self, client, db, logged_in_admin, monkeypatch
+    ):
+        def hash_many(passwords):
+            # Another request creates one of the users after they were looked up
+            db.session.add(
+                User(email="b@test.com", is_admin=False, hashed_password="hashed")
+            )
+            db.session.commit()
+            return ["hashed"] * len(passwords)
+
+        monkeypatch.setattr(password_hasher, "hash_many", hash_many)
+
+        response = client.post(
+            "/users/batch",
+            json=[
+                {"email": "a@test.com", "password": "Password1", "is_admin": False},
+                {"email": "b@test.com", "password": "Password1", "is_admin": False},
+            ],
+        )
+
+        assert response.status_code == 409
+        assert response.json["error"] == APIErrorEnum.email_already_exists.value
+        assert "b@test.com" in response.json["message"]
+        assert "a@test.com" not in response.json["message"]
+        assert User.query.filter_by(email="a@test.com").first() is None
+        assert OutboxMessage.query.count() == 0
+
+    def test_create_users_batch_not_admin(self, client, db, logged_in_user):
+        response = client.post(
+            "/users/batch",
+            json=[{"email": "a@test.com", "password": "Password1", "is_admin": False}],
+        )
+
+        assert response.status_code == 403
+        assert User.query.count() == 1
+
+
+class TestUsersExportAPI:
+    def test_export_ndjson(self, app, client, db, logged_in_admin, user):
+        app.config["USER_EXPORT_BATCH_SIZE"] = 1
+
+        response = client.get("/users/export")
+
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert "users.ndjson" in response.headers["Content-Disposition"]
+        assert [json.loads(line) for line in response.text.splitlines()] == [
+            UserSchema().dump(db.session.get(User, 1)),
+            UserSchema().dump(user),
+        ]
+
+    def test_export_csv(self, app, client, db, logged_in_admin, user):
+        app.config["USER_EXPORT_BATCH_SIZE"] = 1
+
+        response = client.get("/users/export?format=csv")
+
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        assert response.text.splitlines() == [
+            "id,email,is_admin,is_verified,two_factor_enabled",
+            "1,admin@test.com,True,False,False",
+            "2,user@test.com,False,False,False",
+        ]
+
+    def test_export_unknown_format(self, client, db, logged_in_admin):
+        response = client.get("/users/export?format=xml")
+
+        assert response.status_code == 400
+        assert response.json["error"] == APIErrorEnum.invalid_export_format.value
+
+    def test_export_not_admin(self, client, db, logged_in_user):
+        response = client.get("/users/export")
+        assert response.status_code == 403
+
+
 class TestUserAPI:
     def test_delete_user_as_admin(self, client, db, logged_in_admin, user):
         user_id = user.id
@@ -172,3 +378,16 @@ class TestDeleteAccountAPI:
 
         assert response.status_code == 401
         assert User.query.count() == 1
+
+
+class TestDBPoolStatsAPI:
+    def test_db_pool_stats(self, client, db, logged_in_admin):
+        response = client.get("/db_pool_stats")
+
+        assert response.status_code == 200
+        assert response.json["binds"]["default"]["checkouts"] > 0
+
+    def test_db_pool_stats_not_admin(self, client, db, logged_in_user):
+        response = client.get("/db_pool_stats")
+
+        assert response.status_code == 403
@@ -0,0 +1,156 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import aiosmtplib
+import pytest
+from aiosmtpd.controller import Controller
+from flask_mail import Message
+
+from app.app import create_app
+from app.config import TestConfig
+from app.extensions import mail
+from app.fernet import encrypt
+from app.tasks.async_mail import DomainRateLimiter, async_mail_transport
+from app.tasks.mail_tasks import deliver_mail_batch, send_email_verification_email
+from tests.tasks.test_smtp_pool import RecordingHandler, free_port
+
+
+class RefusingHandler(RecordingHandler):
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):  # noqa: N802
+        if address.startswith("busy"):
+            return "450 Mailbox busy"
+        if address.startswith("unknown"):
+            return "550 No such user"
+
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+
+class TestAsyncMailTransport:
+    @pytest.fixture
+    def handler(self):
+        return RefusingHandler()
+
+    @pytest.fixture
+    def smtp_server(self, handler):
+        controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+        controller.start()
+
+        yield controller
+
+        controller.stop()
+
+    @pytest.fixture
+    def smtp_app(self, smtp_server):
+        config = TestConfig()
+        config.MAIL_SERVER = smtp_server.hostname
+        config.MAIL_PORT = smtp_server.port
+        config.MAIL_USERNAME = None
+        config.MAIL_SUPPRESS_SEND = False
+        config.MAIL_TRANSPORT = "async"
+        config.MAIL_ASYNC_MAX_IN_FLIGHT = 4
+
+        _app = create_app(config_object=config)
+        with _app.app_context():
+            yield _app
+
+    def pairs(self, receivers):
+        return [
+            (
+                {"receiver": receiver},
+                Message(subject="Hello", recipients=[receiver], html="<p>Hi</p>"),
+            )
+            for receiver in receivers
+        ]
+
+    def test_delivers_concurrently(self, smtp_app, handler):
+        receivers = [f"user{i}@test.com" for i in range(10)]
+
+        assert async_mail_transport.deliver(self.pairs(receivers)) == []
+
+        assert sorted(m.rcpt_tos[0] for m in handler.messages) == sorted(receivers)
+        assert handler.sessions == 4
+
+    def test_classifies_failures(self, smtp_app, handler):
+        pairs = self.pairs(["ok@test.com", "busy@test.com", "unknown@test.com"])
+
+        assert async_mail_transport.deliver(pairs) == [{"receiver": "busy@test.com"}]
+        assert [m.rcpt_tos for m in handler.messages] == [["ok@test.com"]]
+
+    def test_connection_failure_is_retried(self, smtp_app):
+        smtp_app.extensions["mail"].port = free_port()
+        pairs = self.pairs(["a@test.com", "b@test.com"])
+
+        failed = async_mail_transport.deliver(pairs)
+        assert sorted(job["receiver"] for job in failed) == ["a@test.com", "b@test.com"]
+
+    def test_login_rejected_is_retried(self, smtp_app):
+        error = aiosmtplib.SMTPAuthenticationError(535, "Authentication failed")
+        pairs = self.pairs(["a@test.com", "b@test.com", "c@test.com"])
+
+        with patch.object(async_mail_transport, "_connect", side_effect=error):
+            failed = async_mail_transport.deliver(pairs)
+
+        assert sorted(job["receiver"] for job in failed) == [
+            "a@test.com",
+            "b@test.com",
+            "c@test.com",
+        ]
+
+    def test_rate_limits_across_batches(self, smtp_app, handler):
+        async_mail_transport.limiter = DomainRateLimiter(rate=10)
+
+        start = time.monotonic()
+        for receiver in ["a@test.com", "b@test.com"]:
+            assert async_mail_transport.deliver(self.pairs([receiver])) == []
+
+        assert time.monotonic() - start >= 0.1
+        assert len(handler.messages) == 2
+
+    def test_suppressed_still_dispatches(self, app):
+        with mail.record_messages() as outbox:
+            assert async_mail_transport.deliver(self.pairs(["a@test.com"])) == []
+
+        assert [m.recipients for m in outbox] == [["a@test.com"]]
+
+    def test_deliver_mail_batch_uses_async_transport(self, smtp_app, handler):
+        jobs = [
+            {
+                "task": send_email_verification_email.name,
+                "kwargs": {
+                    "receiver": f"{i}@test.com",
+                    "encrypted_verification_token": encrypt("x"),
+                },
+            }
+            for i in range(3)
+        ]
+
+        with patch("app.tasks.mail_tasks.smtp_pool") as pool:
+            assert deliver_mail_batch(jobs) == []
+
+        pool.acquire.assert_not_called()
+        assert len(handler.messages) == 3
+
+
+class TestDomainRateLimiter:
+    def test_spaces_out_same_domain(self):
+        limiter = DomainRateLimiter(rate=20)
+
+        async def run():
+            start = time.monotonic()
+            await asyncio.gather(*[limiter.wait("test.com") for _ in range(3)])
+            await limiter.wait("other.com")
+            return time.monotonic() - start
+
+        assert 0.1 <= asyncio.run(run()) < 0.2
+
+    def test_unlimited(self):
+        limiter = DomainRateLimiter(rate=0)
+
+        async def run():
+            await asyncio.gather(*[limiter.wait("test.com") for _ in range(100)])
+
+        start = time.monotonic()
+        asyncio.run(run())
+        assert time.monotonic() - start < 0.05
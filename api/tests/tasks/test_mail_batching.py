@@ -0,0 +1,166 @@
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+
+from app.db.outbox import OutboxMessage
+from app.tasks.mail_batching import (
+    FLUSH_LOCK_KEY,
+    PENDING_KEY,
+    PROCESSING_KEY,
+    flush_mail_batches,
+    mail_batcher,
+)
+from app.tasks.mail_tasks import (
+    send_email_verification_email,
+    send_forgot_password_email,
+)
+from app.tasks.outbox_tasks import relay_outbox
+from app.unit_of_work import unit_of_work
+
+
+def job(i):
+    return {
+        "task": send_email_verification_email.name,
+        "kwargs": {
+            "receiver": f"{i}@test.com",
+            "encrypted_verification_token": f"token{i}",
+        },
+    }
+
+
+class TestMailBatcher:
+    @pytest.fixture(autouse=True)
+    def batcher(self, app):
+        mail_batcher.enabled = True
+        mail_batcher.batch_size = 3
+        mail_batcher.redis = fakeredis.FakeRedis()
+
+        yield mail_batcher
+
+        mail_batcher.enabled = False
+        mail_batcher.redis = None
+
+    def test_schedules_flush_for_first_jobs(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches") as flush:
+            mail_batcher.add_many([job(0)])
+            mail_batcher.add_many([job(1)])
+
+        flush.apply_async.assert_called_once_with(countdown=0.5)
+        flush.delay.assert_not_called()
+        assert mail_batcher.redis.llen(PENDING_KEY) == 2
+
+    def test_flushes_full_batch(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches") as flush:
+            mail_batcher.add_many([job(0), job(1)])
+            mail_batcher.add_many([job(2)])
+
+        flush.delay.assert_called_once()
+
+    def test_pop_batch(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches"):
+            mail_batcher.add_many([job(i) for i in range(4)])
+
+        assert mail_batcher.pop_batch() == [job(0), job(1), job(2)]
+        assert mail_batcher.redis.llen(PROCESSING_KEY) == 3
+        mail_batcher.ack()
+        assert mail_batcher.pop_batch() == [job(3)]
+        mail_batcher.ack()
+        assert mail_batcher.pop_batch() == []
+        assert mail_batcher.redis.llen(PROCESSING_KEY) == 0
+
+    def test_flush_mail_batches(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches"):
+            mail_batcher.add_many([job(i) for i in range(4)])
+
+        with patch("app.tasks.mail_batching.send_mail_batch") as send_mail_batch:
+            flush_mail_batches()
+
+        assert [
+            call.kwargs["jobs"] for call in send_mail_batch.delay.call_args_list
+        ] == [
+            [job(0), job(1), job(2)],
+            [job(3)],
+        ]
+
+    def test_flush_requeues_batch_on_failure(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches"):
+            mail_batcher.add_many([job(i) for i in range(4)])
+
+        with (
+            patch("app.tasks.mail_batching.send_mail_batch") as send_mail_batch,
+            pytest.raises(ConnectionError),
+        ):
+            send_mail_batch.delay.side_effect = [None, ConnectionError]
+            flush_mail_batches()
+
+        assert mail_batcher.redis.llen(PROCESSING_KEY) == 0
+        assert mail_batcher.redis.exists(FLUSH_LOCK_KEY) == 0
+        assert mail_batcher.pop_batch() == [job(3)]
+
+    def test_flush_picks_up_unfinished_flush(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches"):
+            mail_batcher.add_many([job(i) for i in range(4)])
+        # A flush that was killed after taking a batch
+        mail_batcher.pop_batch()
+
+        with patch("app.tasks.mail_batching.send_mail_batch") as send_mail_batch:
+            flush_mail_batches()
+
+        assert [
+            call.kwargs["jobs"] for call in send_mail_batch.delay.call_args_list
+        ] == [
+            [job(0), job(1), job(2)],
+            [job(3)],
+        ]
+
+    def test_flush_runs_once_at_a_time(self):
+        with patch("app.tasks.mail_batching.flush_mail_batches"):
+            mail_batcher.add_many([job(0)])
+        mail_batcher.redis.set(FLUSH_LOCK_KEY, 1)
+
+        with patch("app.tasks.mail_batching.send_mail_batch") as send_mail_batch:
+            flush_mail_batches()
+
+        send_mail_batch.delay.assert_not_called()
+        assert mail_batcher.redis.llen(PENDING_KEY) == 1
+
+    def test_relay_outbox_batches_mails(self, app, db):
+        with unit_of_work() as uow:
+            uow.enqueue(
+                send_email_verification_email,
+                receiver="0@test.com",
+                encrypted_verification_token="token0",
+            )
+
+        celery_app = app.extensions["celery"]
+        with (
+            patch("app.tasks.mail_batching.flush_mail_batches"),
+            patch.object(celery_app, "send_task") as send_task,
+            patch.object(celery_app, "producer_or_acquire"),
+        ):
+            assert relay_outbox(batch_size=10) == 1
+
+        send_task.assert_not_called()
+        assert mail_batcher.pop_batch() == [job(0)]
+        assert OutboxMessage.query.count() == 0
+
+    def test_relay_outbox_publishes_transactional_mails(self, app, db):
+        with unit_of_work() as uow:
+            uow.enqueue(
+                send_forgot_password_email,
+                receiver="0@test.com",
+                encrypted_reset_token="token0",
+            )
+
+        celery_app = app.extensions["celery"]
+        with (
+            patch("app.tasks.mail_batching.flush_mail_batches"),
+            patch.object(celery_app, "send_task") as send_task,
+            patch.object(celery_app, "producer_or_acquire"),
+        ):
+            assert relay_outbox(batch_size=10) == 1
+
+        send_task.assert_called_once()
+        assert send_task.call_args.args == (send_forgot_password_email.name,)
+        assert mail_batcher.pop_batch() == []
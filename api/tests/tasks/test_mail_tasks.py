@@ -1,10 +1,19 @@
 import re
+import smtplib
+from unittest.mock import MagicMock, patch
+
+import pytest
+from celery.exceptions import Retry
 
 from app.extensions import mail
+from app.fernet import encrypt
 from app.tasks.mail_tasks import (
+    deliver_mail_batch,
     send_email_verification_email,
     send_forgot_password_email,
+    send_mail_batch,
 )
+from app.tasks.smtp_pool import smtp_pool
 
 
 class TestMailTasks:
@@ -13,7 +22,7 @@ class TestMailTasks:
 
         with mail.record_messages() as outbox:
             send_email_verification_email(
-                receiver=user.email, verification_token=user_token
+                receiver=user.email, encrypted_verification_token=encrypt(user_token)
             )
             assert len(outbox) == 1
             assert outbox[0].subject == "🛁 MySolidApp - Email verification"
@@ -27,7 +36,9 @@ class TestMailTasks:
         user_token = user.set_password_reset_token()
 
         with mail.record_messages() as outbox:
-            send_forgot_password_email(receiver=user.email, reset_token=user_token)
+            send_forgot_password_email(
+                receiver=user.email, encrypted_reset_token=encrypt(user_token)
+            )
             assert len(outbox) == 1
             assert outbox[0].subject == "🛁 MySolidApp - Password reset"
             assert outbox[0].recipients == [user.email]
@@ -35,3 +46,91 @@ class TestMailTasks:
             token = re.search(r"reset_token=([\w-]+)", outbox[0].html).group(1)
 
         assert user.check_password_reset_token(token)
+
+
+class TestSendMailBatch:
+    @pytest.fixture
+    def connection(self):
+        connection = MagicMock()
+        with (
+            patch.object(smtp_pool, "acquire", return_value=connection),
+            patch.object(smtp_pool, "release"),
+            patch.object(smtp_pool, "discard"),
+        ):
+            yield connection
+
+    def jobs(self, count):
+        return [
+            {
+                "task": send_email_verification_email.name,
+                "kwargs": {
+                    "receiver": f"{i}@test.com",
+                    "encrypted_verification_token": encrypt("x"),
+                },
+            }
+            for i in range(count)
+        ]
+
+    def test_deliver_batch_over_one_connection(self, app, connection):
+        jobs = self.jobs(3) + [{"task": "unknown", "kwargs": {}}]
+
+        assert deliver_mail_batch(jobs) == []
+
+        assert [call.args[0].recipients for call in connection.send.call_args_list] == [
+            ["0@test.com"],
+            ["1@test.com"],
+            ["2@test.com"],
+        ]
+        smtp_pool.acquire.assert_called_once()
+        smtp_pool.release.assert_called_once_with(connection)
+
+    def test_deliver_batch_failures(self, app, connection):
+        jobs = self.jobs(4)
+        connection.send.side_effect = [
+            None,
+            smtplib.SMTPRecipientsRefused({"1@test.com": (450, b"Mailbox busy")}),
+            smtplib.SMTPRecipientsRefused({"2@test.com": (550, b"No such user")}),
+            smtplib.SMTPServerDisconnected(),
+        ]
+
+        assert deliver_mail_batch(jobs) == [jobs[1], jobs[3]]
+        smtp_pool.discard.assert_called_once_with(connection)
+        smtp_pool.release.assert_not_called()
+
+    def test_deliver_batch_cannot_connect(self, app):
+        jobs = self.jobs(2)
+
+        with patch.object(smtp_pool, "acquire", side_effect=ConnectionRefusedError()):
+            assert deliver_mail_batch(jobs) == jobs
+
+    def test_deliver_batch_login_rejected(self, app):
+        jobs = self.jobs(2)
+        error = smtplib.SMTPAuthenticationError(535, b"Authentication failed")
+
+        with patch.object(smtp_pool, "acquire", side_effect=error):
+            assert deliver_mail_batch(jobs) == jobs
+
+    def test_send_mail_batch_retries_failed_subset(self, app, connection):
+        jobs = self.jobs(2)
+        connection.send.side_effect = [None, smtplib.SMTPServerDisconnected()]
+
+        with patch.object(send_mail_batch, "retry", side_effect=Retry()) as retry:
+            with pytest.raises(Retry):
+                send_mail_batch(jobs=jobs)
+
+        assert retry.call_args.kwargs["kwargs"] == {"jobs": [jobs[1]]}
+
+    def test_send_mail_batch_success(self, app, connection):
+        with patch.object(send_mail_batch, "retry") as retry:
+            send_mail_batch(jobs=self.jobs(2))
+
+        retry.assert_not_called()
+
+    def test_send_mail_batch_sends_real_messages(self, app):
+        with mail.record_messages() as outbox:
+            send_mail_batch(jobs=self.jobs(2))
+
+        assert [message.recipients for message in outbox] == [
+            ["0@test.com"],
+            ["1@test.com"],
+        ]
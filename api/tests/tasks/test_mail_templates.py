@@ -0,0 +1,77 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.tasks.mail_templates import MailTemplates, mail_templates
+
+
+class TestMailTemplates:
+    @pytest.fixture
+    def template_dir(self, tmp_path):
+        (tmp_path / "hello.html").write_text("<p>Hello $name</p>")
+        (tmp_path / "goodbye.html.jinja").write_text(
+            "{% for name in names %}<p>Bye {{ name }}</p>{% endfor %}"
+        )
+        (tmp_path / "notes.txt").write_text("Not a template")
+
+        return tmp_path
+
+    @pytest.fixture
+    def templates(self, app, template_dir):
+        app.config["MAIL_TEMPLATE_DIR"] = str(template_dir)
+
+        _templates = MailTemplates()
+        _templates.init_app(app)
+
+        return _templates
+
+    def test_loads_package_templates(self, app):
+        assert Path(app.config["MAIL_TEMPLATE_DIR"]).is_absolute()
+        assert set(mail_templates._templates) == {"forgot_password", "verify_email"}
+
+    def test_render_string_template(self, templates):
+        assert templates.render("hello", name="Ciri") == "<p>Hello Ciri</p>"
+
+    def test_render_jinja_template(self, templates):
+        assert (
+            templates.render("goodbye", names=["Ciri", "<b>Geralt</b>"])
+            == "<p>Bye Ciri</p><p>Bye &lt;b&gt;Geralt&lt;/b&gt;</p>"
+        )
+
+    def test_ignores_other_files(self, templates):
+        assert "notes" not in templates._templates
+
+    def test_render_does_no_file_io(self, templates):
+        with (
+            patch.object(Path, "read_text") as read_text,
+            patch.object(Path, "stat") as stat,
+        ):
+            templates.render("hello", name="Ciri")
+
+        read_text.assert_not_called()
+        stat.assert_not_called()
+
+    def test_auto_reload(self, templates, template_dir):
+        templates.auto_reload = True
+
+        path = template_dir / "hello.html"
+        path.write_text("<p>Hi $name</p>")
+        os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+
+        assert templates.render("hello", name="Ciri") == "<p>Hi Ciri</p>"
+
+    def test_no_reload_without_auto_reload(self, templates, template_dir):
+        (template_dir / "hello.html").write_text("<p>Hi $name</p>")
+
+        assert templates.render("hello", name="Ciri") == "<p>Hello Ciri</p>"
+
+    def test_bytecode_cache(self, app, template_dir, tmp_path_factory):
+        cache_dir = tmp_path_factory.mktemp("bytecode_cache")
+        app.config["MAIL_TEMPLATE_DIR"] = str(template_dir)
+        app.config["MAIL_TEMPLATE_BYTECODE_CACHE_DIR"] = str(cache_dir)
+
+        MailTemplates().init_app(app)
+
+        assert any(cache_dir.iterdir())
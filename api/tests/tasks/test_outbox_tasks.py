@@ -0,0 +1,72 @@
+from unittest.mock import ANY, call, patch
+
+from app.db.outbox import OutboxMessage
+from app.tasks.mail_tasks import send_forgot_password_email
+from app.tasks.outbox_tasks import relay_outbox, relay_outbox_task
+from app.unit_of_work import unit_of_work
+
+
+class TestRelayOutbox:
+    def enqueue(self, count):
+        with unit_of_work() as uow:
+            for i in range(count):
+                uow.enqueue(
+                    send_forgot_password_email,
+                    receiver=f"{i}@test.com",
+                    encrypted_reset_token=f"token{i}",
+                )
+
+    def test_relay_outbox(self, app, db):
+        self.enqueue(5)
+        celery_app = app.extensions["celery"]
+
+        with (
+            patch.object(celery_app, "send_task") as send_task,
+            patch.object(celery_app, "producer_or_acquire") as producer_or_acquire,
+        ):
+            assert relay_outbox(batch_size=2) == 5
+
+        # Three batches, all published over a single producer each
+        assert producer_or_acquire.call_count == 3
+        assert send_task.call_args_list == [
+            call(
+                send_forgot_password_email.name,
+                kwargs={
+                    "receiver": f"{i}@test.com",
+                    "encrypted_reset_token": f"token{i}",
+                },
+                producer=ANY,
+            )
+            for i in range(5)
+        ]
+        assert OutboxMessage.query.count() == 0
+
+    def test_relay_empty_outbox(self, app, db):
+        with patch.object(app.extensions["celery"], "send_task") as send_task:
+            assert relay_outbox(batch_size=2) == 0
+
+        send_task.assert_not_called()
+
+    def test_relay_outbox_task(self, app, db):
+        self.enqueue(1)
+
+        with (
+            patch.object(app.extensions["celery"], "send_task") as send_task,
+            patch.object(app.extensions["celery"], "producer_or_acquire"),
+        ):
+            relay_outbox_task()
+
+        send_task.assert_called_once()
+        assert OutboxMessage.query.count() == 0
+
+    def test_relay_outbox_command(self, app, db):
+        self.enqueue(2)
+
+        with (
+            patch.object(app.extensions["celery"], "send_task"),
+            patch.object(app.extensions["celery"], "producer_or_acquire"),
+        ):
+            result = app.test_cli_runner().invoke(args=["relay-outbox"])
+
+        assert "Published 2 outbox messages." in result.output
+        assert OutboxMessage.query.count() == 0
@@ -0,0 +1,47 @@
+import pytest
+
+from app.app import create_app
+from app.config import TestConfig
+from app.tasks.mail_batching import flush_mail_batches
+from app.tasks.mail_tasks import (
+    send_email_verification_email,
+    send_forgot_password_email,
+    send_mail_batch,
+)
+
+
+def route(app, task) -> dict:
+    return app.extensions["celery"].amqp.router.route({}, task.name)
+
+
+class TestRouting:
+    def test_routes_tasks_to_queues(self, app):
+        assert route(app, send_forgot_password_email)["queue"].name == "transactional"
+        assert route(app, send_email_verification_email)["queue"].name == "bulk"
+        assert route(app, send_mail_batch)["queue"].name == "bulk"
+        assert route(app, flush_mail_batches)["queue"].name == "default"
+
+    def test_password_reset_has_highest_priority(self, app):
+        assert route(app, send_forgot_password_email)["priority"] == 0
+
+    def test_consumes_all_queues_by_default(self, app):
+        queues = app.extensions["celery"].conf.task_queues
+
+        assert {queue.name for queue in queues} == {"transactional", "bulk", "default"}
+
+    @pytest.mark.parametrize(
+        "preset, queues, prefetch, acks_late",
+        [
+            ("transactional", {"transactional", "default"}, 1, True),
+            ("bulk", {"bulk"}, 4, False),
+        ],
+    )
+    def test_worker_presets(self, preset, queues, prefetch, acks_late):
+        config = TestConfig()
+        config.CELERY_WORKER_PRESET = preset
+
+        conf = create_app(config_object=config).extensions["celery"].conf
+
+        assert {queue.name for queue in conf.task_queues} == queues
+        assert conf.worker_prefetch_multiplier == prefetch
+        assert conf.task_acks_late is acks_late
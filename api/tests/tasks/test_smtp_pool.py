@@ -0,0 +1,152 @@
+import smtplib
+import socket
+from unittest.mock import MagicMock, patch
+
+import pytest
+from aiosmtpd.controller import Controller
+from flask_mail import Message
+
+from app.app import create_app
+from app.config import TestConfig
+from app.tasks.smtp_pool import smtp_pool
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):  # noqa: N802
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):  # noqa: N802
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestSMTPConnectionPool:
+    @pytest.fixture
+    def handler(self):
+        return RecordingHandler()
+
+    @pytest.fixture
+    def smtp_server(self, handler):
+        controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+        controller.start()
+
+        yield controller
+
+        controller.stop()
+
+    @pytest.fixture
+    def smtp_app(self, smtp_server):
+        config = TestConfig()
+        config.MAIL_SERVER = smtp_server.hostname
+        config.MAIL_PORT = smtp_server.port
+        config.MAIL_USERNAME = None
+        config.MAIL_SUPPRESS_SEND = False
+        config.SMTP_POOL_BACKOFF_SECONDS = 0
+
+        _app = create_app(config_object=config)
+        with _app.app_context():
+            yield _app
+
+        smtp_pool.close_all()
+
+    def message(self, receiver="user@test.com"):
+        return Message(subject="Hello", recipients=[receiver], html="<p>Hello</p>")
+
+    def test_reuses_connection(self, smtp_app, handler):
+        for i in range(3):
+            smtp_pool.send(self.message(f"user{i}@test.com"))
+
+        assert [message.rcpt_tos for message in handler.messages] == [
+            ["user0@test.com"],
+            ["user1@test.com"],
+            ["user2@test.com"],
+        ]
+        assert handler.sessions == 1
+
+    def test_reconnects_after_server_disconnect(self, smtp_app, handler):
+        smtp_pool.send(self.message())
+
+        # Kill the pooled socket, as a server closing an idle connection would.
+        connection, _ = smtp_pool._idle[0]
+        connection.host.sock.shutdown(socket.SHUT_RDWR)
+
+        smtp_pool.send(self.message())
+
+        assert len(handler.messages) == 2
+        assert handler.sessions == 2
+
+    def test_pings_idle_connection(self, smtp_app, handler):
+        smtp_pool.send(self.message())
+        smtp_pool.ping_after_seconds = 0
+
+        connection, _ = smtp_pool._idle[0]
+        with patch.object(connection.host, "noop", wraps=connection.host.noop) as noop:
+            smtp_pool.send(self.message())
+
+        noop.assert_called_once()
+        assert handler.sessions == 1
+
+    def test_drops_stale_connection(self, smtp_app, handler):
+        smtp_pool.send(self.message())
+        smtp_pool.max_idle_seconds = -1
+
+        smtp_pool.send(self.message())
+
+        assert handler.sessions == 2
+
+    def test_max_size(self, smtp_app):
+        smtp_pool.max_size = 1
+        connections = [smtp_pool.acquire(), smtp_pool.acquire()]
+
+        for connection in connections:
+            smtp_pool.release(connection)
+
+        assert len(smtp_pool._idle) == 1
+
+    def test_retries_failed_connect(self, smtp_app, handler):
+        connect = smtp_pool._connect
+        with patch.object(
+            smtp_pool, "_connect", side_effect=[ConnectionRefusedError(), connect()]
+        ) as failing_connect:
+            smtp_pool.send(self.message())
+
+        assert failing_connect.call_count == 2
+        assert len(handler.messages) == 1
+
+    def test_gives_up_after_retries(self, smtp_app):
+        smtp_pool.max_retries = 2
+        broken = MagicMock()
+        broken.send.side_effect = smtplib.SMTPServerDisconnected()
+
+        with (
+            patch.object(smtp_pool, "_connect", return_value=broken) as connect,
+            pytest.raises(smtplib.SMTPServerDisconnected),
+        ):
+            smtp_pool.send(self.message())
+
+        assert connect.call_count == 3
+
+    def test_does_not_retry_rejected_message(self, smtp_app):
+        broken = MagicMock()
+        broken.send.side_effect = smtplib.SMTPRecipientsRefused({})
+
+        with (
+            patch.object(smtp_pool, "_connect", return_value=broken) as connect,
+            pytest.raises(smtplib.SMTPRecipientsRefused),
+        ):
+            smtp_pool.send(self.message())
+
+        connect.assert_called_once()
+        assert len(smtp_pool._idle) == 0
@@ -0,0 +1,126 @@
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from prometheus_client import REGISTRY, start_http_server
+
+from app.commands import task_stats_command
+from app.tasks.task_metrics import _enqueued_at, task_metrics, task_summary
+
+
+def sample(metric: str, **labels) -> float:
+    return REGISTRY.get_sample_value(metric, labels) or 0.0
+
+
+@pytest.fixture
+def tasks(app):
+    celery_app = app.extensions["celery"]
+
+    @celery_app.task(name="test.succeed")
+    def succeed():
+        return True
+
+    @celery_app.task(name="test.fail")
+    def fail():
+        raise ValueError("boom")
+
+    @celery_app.task(name="test.retry", bind=True, max_retries=1)
+    def retry(self):
+        if self.request.retries == 0:
+            raise self.retry(countdown=0)
+
+    return SimpleNamespace(succeed=succeed, fail=fail, retry=retry)
+
+
+@pytest.fixture
+def metrics_url():
+    server, thread = start_http_server(0, addr="127.0.0.1")
+    yield f"http://127.0.0.1:{server.server_port}/metrics"
+    server.shutdown()
+    thread.join()
+
+
+class TestTaskMetrics:
+    def test_sets_enqueued_at_header(self):
+        headers = {}
+
+        task_metrics.on_publish(headers=headers)
+
+        assert headers["enqueued_at"] == pytest.approx(time.time(), abs=1)
+
+    def test_records_latency_runtime_and_outcome(self, tasks):
+        before = sample("celery_task_queue_latency_seconds_sum", task="test.succeed")
+        runs = sample("celery_task_outcomes_total", task="test.succeed", state="SUCCESS")
+
+        tasks.succeed.apply(headers={"enqueued_at": time.time() - 2})
+
+        latency = sample("celery_task_queue_latency_seconds_sum", task="test.succeed")
+        assert latency - before == pytest.approx(2, abs=0.5)
+        assert sample("celery_task_runtime_seconds_count", task="test.succeed") > 0
+        assert (
+            sample("celery_task_outcomes_total", task="test.succeed", state="SUCCESS")
+            == runs + 1
+        )
+
+    def test_records_failures(self, tasks):
+        labels = {"task": "test.fail", "exception": "ValueError"}
+        before = sample("celery_task_failures_total", **labels)
+
+        tasks.fail.apply()
+
+        assert sample("celery_task_failures_total", **labels) == before + 1
+
+    def test_records_retries(self, tasks):
+        before = sample("celery_task_retries_total", task="test.retry")
+
+        tasks.retry.apply()
+
+        assert sample("celery_task_retries_total", task="test.retry") == before + 1
+
+    def test_latency_starts_at_eta(self):
+        now = datetime.now(timezone.utc)
+        request = SimpleNamespace(
+            enqueued_at=(now - timedelta(minutes=5)).timestamp(),
+            eta=(now - timedelta(seconds=1)).isoformat(),
+            headers=None,
+        )
+
+        assert _enqueued_at(request) == pytest.approx(
+            (now - timedelta(seconds=1)).timestamp()
+        )
+
+
+class TestTaskSummary:
+    def test_summarizes_per_task(self, tasks, metrics_url):
+        tasks.succeed.apply(headers={"enqueued_at": time.time()})
+        tasks.fail.apply()
+
+        summary = {stats["task"]: stats for stats in task_summary([metrics_url])}
+
+        assert summary["test.succeed"]["runs"] >= 1
+        assert summary["test.succeed"]["mean_runtime"] >= 0
+        assert summary["test.fail"]["failures"] >= 1
+
+    def test_sums_up_workers(self, tasks, metrics_url):
+        tasks.succeed.apply()
+
+        (single,) = [
+            s for s in task_summary([metrics_url]) if s["task"] == "test.succeed"
+        ]
+        (summed,) = [
+            s
+            for s in task_summary([metrics_url, metrics_url])
+            if s["task"] == "test.succeed"
+        ]
+
+        assert summed["runs"] == 2 * single["runs"]
+        assert summed["mean_runtime"] == pytest.approx(single["mean_runtime"])
+
+    def test_command(self, app, tasks, metrics_url):
+        tasks.succeed.apply()
+
+        result = app.test_cli_runner().invoke(task_stats_command, ["--url", metrics_url])
+
+        assert result.exit_code == 0
+        assert "test.succeed" in result.output
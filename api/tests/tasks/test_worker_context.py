@@ -0,0 +1,71 @@
+import pytest
+from flask import g
+from flask.globals import _cv_app
+
+from app.app import create_app
+from app.config import TestConfig
+from app.db.user import User
+from app.extensions import db as _db
+from app.tasks.worker_context import worker_app_context
+
+
+@pytest.fixture(autouse=True)
+def reset_worker_context(app):
+    yield
+    worker_app_context.pop()
+    worker_app_context.init_app(app)
+
+
+@pytest.fixture
+def worker_context(app, db):
+    worker_app_context.push()
+    return worker_app_context._context
+
+
+@pytest.fixture
+def task(app):
+    @app.extensions["celery"].task(name="test.context")
+    def context_task(nested=False):
+        g.calls = g.get("calls", 0) + 1
+        user = User(email="user@test.com", hashed_password="x")
+        _db.session.add(user)
+        return _cv_app.get(), g.calls, context_task() if nested else None
+
+    return context_task
+
+
+class TestWorkerAppContext:
+    def test_runs_tasks_in_persistent_context(self, worker_context, task):
+        context, calls, _ = task()
+
+        assert context is worker_context
+        assert calls == 1
+
+    def test_resets_scope_after_every_task(self, worker_context, task, db):
+        task()
+        _, calls, _ = task()
+
+        assert calls == 1
+        assert not db.session.new
+        assert db.session.scalars(db.select(User)).all() == []
+
+    def test_nested_task_gets_own_context(self, worker_context, task):
+        context, _, (nested_context, _, _) = task(nested=True)
+
+        assert context is worker_context
+        assert nested_context is not worker_context
+
+    def test_disabled(self, db, task, monkeypatch):
+        monkeypatch.setattr(worker_app_context, "enabled", False)
+
+        worker_app_context.push()
+        context, _, _ = task()
+
+        assert worker_app_context._context is None
+        assert context is not _cv_app.get()
+
+    def test_init_app_pops_previous_context(self, worker_context):
+        worker_app_context.init_app(create_app(config_object=TestConfig()))
+
+        assert worker_app_context._context is None
+        assert _cv_app.get() is not worker_context
@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+from app.access_log import DroppingQueueHandler, JSONFormatter, access_logger
+from app.app import create_app
+from app.config import TestConfig
+from app.extensions import db
+
+
+@pytest.fixture
+def json_app(tmp_path, monkeypatch):
+    """An application logging JSON to `api.log` in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    config = TestConfig()
+    config.FILE_LOGGING = True
+    config.LOG_FORMAT = "json"
+
+    _app = create_app(config_object=config)
+    with _app.app_context():
+        db.create_all()
+        with _app.test_request_context():
+            yield _app
+
+    access_logger.stop()
+
+
+def read_log(tmp_path) -> list[dict]:
+    access_logger.stop()
+    with open(tmp_path / "api.log") as f:
+        return [json.loads(line) for line in f]
+
+
+def make_record(message: str = "message") -> logging.LogRecord:
+    return logging.makeLogRecord(
+        {"name": "test", "msg": message, "levelno": logging.INFO}
+    )
+
+
+class TestAccessLog:
+    def test_writes_json_from_listener(self, json_app, tmp_path):
+        response = json_app.test_client().get("/whoami")
+
+        assert response.status_code == 401
+        (entry,) = [e for e in read_log(tmp_path) if e.get("path") == "/whoami"]
+        assert entry["level"] == "INFO"
+        assert entry["method"] == "GET"
+        assert entry["status"] == 401
+        assert entry["queries"] == 0
+        assert entry["message"].startswith("GET /whoami [401 UNAUTHORIZED]")
+
+    def test_samples_successful_requests(self, client, admin, caplog):
+        access_logger.sample_rate = 0.0
+
+        try:
+            client.post(
+                "/login", json={"email": "admin@test.com", "password": "password321"}
+            )
+            client.post("/login", json={"email": "admin@test.com", "password": "x"})
+        finally:
+            access_logger.sample_rate = 1.0
+
+        assert "POST /login [200 OK]" not in caplog.text
+        assert "POST /login [401 UNAUTHORIZED]" in caplog.text
+        assert access_logger.sampled_out == 1
+
+    def test_json_formatter_includes_exception(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.makeLogRecord({"msg": "failed", "exc_info": sys.exc_info()})
+
+        entry = json.loads(JSONFormatter().format(record))
+
+        assert entry["message"] == "failed"
+        assert "ValueError: boom" in entry["exception"]
+
+
+class TestDroppingQueueHandler:
+    def test_drops_when_full(self):
+        handler = DroppingQueueHandler(1, [])
+
+        for _ in range(3):
+            handler.enqueue(make_record())
+
+        assert handler.dropped == 2
+        assert handler.queue.qsize() == 1
+
+    def test_reports_dropped_records(self):
+        handler = DroppingQueueHandler(3, [])
+        handler.queue.put_nowait(make_record("first"))
+        handler.queue.put_nowait(make_record("second"))
+        handler.queue.put_nowait(make_record("third"))
+        handler.enqueue(make_record("dropped"))
+
+        handler.queue.get_nowait()
+        handler.queue.get_nowait()
+        handler.enqueue(make_record("fourth"))
+
+        records = [handler.queue.get_nowait() for _ in range(3)]
+        assert [record.getMessage() for record in records] == [
+            "third",
+            "Dropped 1 log records because the log queue was full",
+            "fourth",
+        ]
+        assert handler.dropped == 1
+
+    @pytest.mark.filterwarnings("ignore:This process .* is multi-threaded")
+    def test_writes_records_of_forked_process(self):
+        target = RecordingHandler()
+        handler = DroppingQueueHandler(10, [target])
+        handler.emit(make_record("parent"))
+
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover, runs in the child
+            handler.emit(make_record("child"))
+            handler.stop()
+            os.write(write_end, ",".join(target.messages).encode())
+            os._exit(0)
+
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        with os.fdopen(read_end) as f:
+            child_messages = f.read().split(",")
+        handler.stop()
+
+        assert child_messages[-1] == "child"
+        assert target.messages == ["parent"]
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
@@ -0,0 +1,166 @@
+import json
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+from sqlalchemy.orm import object_session
+
+from app.cache import LRUCache, user_cache
+from app.db.user import User
+
+
+class TestLRUCache:
+    def test_get_set(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set(1, "a")
+
+        assert cache.get(1) == "a"
+        assert cache.get(2) is None
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.get(1)
+        cache.set(3, "c")
+
+        assert cache.get(1) == "a"
+        assert cache.get(2) is None
+        assert cache.get(3) == "c"
+
+    @patch("app.cache.time")
+    def test_expires(self, time_mock):
+        time_mock.monotonic.return_value = 100
+        cache = LRUCache(max_size=2, ttl=5)
+        cache.set(1, "a")
+
+        time_mock.monotonic.return_value = 104
+        assert cache.get(1) == "a"
+
+        time_mock.monotonic.return_value = 106
+        assert cache.get(1) is None
+        assert len(cache) == 0
+
+
+class TestUserCache:
+    @pytest.fixture
+    def cached_user_id(self, db, user):
+        user_id = user.id
+        db.session.expunge_all()
+        user_cache.reset_stats()
+
+        return user_id
+
+    def test_load_user_miss_then_hit(self, db, cached_user_id):
+        user = user_cache.load_user(str(cached_user_id))
+        assert user.email == "user@test.com"
+        assert user_cache.misses == 1
+
+        db.session.expunge_all()
+
+        with patch.object(db.session, "get") as get_mock:
+            cached = user_cache.load_user(str(cached_user_id))
+            get_mock.assert_not_called()
+
+        assert user_cache.hits["local"] == 1
+        assert cached.id == cached_user_id
+        assert cached.email == "user@test.com"
+        assert cached.is_correct_password("password123")
+        assert object_session(cached) is db.session()
+
+    def test_credentials_not_cached(self, db, cached_user_id):
+        user_cache.redis = fakeredis.FakeRedis()
+        try:
+            user_cache.load_user(cached_user_id)
+            cached = json.loads(user_cache.redis.get(f"user_cache:{cached_user_id}"))
+        finally:
+            user_cache.redis = None
+
+        assert "hashed_password" not in cached
+        assert "hashed_password" not in user_cache.local.get(cached_user_id)
+
+    def test_load_user_from_identity_map(self, db, user):
+        user_cache.reset_stats()
+
+        assert user_cache.load_user(str(user.id)) is user
+        assert user_cache.stats()["misses"] == 0
+
+    def test_load_user_unknown(self, db):
+        assert user_cache.load_user("1234") is None
+
+    def test_cached_user_can_be_updated(self, db, cached_user_id):
+        user_cache.load_user(cached_user_id)
+        db.session.expunge_all()
+
+        user = user_cache.load_user(cached_user_id)
+        user.is_admin = True
+        db.session.commit()
+
+        db.session.expunge_all()
+        assert db.session.get(User, cached_user_id).is_admin
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            lambda user: user.set_password("New_password1"),
+            lambda user: setattr(user, "two_factor_enabled", True),
+            lambda user: setattr(user, "is_admin", True),
+        ],
+    )
+    def test_invalidated_on_update(self, db, cached_user_id, change):
+        user = user_cache.load_user(cached_user_id)
+        assert user_cache.local.get(cached_user_id) is not None
+
+        change(user)
+        db.session.commit()
+
+        assert user_cache.local.get(cached_user_id) is None
+
+    def test_invalidated_on_delete(self, db, cached_user_id):
+        user = user_cache.load_user(cached_user_id)
+
+        db.session.delete(user)
+        db.session.commit()
+        db.session.expunge_all()
+
+        assert user_cache.local.get(cached_user_id) is None
+        assert user_cache.load_user(cached_user_id) is None
+
+    def test_load_user_from_redis(self, db, cached_user_id):
+        user_cache.redis = fakeredis.FakeRedis()
+        try:
+            user_cache.load_user(cached_user_id)
+            db.session.expunge_all()
+            user_cache.local.clear()
+
+            user = user_cache.load_user(cached_user_id)
+            assert user_cache.hits["redis"] == 1
+            assert user.email == "user@test.com"
+
+            user.is_admin = True
+            db.session.commit()
+            assert user_cache.redis.get(f"user_cache:{cached_user_id}") is None
+        finally:
+            user_cache.redis = None
+
+    def test_disabled(self, app, db, cached_user_id):
+        user_cache.enabled = False
+        try:
+            user_cache.load_user(cached_user_id)
+        finally:
+            user_cache.enabled = True
+
+        assert user_cache.local.get(cached_user_id) is None
+        assert user_cache.stats()["misses"] == 0
+
+
+class TestUserCacheStatsAPI:
+    def test_stats(self, client, db, logged_in_admin):
+        response = client.get("/user_cache_stats")
+
+        assert response.status_code == 200
+        assert set(response.json) == {"hits", "misses", "hit_ratio", "local_size"}
+
+    def test_stats_not_admin(self, client, db, logged_in_user):
+        response = client.get("/user_cache_stats")
+        assert response.status_code == 403
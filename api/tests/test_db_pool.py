@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+
+from app.app import create_app
+from app.config import TestConfig
+from app.db_pool import pool_monitor
+from app.extensions import db
+
+
+@pytest.fixture
+def pooled_app(request, tmp_path):
+    """An application with a real connection pool against a SQLite file."""
+    config = TestConfig()
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'pool.db'}"
+    config.SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": 1,
+        "max_overflow": 0,
+        "pool_pre_ping": getattr(request, "param", True),
+    }
+
+    _app = create_app(config_object=config)
+    with _app.app_context():
+        yield _app
+
+        db.session.remove()
+        db.engine.dispose()
+
+
+def use_and_drop_connection():
+    """
+    Uses a connection and closes it behind SQLAlchemy's back after it went back to
+    the pool, like a server closing idle connections.
+    """
+    dbapi_connection = db.session.connection().connection.dbapi_connection
+    db.session.execute(text("SELECT 1"))
+    db.session.remove()
+    dbapi_connection.close()
+
+
+class TestPoolMonitor:
+    def test_stats(self, pooled_app):
+        db.session.execute(text("SELECT 1"))
+
+        stats = pool_monitor.stats()["binds"]["default"]
+        assert stats["pool"] == "QueuePool"
+        assert stats["size"] == 1
+        assert stats["checked_out"] == 1
+        assert stats["connects"] == 1
+
+        db.session.remove()
+        assert pool_monitor.stats()["binds"]["default"]["checked_in"] == 1
+
+    def test_recovers_from_dropped_connection(self, pooled_app):
+        use_and_drop_connection()
+
+        assert db.session.execute(text("SELECT 1")).scalar() == 1
+        stats = pool_monitor.stats()["binds"]["default"]
+        assert stats["invalidations"] == 1
+        assert stats["connects"] == 2
+
+    @pytest.mark.parametrize("pooled_app", [False], indirect=True)
+    def test_dropped_connection_without_pre_ping(self, pooled_app):
+        use_and_drop_connection()
+
+        with pytest.raises(ProgrammingError, match="closed database"):
+            db.session.execute(text("SELECT 1"))
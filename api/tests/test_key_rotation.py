@@ -0,0 +1,105 @@
+from unittest.mock import patch
+
+import pytest
+from cryptography.fernet import Fernet, MultiFernet
+
+from app import fernet as fernet_module
+from app.db.user import User
+from app.key_rotation import rotate_totp_secrets
+
+OLD_KEY = Fernet.generate_key()
+NEW_KEY = Fernet.generate_key()
+
+
+@pytest.fixture
+def old_key_ring():
+    with (
+        patch.object(fernet_module, "primary", Fernet(OLD_KEY)),
+        patch.object(fernet_module, "fernet", MultiFernet([Fernet(OLD_KEY)])),
+    ):
+        yield
+
+
+@pytest.fixture
+def new_key_ring():
+    with (
+        patch.object(fernet_module, "primary", Fernet(NEW_KEY)),
+        patch.object(
+            fernet_module, "fernet", MultiFernet([Fernet(NEW_KEY), Fernet(OLD_KEY)])
+        ),
+    ):
+        yield
+
+
+@pytest.fixture
+def users(db, old_key_ring):
+    _users = [User(email=f"user{i}@test.com", hashed_password="x") for i in range(5)]
+    for i, user in enumerate(_users[:4]):
+        user.totp_secret = f"SECRET{i}"
+
+    db.session.add_all(_users)
+    db.session.commit()
+    return _users
+
+
+class TestFernet:
+    def test_rotate(self, new_key_ring):
+        encrypted = Fernet(OLD_KEY).encrypt(b"secret").decode()
+
+        rotated = fernet_module.rotate(encrypted)
+
+        assert Fernet(NEW_KEY).decrypt(rotated.encode()) == b"secret"
+        assert fernet_module.rotate(rotated) is None
+        assert fernet_module.decrypt(encrypted) == "secret"
+
+
+class TestRotateTOTPSecrets:
+    def test_rotates_all_secrets(self, db, users, new_key_ring):
+        batches = []
+
+        stats = rotate_totp_secrets(batch_size=3, on_batch=batches.append)
+
+        assert (stats.scanned, stats.rotated, stats.conflicts, stats.failed) == (
+            4,
+            4,
+            0,
+            0,
+        )
+        assert len(batches) == 2
+
+        db.session.expire_all()
+        for i, user in enumerate(users[:4]):
+            token = user.encrypted_totp_secret.encode()
+            assert Fernet(NEW_KEY).decrypt(token) == f"SECRET{i}".encode()
+        assert users[4].encrypted_totp_secret is None
+
+    def test_rerun_skips_rotated_secrets(self, db, users, new_key_ring):
+        rotate_totp_secrets(batch_size=10)
+
+        stats = rotate_totp_secrets(batch_size=10)
+
+        assert (stats.scanned, stats.rotated) == (4, 0)
+
+    def test_undecryptable_secret(self, db, users, new_key_ring):
+        users[0].encrypted_totp_secret = "garbage"
+        db.session.commit()
+
+        stats = rotate_totp_secrets(batch_size=10)
+
+        assert (stats.rotated, stats.failed) == (3, 1)
+
+    def test_secret_changed_concurrently(self, db, users, new_key_ring):
+        def change_secret(value):
+            db.session.execute(
+                User.__table__.update()
+                .where(User.id == users[0].id)
+                .values(encrypted_totp_secret=fernet_module.encrypt("CHANGED"))
+            )
+            return fernet_module.fernet.rotate(value.encode()).decode()
+
+        with patch("app.key_rotation.rotate", side_effect=change_secret):
+            stats = rotate_totp_secrets(batch_size=1)
+
+        assert (stats.rotated, stats.conflicts) == (3, 1)
+        db.session.expire_all()
+        assert users[0].totp_secret == "CHANGED"
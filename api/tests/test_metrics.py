@@ -0,0 +1,124 @@
+import os
+import subprocess
+import sys
+
+from prometheus_client import REGISTRY
+
+from app.errors import APIErrorEnum
+from app.metrics import metrics
+from multiprocess_metrics import reset_multiprocess_dir
+from tests.tasks.test_smtp_pool import free_port
+
+
+def sample(metric: str, **labels) -> float:
+    return REGISTRY.get_sample_value(metric, labels) or 0.0
+
+
+class TestMetrics:
+    def test_records_requests(self, client, admin):
+        labels = {"method": "POST", "endpoint": "/login"}
+        before = sample("http_request_duration_seconds_count", **labels)
+        before_ok = sample("http_requests_total", status="200", **labels)
+
+        client.post(
+            "/login", json={"email": "admin@test.com", "password": "password321"}
+        )
+
+        assert sample("http_request_duration_seconds_count", **labels) == before + 1
+        assert sample("http_requests_total", status="200", **labels) == before_ok + 1
+        assert sample("http_requests_in_progress") == 0
+
+    def test_labels_with_url_rule(self, client, logged_in_admin):
+        labels = {"method": "DELETE", "endpoint": "/user/<int:id>"}
+        before = sample("http_requests_total", status="404", **labels)
+
+        client.delete("/user/12345")
+
+        assert sample("http_requests_total", status="404", **labels) == before + 1
+
+    def test_counts_api_errors(self, client, admin):
+        code = APIErrorEnum.wrong_email_password
+        labels = {"code": str(code.value), "name": code.name}
+        before = sample("api_errors_total", **labels)
+
+        client.post("/login", json={"email": "admin@test.com", "password": "wrong"})
+
+        assert sample("api_errors_total", **labels) == before + 1
+
+    def test_records_celery_publish_time(self, app):
+        labels = {"task": "some.task"}
+        before = sample("celery_publish_duration_seconds_count", **labels)
+
+        metrics.before_publish(headers={"id": "abc"})
+        metrics.after_publish(sender="some.task", headers={"id": "abc"})
+
+        assert sample("celery_publish_duration_seconds_count", **labels) == before + 1
+
+    def test_forgets_failed_publishes(self, app, monkeypatch):
+        monkeypatch.setattr("app.metrics.MAX_PENDING_PUBLISHES", 2)
+
+        for task_id in ["a", "b", "c"]:
+            metrics.before_publish(headers={"id": task_id})
+
+        assert list(metrics._publish_started) == ["b", "c"]
+        metrics.after_publish(sender="some.task", headers={"id": "b"})
+        metrics.after_publish(sender="some.task", headers={"id": "c"})
+
+
+SCRIPT = """
+from app.app import create_app
+from app.config import TestConfig
+
+client = create_app(config_object=TestConfig()).test_client()
+client.get("/whoami")
+"""
+
+SERVE_SCRIPT = """
+import runpy, sys, time, urllib.request
+from unittest.mock import MagicMock
+
+runpy.run_path("gunicorn.conf.py")["when_ready"](MagicMock())
+for _ in range(50):
+    try:
+        with urllib.request.urlopen("http://127.0.0.1:%s/metrics") as response:
+            print(response.read().decode())
+            break
+    except OSError:
+        time.sleep(0.1)
+"""
+
+
+def test_gunicorn_serves_metrics_of_workers(tmp_path):
+    port = free_port()
+    env = {
+        **os.environ,
+        "PROMETHEUS_MULTIPROC_DIR": str(tmp_path),
+        "MY_SOLID_APP_METRICS_PORT": str(port),
+    }
+
+    def run(script):
+        return subprocess.run(
+            [sys.executable, "-c", script],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+    run(SCRIPT)
+    run(SCRIPT)
+    output = run(SERVE_SCRIPT % port)
+
+    line = 'http_requests_total{endpoint="/whoami",method="GET",status="401"}'
+    assert f"{line} 2.0" in output
+
+
+def test_reset_multiprocess_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "metrics"
+    directory.mkdir()
+    (directory / "counter_1.db").write_bytes(b"")
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(directory))
+
+    reset_multiprocess_dir()
+
+    assert list(directory.iterdir()) == []
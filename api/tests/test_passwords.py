@@ -0,0 +1,131 @@
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+import redis
+
+from app.errors import APIError, APIErrorEnum
+from app.passwords import MemorySlots, PasswordHasher, RedisSlots, password_hasher
+
+
+class TestPasswordHasher:
+    @pytest.fixture
+    def hasher(self, app):
+        _hasher = PasswordHasher()
+        _hasher.init_app(app)
+
+        return _hasher
+
+    def test_hash_and_verify(self, hasher):
+        hashed = hasher.hash("password123")
+
+        assert hashed.startswith("pbkdf2:sha256:1000$")
+        assert hasher.verify(hashed, "password123")
+        assert not hasher.verify(hashed, "wrong")
+
+    def test_hash_many(self, hasher):
+        hashed = hasher.hash_many(["first", "second", "third"])
+
+        assert len(hashed) == 3
+        assert hasher.verify(hashed[0], "first")
+        assert hasher.verify(hashed[2], "third")
+        assert not hasher.verify(hashed[1], "first")
+
+    def test_hash_many_in_pool(self, hasher):
+        hasher.pool_size = 2
+
+        try:
+            hashed = hasher.hash_many(["first", "second", "third"])
+        finally:
+            hasher.shutdown()
+
+        assert [h.startswith("pbkdf2:sha256:1000$") for h in hashed] == [True] * 3
+        assert hasher.verify(hashed[0], "first")
+        assert hasher.verify(hashed[2], "third")
+        assert not hasher.verify(hashed[1], "first")
+
+    def test_needs_rehash(self, hasher):
+        assert not hasher.needs_rehash(hasher.hash("password123"))
+
+        hasher.method = "pbkdf2:sha256:2000"
+        hasher.method_prefix = None
+        assert hasher.needs_rehash(password_hasher.hash("password123"))
+        assert not hasher.needs_rehash(hasher.hash("password123"))
+
+    def test_busy_when_no_slot_is_free(self, hasher):
+        hasher.max_concurrency = 1
+        hasher.acquire_timeout = 0
+
+        with hasher._slot():
+            with pytest.raises(APIError) as exc_info:
+                hasher.hash("password123")
+
+        assert exc_info.value.code == APIErrorEnum.server_busy
+        assert exc_info.value.status == 503
+        assert hasher.hash("password123")
+
+    def test_redis_errors_do_not_limit(self, hasher):
+        hasher.max_concurrency = 1
+        with patch.object(hasher.slots, "acquire", side_effect=redis.ConnectionError()):
+            assert hasher.hash("password123")
+
+
+class TestSlots:
+    @pytest.fixture(params=["memory", "redis"])
+    def slots(self, request):
+        if request.param == "memory":
+            return MemorySlots()
+
+        return RedisSlots(fakeredis.FakeRedis())
+
+    def test_acquire_up_to_limit(self, slots):
+        assert [slots.acquire(2) for _ in range(3)] == [True, True, False]
+
+        slots.release()
+        assert slots.acquire(2)
+        assert not slots.acquire(2)
+
+    def test_release_without_acquire(self, slots):
+        slots.release()
+
+        assert [slots.acquire(1) for _ in range(2)] == [True, False]
+
+
+class TestRehashOnLogin:
+    def test_login_rehashes_password(self, db, client, user):
+        old_hash = user.hashed_password
+        password_hasher.method = "pbkdf2:sha256:2000"
+        password_hasher.method_prefix = None
+
+        response = client.post(
+            "/login", json={"email": user.email, "password": "password123"}
+        )
+
+        assert response.status_code == 200
+        assert user.hashed_password != old_hash
+        assert user.hashed_password.startswith("pbkdf2:sha256:2000$")
+        assert user.is_correct_password("password123")
+
+    def test_login_does_not_rehash_current_hash(self, db, client, user):
+        old_hash = user.hashed_password
+
+        with patch.object(db.session, "commit") as commit:
+            response = client.post(
+                "/login", json={"email": user.email, "password": "password123"}
+            )
+
+        assert response.status_code == 200
+        assert user.hashed_password == old_hash
+        commit.assert_not_called()
+
+    def test_login_when_server_busy(self, client, user):
+        password_hasher.max_concurrency = 1
+        password_hasher.acquire_timeout = 0
+        password_hasher.slots.acquire(1)
+
+        response = client.post(
+            "/login", json={"email": user.email, "password": "password123"}
+        )
+
+        assert response.status_code == 503
+        assert response.json["error"] == APIErrorEnum.server_busy.value
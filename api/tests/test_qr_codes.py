@@ -0,0 +1,73 @@
+import io
+from unittest.mock import patch
+
+import fakeredis
+import qrcode
+from PIL import Image
+
+from app.qr_codes import (
+    RedisProvisioningStorage,
+    qr_code_matrix,
+    qr_code_service,
+    render_png,
+    render_svg,
+)
+
+URI = "otpauth://totp/MySolidApp:user%40test.com?secret=JBSWY3DPEHPK3PXP"
+
+
+class TestRendering:
+    def test_matrix_matches_qrcode(self):
+        qr = qrcode.QRCode(border=4, mask_pattern=3)
+        qr.add_data(URI)
+        qr.make(fit=True)
+
+        assert qr_code_matrix(URI, mask_pattern=3) == qr.get_matrix()
+
+    def test_render_png(self):
+        matrix = qr_code_matrix(URI)
+        image = Image.open(io.BytesIO(render_png(matrix, box_size=2)))
+
+        assert image.size == (len(matrix) * 2, len(matrix) * 2)
+        assert image.getpixel((0, 0)) == 255
+        assert image.getpixel((8, 8)) == 0
+
+    def test_render_svg(self):
+        matrix = [[False, True, True], [True, False, True], [False, False, False]]
+
+        svg = render_svg(matrix).decode()
+
+        assert 'viewBox="0 0 3 3"' in svg
+        assert '<path d="M1 0h2v1h-2zM0 1h1v1h-1zM2 1h1v1h-1z"/>' in svg
+
+
+class TestQRCodeService:
+    def test_render_caches_per_format(self, app):
+        provisioning_id = qr_code_service.create_provisioning(1, URI)
+
+        with patch("app.qr_codes.qr_code_matrix", wraps=qr_code_matrix) as encode:
+            svg = qr_code_service.render(provisioning_id, 1, "svg")
+            assert qr_code_service.render(provisioning_id, 1, "svg") == svg
+            qr_code_service.render(provisioning_id, 1, "png")
+
+        assert encode.call_count == 2
+
+    def test_render_other_user(self, app):
+        provisioning_id = qr_code_service.create_provisioning(1, URI)
+
+        assert qr_code_service.render(provisioning_id, 2, "svg") is None
+        assert qr_code_service.render("unknown", 1, "svg") is None
+
+    def test_falls_back_to_encrypted_id_without_redis(self, app):
+        storage = qr_code_service.storage
+        qr_code_service.storage = RedisProvisioningStorage(
+            fakeredis.FakeRedis(connected=False), qr_code_service.ttl
+        )
+        try:
+            provisioning_id = qr_code_service.create_provisioning(1, URI)
+
+            assert URI not in provisioning_id
+            assert qr_code_service.render(provisioning_id, 1, "svg") is not None
+            assert qr_code_service.render(provisioning_id, 2, "svg") is None
+        finally:
+            qr_code_service.storage = storage
@@ -0,0 +1,102 @@
+import pytest
+from flask import request
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.query_stats import QueryBudgetExceededError, query_stats
+
+
+@pytest.fixture
+def login(client, admin):
+    client.post("/login", json={"email": "admin@test.com", "password": "password321"})
+
+
+class TestQueryStats:
+    def test_server_timing_header(self, client, admin):
+        response = client.post(
+            "/login", json={"email": "admin@test.com", "password": "password321"}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["Server-Timing"].startswith("db;dur=")
+        assert response.headers["Server-Timing"].endswith('desc="1 queries"')
+
+    def test_counts_queries(self, app, db):
+        query_stats.reset()
+
+        db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT 2"))
+
+        count, duration = query_stats.current()
+        assert count == 2
+        assert duration > 0
+
+    def test_failed_queries_are_not_counted(self, app, db):
+        query_stats.reset()
+
+        with pytest.raises(OperationalError):
+            db.session.execute(text("SELECT * FROM missing_table"))
+
+        assert query_stats.current()[0] == 0
+
+    def test_logs_slow_queries(self, app, db, caplog):
+        query_stats.slow_query_threshold = 0.0
+
+        try:
+            db.session.execute(text("SELECT 1"))
+        finally:
+            query_stats.slow_query_threshold = (
+                app.config["SLOW_QUERY_THRESHOLD_MS"] / 1000
+            )
+
+        assert "Slow query" in caplog.text
+        assert "SELECT 1" in caplog.text
+
+    def test_access_log_contains_queries(self, client, admin, caplog):
+        client.post(
+            "/login", json={"email": "admin@test.com", "password": "password321"}
+        )
+
+        assert "POST /login [200 OK]" in caplog.text
+        assert "[1 queries," in caplog.text
+
+
+class TestQueryBudget:
+    @pytest.fixture
+    def extra_queries(self, app, db):
+        """Makes every request to /users issue 5 more queries."""
+
+        @app.before_request
+        def issue_queries():
+            if request.path == "/users":
+                for _ in range(5):
+                    db.session.execute(text("SELECT 1"))
+
+    def test_within_budget(self, client, login):
+        assert client.get("/users").status_code == 200
+
+    def test_exceeding_budget_raises(self, extra_queries, client, login):
+        with pytest.raises(QueryBudgetExceededError, match="budget of 3"):
+            client.get("/users")
+
+    def test_exceeding_budget_warns(self, app, extra_queries, client, login, caplog):
+        query_stats.budget_mode = "warn"
+
+        try:
+            response = client.get("/users")
+        finally:
+            query_stats.budget_mode = app.config["QUERY_BUDGET_MODE"]
+
+        assert response.status_code == 200
+        assert "exceeding its budget of 3" in caplog.text
+
+    def test_budget_is_per_request(self, client, login):
+        client.get("/users")
+
+        # Creating users issues more queries than listing them, without a budget.
+        response = client.post(
+            "/users/batch",
+            json=[{"email": f"user{i}@test.com", "is_admin": False} for i in range(3)],
+        )
+
+        assert response.status_code == 200
@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+import redis
+
+from app.rate_limit import Limit, MemoryStorage, RedisStorage, rate_limiter
+
+
+class TestLimit:
+    def test_parse(self):
+        assert Limit.parse("5/minute") == Limit(5, 60)
+        assert Limit.parse("10/hour") == Limit(10, 3600)
+
+
+class TestStorage:
+    @pytest.fixture(params=["memory", "redis"])
+    def storage(self, request):
+        if request.param == "memory":
+            return MemoryStorage()
+
+        return RedisStorage(fakeredis.FakeRedis())
+
+    def test_allows_burst_up_to_limit(self, storage):
+        limit = Limit(3, 60)
+
+        assert [storage.hit("key", limit) for _ in range(3)] == [0, 0, 0]
+        assert storage.hit("key", limit) == pytest.approx(20, abs=0.1)
+        assert storage.hit("other", limit) == 0
+
+    def test_rejected_hits_do_not_count(self, storage):
+        limit = Limit(1, 60)
+        storage.hit("key", limit)
+
+        first = storage.hit("key", limit)
+        second = storage.hit("key", limit)
+
+        assert second == pytest.approx(first, abs=0.1)
+
+    @patch("app.rate_limit.time")
+    def test_memory_allows_again_after_emission_interval(self, time_mock):
+        storage = MemoryStorage()
+        limit = Limit(2, 60)
+        time_mock.monotonic.return_value = 100
+        storage.hit("key", limit)
+        storage.hit("key", limit)
+        assert storage.hit("key", limit) == 30
+
+        time_mock.monotonic.return_value = 130
+        assert storage.hit("key", limit) == 0
+
+
+class TestRateLimiter:
+    def test_hit_checks_every_identity(self, app):
+        rate_limiter.limits = {"login": {"ip": Limit(3, 60), "email": Limit(1, 60)}}
+
+        assert rate_limiter.hit("login", {"ip": "1.2.3.4", "email": "a@b.c"}) == 0
+        assert rate_limiter.hit("login", {"ip": "1.2.3.4", "email": "a@b.c"}) > 0
+        assert rate_limiter.hit("login", {"ip": "1.2.3.4", "email": "d@e.f"}) == 0
+        assert rate_limiter.hit("login", {"ip": "1.2.3.4", "email": None}) > 0
+        assert rate_limiter.hit("unknown", {"ip": "1.2.3.4"}) == 0
+
+    def test_disabled(self, app):
+        rate_limiter.enabled = False
+        rate_limiter.limits = {"login": {"ip": Limit(1, 60)}}
+
+        for _ in range(3):
+            assert rate_limiter.hit("login", {"ip": "1.2.3.4"}) == 0
+
+    def test_redis_errors_let_requests_through(self, app):
+        rate_limiter.limits = {"login": {"ip": Limit(1, 60)}}
+        with patch.object(
+            rate_limiter.storage, "hit", side_effect=redis.ConnectionError()
+        ):
+            assert rate_limiter.hit("login", {"ip": "1.2.3.4"}) == 0
+
+    def test_limits_per_forwarded_client(self, app, client, admin):
+        rate_limiter.limits = {"login": {"ip": Limit(1, 60)}}
+
+        def login(forwarded_for):
+            return client.post(
+                "/login",
+                json={"email": "admin@test.com", "password": "password321"},
+                headers={"X-Forwarded-For": forwarded_for},
+            )
+
+        # Every request comes from the same proxy, but from a different client.
+        assert login("1.1.1.1").status_code == 200
+        assert login("2.2.2.2").status_code == 200
+        assert login("1.1.1.1").status_code == 429
@@ -0,0 +1,179 @@
+from unittest.mock import patch
+
+import pytest
+from flask import g
+from sqlalchemy import insert, select, update
+
+from app.app import create_app
+from app.cache import user_cache
+from app.config import TestConfig
+from app.db.user import User
+from app.extensions import db, replica_router
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """An application with a primary and a replica, being two SQLite files."""
+    config = TestConfig()
+    config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'primary.db'}"
+    config.DB_REPLICA_URIS = {"replica_0": f"sqlite:///{tmp_path / 'replica.db'}"}
+    config.DB_REPLICA_LAG_QUERY = None
+
+    _app = create_app(config_object=config)
+    with _app.app_context():
+        db.metadata.create_all(db.engines[None])
+        db.metadata.create_all(replica_router.engines["replica_0"])
+
+        admin = User(email="admin@test.com", is_admin=True)
+        admin.set_password("password321")
+        db.session.add(admin)
+        db.session.commit()
+
+        # Replicate the primary, plus one row that only exists on the replica.
+        with replica_router.engines["replica_0"].begin() as connection:
+            rows = db.session.execute(select(User.__table__)).mappings().all()
+            connection.execute(insert(User.__table__), [dict(row) for row in rows])
+            connection.execute(
+                insert(User.__table__),
+                {"email": "replica@test.com", "hashed_password": "x"},
+            )
+
+        db.session.remove()
+        with _app.test_request_context():
+            yield _app
+
+        db.session.remove()
+        for engine in replica_router.engines.values():
+            engine.dispose()
+
+
+def emails() -> list[str]:
+    return sorted(db.session.scalars(select(User.email)))
+
+
+class TestRoutingSession:
+    def test_reads_from_primary_by_default(self, replica_app):
+        assert emails() == ["admin@test.com"]
+
+    def test_reads_from_replica(self, replica_app):
+        db.session.info["use_read_replica"] = True
+
+        assert emails() == ["admin@test.com", "replica@test.com"]
+
+    def test_reads_own_writes(self, replica_app):
+        db.session.info["use_read_replica"] = True
+        db.session.add(User(email="new@test.com", hashed_password="x"))
+        db.session.flush()
+
+        assert emails() == ["admin@test.com", "new@test.com"]
+
+    def test_locking_reads_from_primary(self, replica_app):
+        db.session.info["use_read_replica"] = True
+
+        users = db.session.scalars(select(User).with_for_update()).all()
+
+        assert [user.email for user in users] == ["admin@test.com"]
+
+    def test_falls_back_to_primary_without_healthy_replica(self, replica_app):
+        db.session.info["use_read_replica"] = True
+
+        with patch.object(replica_router, "_measure_lag", return_value=None):
+            assert emails() == ["admin@test.com"]
+
+    def test_users_endpoint_uses_replica(self, replica_app):
+        client = replica_app.test_client()
+        client.post(
+            "/login", json={"email": "admin@test.com", "password": "password321"}
+        )
+        # Every request gets a fresh session outside of the tests.
+        db.session.remove()
+
+        response = client.get("/users")
+
+        assert response.status_code == 200
+        assert [user["email"] for user in response.json["items"]] == [
+            "admin@test.com",
+            "replica@test.com",
+        ]
+        assert "use_read_replica" not in db.session.info
+
+    def test_loads_user_from_primary(self, replica_app):
+        client = replica_app.test_client()
+        response = client.post(
+            "/register", json={"email": "new@test.com", "password": "Password1"}
+        )
+        assert response.status_code == 200
+        db.session.remove()
+        user_cache.local.clear()
+        # The tests share one app context, so forget the user Flask-Login cached in `g`.
+        g.pop("_login_user", None)
+
+        response = client.get("/whoami")
+
+        assert response.status_code == 200
+        assert response.json["email"] == "new@test.com"
+
+    def test_does_not_cache_user_of_replica(self, replica_app):
+        user_id = db.session.scalar(
+            select(User.id).where(User.email == "admin@test.com")
+        )
+        # The replica has not replicated the admin rights yet.
+        with replica_router.engines["replica_0"].begin() as connection:
+            connection.execute(update(User.__table__).values(is_admin=False))
+        db.session.remove()
+        user_cache.local.clear()
+        db.session.info["use_read_replica"] = True
+
+        assert user_cache.load_user(user_id).is_admin
+        assert user_cache.local.get(user_id)["is_admin"]
+
+
+class TestReplicaRouter:
+    @pytest.fixture
+    def router(self, replica_app):
+        replica_router.engines["replica_1"] = replica_router.engines["replica_0"]
+        return replica_router
+
+    def test_round_robin(self, router):
+        assert [router.choose() for _ in range(4)] == [
+            "replica_0",
+            "replica_1",
+            "replica_0",
+            "replica_1",
+        ]
+
+    def test_least_lag(self, router):
+        router.policy = "least_lag"
+        lags = {"replica_0": 2.0, "replica_1": 0.5}
+
+        with patch.object(router, "_measure_lag", side_effect=lags.get):
+            assert router.choose() == "replica_1"
+
+    def test_skips_lagging_replicas(self, router):
+        lags = {"replica_0": 60.0, "replica_1": 0.5}
+
+        with patch.object(router, "_measure_lag", side_effect=lags.get):
+            assert {router.choose() for _ in range(4)} == {"replica_1"}
+
+    def test_lag_checked_once_per_interval(self, router):
+        with patch.object(router, "_measure_lag", return_value=0.0) as measure:
+            for _ in range(3):
+                router.choose()
+
+        assert measure.call_count == 2
+
+    def test_measure_lag(self, router):
+        router.lag_query = (
+            "SELECT 3 AS Seconds_Behind_Source UNION ALL SELECT 4"  # first row only
+        )
+
+        assert router._measure_lag("replica_0") == 3.0
+
+        router.lag_query = "SELECT NULL AS Seconds_Behind_Master"
+        assert router._measure_lag("replica_0") is None
+
+    def test_measure_lag_without_lag_column(self, router, caplog):
+        router.lag_query = "SELECT 1 AS Slave_IO_Running"
+
+        assert router._measure_lag("replica_0") is None
+        assert "REPLICATION CLIENT" in caplog.text
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+API_DIR = Path(__file__).parent.parent
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["scripts.benchmark_mail_transport", "--messages", "3", "--latency-ms", "1"],
+        ["scripts.benchmark_metrics", "--number", "10"],
+        ["scripts.benchmark_qr_codes", "--number", "1"],
+        ["scripts.benchmark_worker_context", "--number", "10"],
+    ],
+)
+def test_benchmark_runs(args):
+    """Runs the benchmark with a tiny workload, such that it keeps up with the app."""
+    result = subprocess.run(
+        [sys.executable, "-m", *args],
+        cwd=API_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+
+    assert result.returncode == 0, result.stderr
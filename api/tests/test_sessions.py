@@ -0,0 +1,126 @@
+from unittest.mock import patch
+
+import fakeredis
+import msgpack
+import pytest
+import redis
+from flask import g
+
+from app.sessions import session_store
+from app.totp import totp_verifier
+
+
+@pytest.fixture
+def redis_sessions(app):
+    app.config["SESSION_STORAGE"] = "redis"
+    session_store.init_app(app)
+    session_store.redis = fakeredis.FakeRedis()
+
+    yield session_store.redis
+
+    session_store.enabled = False
+
+
+def login(client, email="user@test.com", password="password123"):
+    response = client.post("/login", json={"email": email, "password": password})
+    assert response.status_code == 200
+    return client.get_cookie("session").value
+
+
+def whoami(client):
+    # The tests share one app context, so forget the user Flask-Login cached in `g`.
+    g.pop("_login_user", None)
+    return client.get("/whoami")
+
+
+class TestRedisSessions:
+    def test_login_stores_session_in_redis(self, redis_sessions, client, user):
+        sid = login(client)
+
+        data = msgpack.unpackb(redis_sessions.get(f"session:{sid}"))
+        assert data["_user_id"] == str(user.id)
+        assert redis_sessions.smembers(f"user_sessions:{user.id}") == {sid.encode()}
+        assert whoami(client).status_code == 200
+
+    def test_no_redis_without_cookie(self, redis_sessions, client, user):
+        with patch.object(session_store, "_load") as load:
+            response = whoami(client)
+
+        assert response.status_code == 401
+        load.assert_not_called()
+        assert client.get_cookie("session") is None
+
+    def test_new_session_id_on_login(self, redis_sessions, db, client, user):
+        user.two_factor_enabled = True
+        db.session.commit()
+        partial_sid = login(client)
+
+        with patch.object(totp_verifier, "verify", return_value=True):
+            client.post("/login_2fa", json={"email": user.email, "totp_code": "1"})
+
+        sid = client.get_cookie("session").value
+        assert sid != partial_sid
+        assert redis_sessions.get(f"session:{partial_sid}") is None
+        assert redis_sessions.get(f"session:{sid}") is not None
+
+    def test_login_without_redis(self, redis_sessions, client, user, caplog):
+        with patch.object(
+            redis_sessions, "pipeline", side_effect=redis.ConnectionError()
+        ):
+            response = client.post(
+                "/login", json={"email": "user@test.com", "password": "password123"}
+            )
+
+        assert response.status_code == 200
+        assert client.get_cookie("session") is None
+        assert "Could not write session to redis" in caplog.text
+
+    def test_logout_deletes_session(self, redis_sessions, client, user):
+        sid = login(client)
+
+        client.post("/logout")
+
+        assert redis_sessions.get(f"session:{sid}") is None
+        assert redis_sessions.smembers(f"user_sessions:{user.id}") == set()
+
+    def test_change_password_revokes_other_sessions(
+        self, redis_sessions, app, client, user
+    ):
+        other_client = app.test_client()
+        login(other_client)
+        login(client)
+
+        response = client.post(
+            "/change_password",
+            json={"current_password": "password123", "new_password": "Password1234!"},
+        )
+        assert response.status_code == 200
+
+        assert whoami(client).status_code == 200
+        assert whoami(other_client).status_code == 401
+
+    def test_delete_account_revokes_all_sessions(
+        self, redis_sessions, app, client, user
+    ):
+        other_client = app.test_client()
+        login(other_client)
+        login(client)
+
+        client.delete("/delete_account")
+
+        assert redis_sessions.keys("session:*") == []
+        assert redis_sessions.keys("user_sessions:*") == []
+
+    def test_delete_account_without_redis(
+        self, redis_sessions, app, client, user, caplog
+    ):
+        login(client)
+
+        with patch.object(
+            redis_sessions, "smembers", side_effect=redis.ConnectionError()
+        ):
+            response = client.delete("/delete_account")
+
+        assert response.status_code == 200
+        assert "Could not revoke sessions in redis" in caplog.text
+        assert whoami(client).status_code == 401
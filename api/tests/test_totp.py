@@ -0,0 +1,86 @@
+import time
+from unittest.mock import patch
+
+import fakeredis
+import pyotp
+import pytest
+
+from app.totp import MemoryReplayStorage, RedisReplayStorage, totp_verifier
+
+
+@pytest.fixture
+def totp():
+    return pyotp.TOTP(pyotp.random_base32())
+
+
+@pytest.fixture
+def user_with_2fa(db, user, totp):
+    user.two_factor_enabled = True
+    user.totp_secret = totp.secret
+    db.session.commit()
+
+    return user
+
+
+class TestTOTPVerifier:
+    def test_verify(self, user_with_2fa, totp):
+        assert not totp_verifier.verify(user_with_2fa, "abcdef")
+        assert not totp_verifier.verify(user_with_2fa, f"{int(totp.now()) + 1:06d}")
+        assert totp_verifier.verify(user_with_2fa, totp.now())
+
+    def test_rejects_non_ascii_digits(self, user_with_2fa):
+        assert not totp_verifier.verify(user_with_2fa, "١٢٣٤٥٦")
+
+    def test_rejects_replayed_code(self, user_with_2fa, totp):
+        code = totp.now()
+
+        assert totp_verifier.verify(user_with_2fa, code)
+        assert not totp_verifier.verify(user_with_2fa, code)
+
+    def test_valid_window(self, user_with_2fa, totp):
+        previous_code = totp.at(time.time() - totp.interval)
+        assert not totp_verifier.verify(user_with_2fa, previous_code)
+
+        totp_verifier.valid_window = 1
+        assert totp_verifier.verify(user_with_2fa, previous_code)
+
+    def test_caches_decrypted_secret(self, user_with_2fa, totp):
+        with patch("app.db.user.decrypt", wraps=lambda value: totp.secret) as decrypt:
+            for offset in range(1, 4):
+                totp_verifier.verify(user_with_2fa, f"{int(totp.now()) + offset:06d}")
+
+        decrypt.assert_called_once()
+
+    def test_changed_secret_not_served_from_cache(self, db, user_with_2fa, totp):
+        totp_verifier.verify(user_with_2fa, "000000")
+
+        new_totp = pyotp.TOTP(pyotp.random_base32())
+        user_with_2fa.totp_secret = new_totp.secret
+        db.session.commit()
+
+        assert not totp_verifier.verify(user_with_2fa, totp.now())
+        assert totp_verifier.verify(user_with_2fa, new_totp.now())
+
+    def test_disabled_2fa(self, user):
+        assert not totp_verifier.verify(user, "123456")
+
+
+class TestReplayStorage:
+    @pytest.mark.parametrize(
+        "storage",
+        [MemoryReplayStorage(), RedisReplayStorage(fakeredis.FakeRedis())],
+        ids=["memory", "redis"],
+    )
+    def test_mark_used(self, storage):
+        assert storage.mark_used("totp_used:1:100", 30)
+        assert not storage.mark_used("totp_used:1:100", 30)
+        assert storage.mark_used("totp_used:1:101", 30)
+
+    def test_memory_storage_is_bounded(self):
+        storage = MemoryReplayStorage()
+
+        for step in range(2000):
+            storage.mark_used(f"totp_used:1:{step}", 30)
+
+        assert len(storage._used) == 1024
+        assert not storage.mark_used("totp_used:1:1999", 30)
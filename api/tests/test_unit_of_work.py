@@ -0,0 +1,93 @@
+from unittest.mock import Mock, patch
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.db.outbox import OutboxMessage
+from app.db.user import User
+from app.tasks.mail_tasks import send_forgot_password_email
+from app.unit_of_work import unit_of_work
+
+
+class TestUnitOfWork:
+    def test_commits_once(self, db):
+        with patch.object(db.session, "commit", wraps=db.session.commit) as commit:
+            with unit_of_work() as uow:
+                user = User(email="new@test.com", hashed_password="x")
+                uow.add(user)
+                uow.flush()
+
+                assert user.id is not None
+                commit.assert_not_called()
+
+            commit.assert_called_once()
+
+        db.session.expunge_all()
+        assert User.query.filter_by(email="new@test.com").count() == 1
+
+    def test_after_commit(self, db):
+        callback = Mock()
+
+        with unit_of_work() as uow:
+            uow.add(User(email="new@test.com", hashed_password="x"))
+            uow.after_commit(callback, 1, key="value")
+            callback.assert_not_called()
+
+        callback.assert_called_once_with(1, key="value")
+
+    def test_rollback_on_error(self, db):
+        callback = Mock()
+
+        with pytest.raises(ValueError):
+            with unit_of_work() as uow:
+                uow.add(User(email="new@test.com", hashed_password="x"))
+                uow.flush()
+                uow.after_commit(callback)
+                raise ValueError()
+
+        callback.assert_not_called()
+        assert User.query.filter_by(email="new@test.com").count() == 0
+
+    def test_no_callbacks_when_commit_fails(self, db, user):
+        callback = Mock()
+
+        with pytest.raises(IntegrityError):
+            with unit_of_work() as uow:
+                # Violates the unique constraint on the email
+                uow.add(User(email=user.email, hashed_password="x"))
+                uow.after_commit(callback)
+
+        callback.assert_not_called()
+
+    def test_enqueue(self, db):
+        with unit_of_work() as uow:
+            uow.enqueue(
+                send_forgot_password_email,
+                receiver="a@test.com",
+                encrypted_reset_token="x",
+            )
+
+        message = OutboxMessage.query.one()
+        assert message.task_name == send_forgot_password_email.name
+        assert message.kwargs == {"receiver": "a@test.com", "encrypted_reset_token": "x"}
+
+    def test_enqueue_rolled_back(self, db):
+        with pytest.raises(ValueError):
+            with unit_of_work() as uow:
+                uow.enqueue(
+                    send_forgot_password_email, receiver="a", encrypted_reset_token="x"
+                )
+                raise ValueError()
+
+        assert OutboxMessage.query.count() == 0
+
+
+class TestRegisterUnitOfWork:
+    def test_register_commits_once(self, client, db):
+        with patch.object(db.session, "commit", wraps=db.session.commit) as commit:
+            response = client.post(
+                "/register", json={"email": "new@user.com", "password": "white_wolf"}
+            )
+
+        assert response.status_code == 200
+        commit.assert_called_once()
@@ -107,6 +107,10 @@ export async function generate2FASecret() {
   return get('api/generate_2fa_secret')
 }
 
+export function qrCodeUrl(provisioningId: string) {
+  return `api/2fa_qr_code/${provisioningId}`
+}
+
 export type Enable2FAData = {
   totpSecret: string
   totpCode: string
@@ -205,4 +209,10 @@ const errorMessages: Record<number, keyof TranslationKeys> = {
   11: 'twofa_is_already_disabled',
   12: 'user_not_found',
   13: 'an_unknown_error_occurred',
+  14: 'the_server_is_busy_please_try_again_later',
+  15: 'invalid_page_please_reload',
+  16: 'invalid_export_format',
+  17: 'invalid_request_data',
+  18: 'too_many_attempts_please_try_again_later',
+  19: 'the_2fa_setup_has_expired_please_try_again',
 }
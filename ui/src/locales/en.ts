@@ -41,6 +41,9 @@ export const dict = {
     If a user with this email exists, a reset password mail has been sent
   `,
   incorrect_2fa_code_try_again: 'Incorrect 2FA code, please try again',
+  invalid_export_format: 'Invalid export format',
+  invalid_page_please_reload: 'Invalid page, please reload',
+  invalid_request_data: 'Invalid request data',
   login: 'Login',
   logout: 'Logout',
   make_this_user_an_admin: 'Make this user an admin',
@@ -74,6 +77,8 @@ export const dict = {
   `,
   successfully_reset_password: 'Successfully reset password',
   successfully_verified_email: 'Successfully verified email',
+  the_2fa_setup_has_expired_please_try_again: 'The 2FA setup has expired, please try again',
+  the_server_is_busy_please_try_again_later: 'The server is busy, please try again later',
   this_action_cannot_be_undone: 'This action cannot be undone',
   this_is: 'This is ',
   this_is_the_home_page: 'This is the home page',
@@ -83,6 +88,7 @@ export const dict = {
   this_user_has_not_been_verified_yet: 'This user has not been verified yet',
   this_user_is_an_admin: 'This user is an admin',
   to_the_app: 'To the app',
+  too_many_attempts_please_try_again_later: 'Too many attempts, please try again later',
   twofa_is_already_disabled: '2FA is already disabled',
   twofa_is_already_enabled: '2FA is already enabled',
   user_not_found: 'User not found',
@@ -46,6 +46,9 @@ export const dict: Translations = {
     wachtwoord verzonden
   `,
   incorrect_2fa_code_try_again: 'Onjuiste code, probeer het opnieuw',
+  invalid_export_format: 'Ongeldig exportformaat',
+  invalid_page_please_reload: 'Ongeldige pagina, herlaad de pagina',
+  invalid_request_data: 'Ongeldige gegevens',
   login: 'Login',
   logout: 'Logout',
   make_this_user_an_admin: 'Maak deze gebruiker een admin',
@@ -79,6 +82,8 @@ export const dict: Translations = {
   `,
   successfully_reset_password: 'Wachtwoord succesvol opnieuw ingesteld',
   successfully_verified_email: 'E-mail succesvol geverifieerd',
+  the_2fa_setup_has_expired_please_try_again: 'De 2FA-instelling is verlopen, probeer het opnieuw',
+  the_server_is_busy_please_try_again_later: 'De server is bezig, probeer het later opnieuw',
   this_action_cannot_be_undone: 'Deze actie kan niet ongedaan worden gemaakt',
   this_is: 'Dit is ',
   this_is_the_home_page: 'Dit is de home pagina',
@@ -88,6 +93,7 @@ export const dict: Translations = {
   this_user_has_not_been_verified_yet: 'Deze gebruiker is nog niet geverifieerd',
   this_user_is_an_admin: 'Deze gebruiker is een admin',
   to_the_app: 'Naar de applicatie',
+  too_many_attempts_please_try_again_later: 'Te veel pogingen, probeer het later opnieuw',
   twofa_is_already_disabled: '2FA is al uitgeschakeld',
   twofa_is_already_enabled: '2FA is al ingeschakeld',
   user_not_found: 'Gebruiker niet gevonden',
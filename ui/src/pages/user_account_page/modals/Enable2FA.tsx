@@ -1,5 +1,10 @@
 import { createSignal, onMount, JSXElement, Show } from 'solid-js'
-import { enable2FA, Enable2FAData, generate2FASecret } from '../../../api'
+import {
+  enable2FA,
+  Enable2FAData,
+  generate2FASecret,
+  qrCodeUrl,
+} from '../../../api'
 import { useUser } from '../../../context/UserProvider'
 import { useLocale } from '../../../context/LocaleProvider'
 
@@ -33,7 +38,7 @@ export function Enable2FAModal(props: ModalBaseProps): JSXElement {
   const fetchQRCode = async () => {
     const response = await generate2FASecret()
     const data = await response.json()
-    setQrCode(data.qr_code)
+    setQrCode(qrCodeUrl(data.provisioning_id))
     setTotpSecret({ totpSecret: data.totp_secret })
   }
 
@@ -56,7 +61,7 @@ export function Enable2FAModal(props: ModalBaseProps): JSXElement {
 
         <div class="my-8 flex justify-center">
           <img
-            src={`data:image/png;base64,${qrCode()}`}
+            src={qrCode()}
             alt="TOTP QR Code"
             width="50%"
           />